@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Analyses session videos without the graphical interface.
+
+Every video is analysed with the same calibration file or named calibration profile. For each video the textual
+results and the court image with the recorded bounces are written into the output directory.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2 as cv
+
+from parallel_analysis import analyse_in_segments
+from pipeline import Pipeline
+from stats import AccuracyStatistics
+from utils.calibration import Calibration, load_profile
+from utils.candidate_log import CandidateLog
+from utils.court import Court, CourtOverlay
+from utils.frame_cache import FrameCache
+from utils.profiler import StageProfiler
+from utils.video_reader import VideoReader
+
+VIDEO_EXTENSIONS = {".mp4", ".mov"}
+
+
+def find_videos(paths: List[str]) -> List[Path]:
+    """
+    :param paths: Video files and directories containing video files
+    :return: Video file paths, directories expanded in alphabetical order
+    """
+    videos = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            videos.extend(sorted(file for file in path.iterdir() if file.suffix.lower() in VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return videos
+
+
+def resolve_calibration(resolution: Tuple[int, int], calibration: Calibration, profile: str) -> Calibration:
+    """
+    :param resolution: (width, height) of the video to be analysed
+    :param calibration: Calibration given on the command line, or None
+    :param profile: Name of the calibration profile given on the command line, or None
+    :return: Calibration to analyse the video with
+    :raises ValueError: If the calibration was made for videos of another resolution
+    """
+    if profile is not None:
+        try:
+            return load_profile(profile, resolution)
+        except FileNotFoundError:
+            raise ValueError(f"No calibration profile {profile!r} for {resolution[0]}x{resolution[1]} videos")
+    if calibration.resolution is not None and tuple(calibration.resolution) != tuple(resolution):
+        raise ValueError(f"Calibration was made for {calibration.resolution[0]}x{calibration.resolution[1]} videos")
+    return calibration
+
+
+def analyse_video(video_path: Path, calibration: Calibration, profile: str, output_dir: Path,
+                  decimation: int = 1, frame_cache: FrameCache = None, timing: bool = False,
+                  offline: bool = False, record: bool = False, threaded: bool = False) -> (int, int):
+    """
+    Analyses a single video and writes its results.
+    :param video_path: Path of the video file
+    :param calibration: Court markers of the video, used if no profile is given
+    :param profile: Name of the calibration profile to look up for the video's resolution, or None
+    :param output_dir: Directory to write the results into
+    :param decimation: Only every decimation-th frame is analysed
+    :param frame_cache: Cache of decoded frames to read the video from, or None
+    :param timing: Whether to also write a report of the time spent in each processing stage
+    :param offline: Whether to find the ball trajectory once the whole video has been read, see Pipeline
+    :param record: Whether to also write a log of the tracking stages, which replay.py can re-run
+    :param threaded: Whether to detect the ball candidates on a separate thread, see Pipeline
+    :return: Number of video frames covered and number of detected bounces
+    """
+    video_reader = VideoReader(str(video_path), decimation=decimation, frame_cache=frame_cache)
+    calibration = resolve_calibration(video_reader.get_resolution(), calibration, profile)
+    video_reader.start_reading()
+
+    stats = AccuracyStatistics(Court.create_target_rects(calibration.direction))
+    court = CourtOverlay(stats.get_target_rects())
+    profiler = StageProfiler(enabled=timing)
+    candidate_log = CandidateLog(calibration.direction) if record else None
+    pipeline = Pipeline(video_reader, calibration.get_homography_coords(), court, stats,
+                        homography_matrix=calibration.get_homography_matrix(), profiler=profiler, offline=offline,
+                        candidate_log=candidate_log, settings=calibration.settings, threaded=threaded)
+    for _ in pipeline.process_next():
+        pass
+
+    write_results(video_path, output_dir, stats, court)
+    if record:
+        candidate_log.save(str(output_dir / f"{video_path.stem}_log.npz"))
+    if timing:
+        producer_stall_time, consumer_stall_time = video_reader.get_stall_times()
+        profiler.write_report(str(output_dir / f"{video_path.stem}_timing.json"), video=str(video_path),
+                              decoder_stall_s=producer_stall_time, analysis_stall_s=consumer_stall_time,
+                              stage_utilisation=pipeline.get_stage_utilisation())
+    return video_reader.get_frame_index() + 1, len(pipeline.get_bounces())
+
+
+def analyse_video_in_segments(video_path: Path, calibration: Calibration, profile: str, output_dir: Path,
+                              decimation: int = 1, num_workers: int = None, offline: bool = False) -> (int, int):
+    """
+    Analyses a single video split into segments that are processed in parallel, and writes its results.
+    :return: Number of video frames covered and number of detected bounces
+    """
+    stream = cv.VideoCapture(str(video_path))
+    if not stream.isOpened():
+        raise IOError(f"Unable to open video {video_path}")
+    num_frames = int(stream.get(cv.CAP_PROP_FRAME_COUNT))
+    resolution = int(stream.get(cv.CAP_PROP_FRAME_WIDTH)), int(stream.get(cv.CAP_PROP_FRAME_HEIGHT))
+    stream.release()
+
+    calibration = resolve_calibration(resolution, calibration, profile)
+    stats, court, bounces = analyse_in_segments(str(video_path), calibration.get_homography_coords(),
+                                                    calibration.direction, num_workers, decimation,
+                                                    calibration.get_homography_matrix(), offline,
+                                                    calibration.settings)
+    write_results(video_path, output_dir, stats, court)
+    return num_frames, len(bounces)
+
+
+def write_results(video_path: Path, output_dir: Path, stats: AccuracyStatistics, court: CourtOverlay) -> None:
+    """
+    Writes <video name>_results.txt and <video name>_court.jpg into the output directory.
+    """
+    court_img = court.render().copy()
+    stats.draw_box_markings(court_img)
+    cv.imwrite(str(output_dir / f"{video_path.stem}_court.jpg"), court_img)
+    with open(output_dir / f"{video_path.stem}_results.txt", 'w') as file:
+        file.write(stats.get_result_str_boxwise())
+
+
+def init_worker() -> None:
+    """
+    Keeps every worker process single-threaded, as the parallelism comes from the number of processes.
+    """
+    cv.setNumThreads(1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('videos', nargs='+', metavar='VIDEO', help="Video files or directories of video files")
+    calibration_group = parser.add_mutually_exclusive_group(required=True)
+    calibration_group.add_argument('-c', '--calibration', help="Calibration file")
+    calibration_group.add_argument('-p', '--profile', help="Name of a calibration profile saved in the set-up view")
+    parser.add_argument('-o', '--output-dir', default='.', help="Directory for the results (default: current)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--decimation', type=int, default=1, help="Analyse only every N-th frame")
+    parser.add_argument('--parallel-segments', action='store_true',
+                        help="Analyse the videos one after another, each split into segments across all workers")
+    parser.add_argument('--frame-cache', action='store_true',
+                        help="Cache the decoded frames next to the videos to speed up re-analysing them")
+    parser.add_argument('--frame-cache-size', type=float, default=20,
+                        help="Size limit of all cached frames in GiB (default: 20)")
+    parser.add_argument('--frame-cache-grayscale', action='store_true',
+                        help="Cache only the grayscale frames used for the analysis, a third of the size")
+    parser.add_argument('--offline', action='store_true',
+                        help="Find the ball trajectory once each video has been read instead of frame by frame")
+    parser.add_argument('--record', action='store_true',
+                        help="Write a log of the tracking stages for every video, which replay.py can re-run")
+    parser.add_argument('--threaded', action='store_true',
+                        help="Detect the ball candidates of every video on a separate thread, which only pays off "
+                             "with fewer workers than CPUs")
+    parser.add_argument('--timing', action='store_true',
+                        help="Write a report of the time spent in each processing stage for every video")
+    args = parser.parse_args()
+    if args.timing and args.parallel_segments:
+        parser.error("--timing cannot be combined with --parallel-segments")
+    if args.record and args.parallel_segments:
+        parser.error("--record cannot be combined with --parallel-segments")
+    if args.threaded and args.parallel_segments:
+        parser.error("--threaded cannot be combined with --parallel-segments")
+
+    calibration = Calibration.load(args.calibration) if args.calibration else None
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    videos = find_videos(args.videos)
+    frame_cache = FrameCache(int(args.frame_cache_size * 2 ** 30), args.frame_cache_grayscale) \
+        if args.frame_cache else None
+
+    start = time.perf_counter()
+    total_frames = 0
+    failed = []
+
+    if args.parallel_segments:
+        for video_path in videos:
+            video_start = time.perf_counter()
+            try:
+                num_frames, num_bounces = analyse_video_in_segments(video_path, calibration, args.profile,
+                                                                    output_dir, args.decimation, args.workers,
+                                                                    args.offline)
+            except Exception as e:
+                failed.append(video_path)
+                print(f"[failed] {video_path}: {e!r}", file=sys.stderr)
+                continue
+            total_frames += num_frames
+            print(f"[ok] {video_path}: {num_frames} frames, {num_bounces} bounces, "
+                  f"{num_frames / (time.perf_counter() - video_start):.1f} frames/s")
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            futures = {executor.submit(analyse_video, video_path, calibration, args.profile, output_dir,
+                                       args.decimation, frame_cache, args.timing, args.offline, args.record,
+                                       args.threaded): video_path
+                       for video_path in videos}
+            for future in as_completed(futures):
+                video_path = futures[future]
+                try:
+                    num_frames, num_bounces = future.result()
+                except Exception as e:
+                    failed.append(video_path)
+                    print(f"[failed] {video_path}: {e!r}", file=sys.stderr)
+                    continue
+                total_frames += num_frames
+                # Videos are processed concurrently, so per video throughput is not meaningful here
+                print(f"[ok] {video_path}: {num_frames} frames, {num_bounces} bounces")
+
+    elapsed = time.perf_counter() - start
+    print(f"Analysed {len(videos) - len(failed)}/{len(videos)} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed:.1f} frames/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
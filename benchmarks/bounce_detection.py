@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Checks that BounceDetector.detect_bounces() finds the same bounces in a whole trajectory as the streaming
+update_contour_data() and bounced() calls of the Pipeline, and compares their speed.
+
+Trajectories are found offline in videos if any are given, see Pipeline, and generated synthetically at 30, 60, 120
+and 240fps: a ball flying up the court and dropping back with some jitter, which at times jumps to a random position
+like a misselected distractor. Ball positions are whole pixels, so that equal heights, which the peak pattern treats
+differently from unequal ones, are common.
+
+Usage:
+    python3 benchmarks/bounce_detection.py [VIDEO ...] [--calibration CALIBRATION] [--synthetic-frames 20000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bounce_detector import BounceDetector  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from utils.calibration import Calibration  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+# The example calibration of the README
+DEFAULT_CALIBRATION = Calibration([(200, 380), (340, 380), (200, 450), (340, 450)], [(0, 600), (359, 600)], 1)
+
+
+def video_trajectory(video_path: str, calibration: Calibration) -> (np.ndarray, np.ndarray):
+    """
+    :return: Timestamps and contours of the frames in which the ball was found offline
+    """
+    video_reader = VideoReader(video_path)
+    video_reader.start_reading()
+    pipeline = Pipeline(video_reader, calibration.get_homography_coords(), None, None, offline=True)
+    for _ in pipeline.process_next():
+        pass
+    timestamps, trajectory = pipeline.get_trajectory()
+    found = ~np.isnan(trajectory[:, 0])
+    return timestamps[found], trajectory[found]
+
+
+def synthetic_trajectory(num_frames: int, fps: float, rng: np.random.Generator) -> (np.ndarray, np.ndarray):
+    """
+    :return: Timestamps and contours of a synthetic ball, see the module documentation
+    """
+    frames = np.arange(num_frames)
+    # One shot every 90 frames of 60fps video
+    phase = frames * 60 / fps % 90 / 90
+    xs = 100 + 150 * phase + rng.integers(-2, 3, num_frames)
+    ys = FRAME_HEIGHT - 100 - 400 * np.sin(np.pi * phase) + rng.integers(-2, 3, num_frames)
+    jumps = rng.random(num_frames) < 0.02
+    xs[jumps] = rng.integers(0, FRAME_WIDTH, jumps.sum())
+    ys[jumps] = rng.integers(0, FRAME_HEIGHT, jumps.sum())
+    trajectory = np.column_stack((xs.astype(int), ys.astype(int), np.full(num_frames, 24), np.full(num_frames, 25)))
+    # Rounded to whole milliseconds like the timestamps of most containers
+    return np.round(frames * 1000 / fps), trajectory.astype(np.float64)
+
+
+def stream_bounces(homography_coords: list, timestamps: np.ndarray, trajectory: np.ndarray) -> list:
+    """
+    :return: Bounces found by feeding the contours one by one, as the Pipeline does
+    """
+    bounce_detector = BounceDetector(*homography_coords)
+    bounces = []
+    for timestamp, contour in zip(timestamps.tolist(), trajectory.tolist()):
+        bounce_detector.update_contour_data(Rect(*contour), timestamp)
+        if bounce_detector.bounced():
+            bounces.append((bounce_detector.get_last_bounce_timestamp(),
+                            *bounce_detector.get_last_bounce_location()))
+    return bounces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*', metavar='VIDEO')
+    parser.add_argument('--calibration', help='Calibration file, the example of the README if omitted')
+    parser.add_argument('--synthetic-frames', type=int, default=20000)
+    args = parser.parse_args()
+    calibration = Calibration.load(args.calibration) if args.calibration else DEFAULT_CALIBRATION
+    homography_coords = calibration.get_homography_coords()
+    rng = np.random.default_rng(0)
+
+    trajectories = {Path(video).name: video_trajectory(video, calibration) for video in args.videos}
+    for fps in (30, 60, 120, 240):
+        trajectories[f'synthetic {fps}fps'] = synthetic_trajectory(args.synthetic_frames, fps, rng)
+
+    print(f"{'trajectory':>16} {'frames':>7} {'bounces':>7} {'mismatches':>10} {'streaming us':>12} "
+          f"{'batch us':>8}")
+    failed = False
+    for name, (timestamps, trajectory) in trajectories.items():
+        start = time.perf_counter()
+        expected = stream_bounces(homography_coords, timestamps, trajectory)
+        streaming_time = time.perf_counter() - start
+        # A fresh detector, so that computing the homography is not timed
+        bounce_detector = BounceDetector(*homography_coords)
+        start = time.perf_counter()
+        bounces = bounce_detector.detect_bounces(trajectory, timestamps)
+        batch_time = time.perf_counter() - start
+
+        mismatches = len(set(expected) ^ set(bounces))
+        failed |= mismatches > 0
+        num_frames = max(len(timestamps), 1)
+        print(f"{name:>16} {len(timestamps):>7} {len(expected):>7} {mismatches:>10} "
+              f"{streaming_time / num_frames * 1e6:>12.2f} {batch_time / num_frames * 1e6:>8.2f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Compares the sweep-line joining of nearby bounding boxes in the Tracker with the original greedy joining, which
+scanned all following boxes that are horizontally nearby once per joined box, and reports their latency per frame.
+
+Both must give identical joined boxes, otherwise the benchmark fails.
+
+Bounding boxes are taken from the masks of a recorded video if one is given, and from random masks: the ball and
+players, a player broken into fragments, and noise scattered across the whole frame.
+
+Usage:
+    python3 benchmarks/box_joining.py [--video VIDEO] [--masks 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detector import Detector  # noqa: E402
+from tracker import Tracker  # noqa: E402
+from utils.utilities import morphological_close, FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+JOIN_DISTANCE_X = 5
+JOIN_DISTANCE_Y = 2 * JOIN_DISTANCE_X
+
+# The Tracker is only used for its private helpers
+_get_bounding_boxes = Tracker._Tracker__get_bounding_boxes
+_join_nearby_bounding_boxes = Tracker._Tracker__join_nearby_bounding_boxes
+
+
+def reference_join(bounding_boxes: np.ndarray) -> np.ndarray:
+    """
+    The original greedy joining of the Tracker.
+    """
+    bounding_boxes = bounding_boxes.tolist()
+    processed = [False] * len(bounding_boxes)
+    new_bounds = []
+    for i, (x_min, y_min, width, height, _) in enumerate(bounding_boxes):
+        if processed[i]:
+            continue
+        processed[i] = True
+        current_x_min, current_y_min, current_x_max, current_y_max = x_min, y_min, x_min + width, y_min + height
+        for j in range(i + 1, len(bounding_boxes)):
+            cand_x_min, cand_y_min, cand_width, cand_height, _ = bounding_boxes[j]
+            cand_x_max, cand_y_max = cand_x_min + cand_width, cand_y_min + cand_height
+            if current_x_max + JOIN_DISTANCE_X >= cand_x_min:
+                if current_y_min < cand_y_min:
+                    if not current_y_max + JOIN_DISTANCE_Y >= cand_y_min:
+                        continue
+                else:
+                    if not current_y_min - JOIN_DISTANCE_Y <= cand_y_max:
+                        continue
+                processed[j] = True
+                current_x_max = cand_x_max
+                current_y_min = min(current_y_min, cand_y_min)
+                current_y_max = max(current_y_max, cand_y_max)
+            else:
+                break
+        width, height = current_x_max - current_x_min, current_y_max - current_y_min
+        new_bounds.append([current_x_min, current_y_min, width, height, width * height])
+    return np.array(new_bounds, dtype=np.int64).reshape(-1, 5)
+
+
+def sorted_bounding_boxes(mask: np.ndarray) -> np.ndarray:
+    """
+    :return: Bounding boxes of the mask sorted as by the Tracker
+    """
+    contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    bounding_boxes = _get_bounding_boxes(contours)
+    return bounding_boxes[np.lexsort((-bounding_boxes[:, 1], bounding_boxes[:, 0]))]
+
+
+def record_masks(video_path: str, max_frames: int) -> list:
+    """
+    :return: Masks of the Detector for the first frames of the video
+    """
+    video_reader = VideoReader(video_path)
+    video_reader.start_reading()
+    detector = Detector()
+    masks = []
+    for frame in video_reader.get_frame():
+        if detector.ready():
+            masks.append(np.copy(detector.process(frame)))
+        else:
+            detector.initialize_with(frame)
+        video_reader.release_frame(frame)
+        if len(masks) == max_frames:
+            video_reader.stop_reading()
+            break
+    return masks
+
+
+def random_masks(scenario: str, count: int, rng: np.random.Generator) -> list:
+    """
+    :return: Masks of the scenario, see the module documentation. Only the masks of players are closed.
+    """
+    masks = []
+    for _ in range(count):
+        mask = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8)
+        if scenario == 'fragments':
+            # A player whose silhouette only partly survived the frame differencing
+            x, y = rng.integers(0, FRAME_WIDTH - 80), rng.integers(0, FRAME_HEIGHT - 240)
+            mask[y:y + 240, x:x + 80][rng.random((240, 80)) < 0.02] = 255
+            masks.append(mask)
+            continue
+        for width, height in ((8, 8), (40, 120), (40, 120)):
+            x, y = rng.integers(0, FRAME_WIDTH - width), rng.integers(0, FRAME_HEIGHT - height)
+            mask[y:y + height, x:x + width] = rng.integers(0, 2, (height, width)) * 255
+        if scenario == 'noise':
+            mask[rng.random(mask.shape) < 2e-3] = 255
+        masks.append(morphological_close(mask, 9) if scenario == 'players' else mask)
+    return masks
+
+
+def time_join(join, boxes_per_mask: list) -> np.ndarray:
+    """
+    :return: Latency of joining the boxes of every mask in microseconds
+    """
+    latencies = []
+    for bounding_boxes in boxes_per_mask:
+        start = time.perf_counter()
+        join(bounding_boxes)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Video to record masks from')
+    parser.add_argument('--max-frames', type=int, default=1000)
+    parser.add_argument('--masks', type=int, default=200, help='Number of random masks per scenario')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    masks_by_name = {}
+    if args.video:
+        masks_by_name['video'] = record_masks(args.video, args.max_frames)
+    for scenario in ('players', 'fragments', 'noise'):
+        masks_by_name[scenario] = random_masks(scenario, args.masks, rng)
+
+    print(f"{'masks':>10} {'boxes':>6} {'differ':>6} {'original us mean/p99/max':>25} {'new us mean/p99/max':>25}")
+    failed = False
+    for name, masks in masks_by_name.items():
+        boxes_per_mask = [sorted_bounding_boxes(mask) for mask in masks]
+        differ = sum(not np.array_equal(reference_join(bounding_boxes), _join_nearby_bounding_boxes(bounding_boxes))
+                     for bounding_boxes in boxes_per_mask)
+        failed |= differ > 0
+
+        timings = []
+        for join in (reference_join, _join_nearby_bounding_boxes):
+            latencies = time_join(join, boxes_per_mask)
+            timings.append(f"{latencies.mean():.0f}/{np.percentile(latencies, 99):.0f}/{latencies.max():.0f}")
+        mean_boxes = np.mean([len(bounding_boxes) for bounding_boxes in boxes_per_mask])
+        print(f"{name:>10} {mean_boxes:>6.0f} {differ:>6} {timings[0]:>25} {timings[1]:>25}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
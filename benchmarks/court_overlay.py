@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compares drawing the court image of an analysis with CourtOverlay, which renders the court and the target grid once
+per target layout and blends all bounces at once when the image is rendered, with the original drawing, which drew
+the court and the target grid for every analysis and blended every bounce into the image as it was recorded.
+
+Reported per number of bounces are the time to draw a court image of either, also with all bounces added to the
+overlay at once, and the largest difference of a pixel between the original and the overlay. The original blend
+added a brightness of one to the whole chunk around a bounce and rounded after every bounce, the overlay blends
+exactly, so the images differ slightly where many bounces overlap. The benchmark fails if they differ by more than
+--max-difference for up to 10 bounces, or if adding the bounces at once changes the image.
+
+Usage:
+    python3 benchmarks/court_overlay.py [--bounces 1 10 100 1000] [--images 50]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stats import AccuracyStatistics  # noqa: E402
+from utils.court import Court, CourtOverlay  # noqa: E402
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+
+
+def reference_draw_ball_projection(court: np.ndarray, x: int, y: int) -> None:
+    """
+    The original per-bounce blend of Court.draw_ball_projection().
+    """
+    chunk_size = 11
+    circle_radius = 6
+
+    if x >= FRAME_WIDTH:
+        x = FRAME_WIDTH - chunk_size
+    elif x <= chunk_size:
+        x = chunk_size
+
+    if y >= FRAME_HEIGHT:
+        y = FRAME_HEIGHT - chunk_size
+    elif y <= chunk_size:
+        y = chunk_size
+
+    y_chunk_lower = y - chunk_size // 2
+    y_chunk_upper = y + chunk_size // 2 + 1
+    x_chunk_lower = x - chunk_size // 2
+    x_chunk_upper = x + chunk_size // 2 + 1
+
+    court_chunk = court[y_chunk_lower: y_chunk_upper, x_chunk_lower: x_chunk_upper]
+    court_chunk_copy = np.copy(court_chunk)
+    cv.circle(court_chunk_copy, center=(chunk_size // 2, chunk_size // 2),
+              radius=circle_radius, color=(255, 0, 0), thickness=-1)
+    chunk_with_circle = cv.addWeighted(court_chunk, 0.7, court_chunk_copy, 0.3, 1.0)
+    court[y_chunk_lower: y_chunk_upper, x_chunk_lower: x_chunk_upper] = chunk_with_circle
+
+
+def reference_court(target_rects: list, bounces: np.ndarray) -> np.ndarray:
+    """
+    :return: Court image drawn as originally
+    """
+    court_img = Court.get_court_drawing()
+    Court.draw_targets_grid(court_img, target_rects)
+    for x, y in bounces.tolist():
+        reference_draw_ball_projection(court_img, x, y)
+    return court_img
+
+
+def overlay_court(target_rects: list, bounces: np.ndarray) -> np.ndarray:
+    """
+    :return: Court image drawn with CourtOverlay
+    """
+    court = CourtOverlay(target_rects)
+    for x, y in bounces.tolist():
+        court.add_ball_projection(x, y)
+    return court.render()
+
+
+def batch_overlay_court(target_rects: list, bounces: np.ndarray) -> np.ndarray:
+    """
+    :return: Court image drawn with CourtOverlay, all bounces added at once
+    """
+    court = CourtOverlay(target_rects)
+    court.add_ball_projections(bounces[:, 0], bounces[:, 1])
+    return court.render()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bounces', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--images', type=int, default=50, help='Number of court images per number of bounces')
+    parser.add_argument('--max-difference', type=int, default=8,
+                        help='Largest difference of a pixel between the two images where bounces do not pile up')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    target_rects = AccuracyStatistics(Court.create_target_rects(1)).get_target_rects()
+
+    print(f"{'bounces':>7} {'original ms':>11} {'overlay ms':>10} {'batch ms':>8} {'max difference':>14}")
+    failed = False
+    for num_bounces in args.bounces:
+        # Bounces around the service box, with a few off the court
+        bounce_sets = [np.column_stack((rng.integers(-20, FRAME_WIDTH + 20, num_bounces),
+                                        rng.integers(300, FRAME_HEIGHT + 20, num_bounces)))
+                       for _ in range(args.images)]
+        timings = []
+        images = []
+        for draw in (reference_court, overlay_court, batch_overlay_court):
+            start = time.perf_counter()
+            images.append([draw(target_rects, bounces) for bounces in bounce_sets])
+            timings.append((time.perf_counter() - start) / args.images * 1e3)
+        max_difference = max(int(np.abs(reference.astype(int) - overlay).max())
+                             for reference, overlay in zip(images[0], images[1]))
+        # Adding bounces at once must not change the image
+        failed |= any(not np.array_equal(overlay, batch) for overlay, batch in zip(images[1], images[2]))
+        # The brightening of the original piles up with every bounce, so only sparse bounces are compared strictly
+        failed |= num_bounces <= 10 and max_difference > args.max_difference
+        print(f"{num_bounces:>7} {timings[0]:>11.3f} {timings[1]:>10.3f} {timings[2]:>8.3f} {max_difference:>14}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Measures the accuracy/throughput tradeoff of frame decimation.
+
+Every video is analysed once per decimation factor, and the detected bounces are scored against labelled bounces as
+in sweep.py: the precision and recall of the bounces matched within --tolerance ms, and the mean distance of the
+matched bounces to the labelled locations in court pixels. The labels of a video VIDEO.mp4 are read from
+VIDEO_bounces.json next to it, see sweep.py. Factors that leave too few frames per second for the bounce detection
+are refused by the pipeline and reported as such.
+
+Synthetic clips are generated for each of --synthetic-fps, whose bounces are known exactly: a ball is hit towards
+the front wall, comes back and bounces on the floor at a random spot in the back of the court at a random time
+between frames, and is hit again. A player moves at the side of the court.
+
+Usage:
+    python3 benchmarks/decimation.py [VIDEO ...] [--calibration CALIBRATION] [--factors 1 2 3 4]
+                                     [--synthetic-fps 60 120 240] [--synthetic-duration 30]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bounce_detector import BounceDetector  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from stats import AccuracyStatistics  # noqa: E402
+from sweep import LABELS_SUFFIX, load_labels, score_bounces  # noqa: E402
+from utils.calibration import Calibration  # noqa: E402
+from utils.court import Court, CourtOverlay  # noqa: E402
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+# The example calibration of the README, which the synthetic clips are drawn for
+DEFAULT_CALIBRATION = Calibration([(200, 380), (340, 380), (200, 450), (340, 450)], [(0, 600), (359, 600)], 1)
+# Fractions of a shot at which the ball reaches the front wall and bounces on the floor
+FRONT_WALL, BOUNCE = 0.45, 0.8
+
+
+def analyse(video_path: str, calibration: Calibration, decimation: int) -> (list, int, float):
+    """
+    :return: Detected bounces, number of video frames covered and elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    video_reader = VideoReader(video_path, decimation=decimation)
+    video_reader.start_reading()
+    stats = AccuracyStatistics(Court.create_target_rects(calibration.direction))
+    pipeline = Pipeline(video_reader, calibration.get_homography_coords(), CourtOverlay(stats.get_target_rects()),
+                        stats, settings=calibration.settings)
+    for _ in pipeline.process_next():
+        pass
+    elapsed = time.perf_counter() - start
+    return pipeline.get_bounces(), video_reader.get_frame_index() + 1, elapsed
+
+
+def synthetic_clip(video_path: str, fps: float, duration: float, calibration: Calibration,
+                   rng: np.random.Generator) -> np.ndarray:
+    """
+    Writes a synthetic clip, see the module documentation.
+    :param duration: Length of the clip in seconds
+    :return: (n, 3) array of the (timestamp, x, y) bounces in court coordinates, see load_labels()
+    """
+    # Shots as (start ms, duration ms, hit x, front wall x, front wall y, bounce x, bounce y), hits at a height of 470
+    hit_y = 470
+    shots = []
+    start = 500.0
+    while start + 2000 < duration * 1000:
+        # Bounces are further apart than the bounce cooldown, so that all can be detected
+        shot_duration = rng.uniform(1500, 1900)
+        shots.append((start, shot_duration, rng.uniform(150, 250), rng.uniform(140, 260), rng.uniform(230, 280),
+                      rng.uniform(120, 300), rng.uniform(520, 590)))
+        start += shot_duration
+
+    def ball_position(timestamp: float):
+        for i, (start, shot_duration, hit_x, wall_x, wall_y, bounce_x, bounce_y) in enumerate(shots):
+            s = (timestamp - start) / shot_duration
+            if not 0 <= s < 1:
+                continue
+            # The ball never stands still in the frame, it turns around sharply at the front wall and the bounce
+            if s < FRONT_WALL:
+                u = s / FRONT_WALL
+                return hit_x + (wall_x - hit_x) * u, hit_y + (wall_y - hit_y) * u
+            if s < BOUNCE:
+                # Falling faster and faster towards the bounce, the lowest point of the ball in the frame
+                u = (s - FRONT_WALL) / (BOUNCE - FRONT_WALL)
+                return wall_x + (bounce_x - wall_x) * u, wall_y + (bounce_y - wall_y) * (u + u * u) / 2
+            u = (s - BOUNCE) / (1 - BOUNCE)
+            next_hit_x = shots[i + 1][2] if i + 1 < len(shots) else hit_x
+            return bounce_x + (next_hit_x - bounce_x) * u, bounce_y - (bounce_y - hit_y) * (3 * u - u * u) / 2
+        return None
+
+    background = cv.GaussianBlur(rng.integers(60, 120, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8), (11, 11), 0)
+    writer = cv.VideoWriter(video_path, cv.VideoWriter_fourcc(*'mp4v'), fps, (FRAME_WIDTH, FRAME_HEIGHT))
+    for i in range(int(duration * fps)):
+        timestamp = i * 1000 / fps
+        frame = background.copy()
+        player_x = int(60 + 30 * np.sin(timestamp / 700))
+        cv.rectangle(frame, (player_x - 30, 350), (player_x + 30, 600), (30, 30, 200), -1)
+        position = ball_position(timestamp)
+        if position is not None:
+            cv.circle(frame, (int(round(position[0])), int(round(position[1]))), 5, (250, 250, 250), -1)
+        writer.write(frame)
+    writer.release()
+
+    bounces = np.array([(start + BOUNCE * shot_duration, bounce_x, bounce_y)
+                        for start, shot_duration, _, _, _, bounce_x, bounce_y in shots])
+    homography_matrix = BounceDetector.compute_homography(*calibration.get_homography_coords())
+    bounces[:, 1:] = cv.perspectiveTransform(bounces[:, 1:].reshape(-1, 1, 2), homography_matrix).reshape(-1, 2)
+    return bounces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*', metavar='VIDEO')
+    parser.add_argument('--calibration', help='Calibration file of the videos, the example of the README if omitted')
+    parser.add_argument('--factors', nargs='+', type=int, default=[1, 2, 3, 4])
+    parser.add_argument('--synthetic-fps', nargs='*', type=float, default=[60, 120, 240])
+    parser.add_argument('--synthetic-duration', type=float, default=30, help='Length of the synthetic clips in s')
+    parser.add_argument('--tolerance', type=float, default=100,
+                        help='Largest time in ms between a detected and a labelled bounce that match')
+    args = parser.parse_args()
+    calibration = Calibration.load(args.calibration) if args.calibration else DEFAULT_CALIBRATION
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        videos = {Path(video).name: (video, load_labels(Path(video).with_name(Path(video).stem + LABELS_SUFFIX)),
+                                     calibration) for video in args.videos}
+        for fps in args.synthetic_fps:
+            video_path = str(Path(clip_dir) / f"synthetic_{fps:g}.mp4")
+            labels = synthetic_clip(video_path, fps, args.synthetic_duration, DEFAULT_CALIBRATION, rng)
+            videos[f"synthetic {fps:g}fps"] = (video_path, labels, DEFAULT_CALIBRATION)
+
+        print(f"{'video':>16} {'labels':>6} {'factor':>6} {'frames/s':>9} {'speedup':>8} {'bounces':>8} "
+              f"{'precision':>9} {'recall':>7} {'err px':>7}")
+        for name, (video_path, labels, video_calibration) in videos.items():
+            base_fps = None
+            for factor in args.factors:
+                try:
+                    bounces, num_frames, elapsed = analyse(video_path, video_calibration, factor)
+                except ValueError:
+                    # Too few frames per second are left for the bounce detection
+                    print(f"{name:>16} {len(labels):>6} {factor:>6} {'refused':>9}")
+                    continue
+                fps = num_frames / elapsed
+                base_fps = base_fps or fps
+                score = score_bounces(bounces, labels, args.tolerance)
+                print(f"{name:>16} {len(labels):>6} {factor:>6} {fps:>9.1f} {fps / base_fps:>8.2f} "
+                      f"{len(bounces):>8} {score.get_precision():>9.2f} {score.get_recall():>7.2f} "
+                      f"{score.get_mean_error():>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
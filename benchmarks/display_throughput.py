@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Measures the analysis throughput with the preview on, compared to a headless analysis.
+
+A display thread stands in for the Tk main loop and converts frames for display like PanelView does. It either
+converts every processed frame as the analysis view originally did through one Tk event per frame, or only the
+latest frame published into a FrameMailbox every --refresh-interval milliseconds as the analysis view does now.
+
+Usage:
+    python3 benchmarks/display_throughput.py VIDEO --service-box 200,380 340,380 200,450 340,450 \\
+        --court-boundary 0,600 359,600 --direction 1
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from queue import Queue
+
+import PIL.Image
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import Pipeline  # noqa: E402
+from stats import AccuracyStatistics  # noqa: E402
+from utils.court import Court, CourtOverlay  # noqa: E402
+from utils.frame_mailbox import FrameMailbox  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+
+def parse_point(text: str) -> (int, int):
+    x, y = text.split(',')
+    return int(x), int(y)
+
+
+def display(frame: np.ndarray, court: CourtOverlay) -> None:
+    """
+    Converts the frame and the court image for display as PanelView does.
+    """
+    for img in (frame, court.render()):
+        PIL.Image.fromarray(cv.cvtColor(img, cv.COLOR_BGR2RGB))
+
+
+def analyse(video_path: str, homography_coords: list, direction: int, mode: str,
+            refresh_interval: float) -> (int, int, float):
+    """
+    :param mode: 'headless', 'every frame' or 'mailbox'
+    :return: Number of processed frames, number of displayed frames and elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    video_reader = VideoReader(video_path)
+    video_reader.start_reading()
+    stats = AccuracyStatistics(Court.create_target_rects(direction))
+    court = CourtOverlay(stats.get_target_rects())
+    pipeline = Pipeline(video_reader, homography_coords, court, stats)
+
+    frames = Queue()
+    mailbox = None
+    done = threading.Event()
+    num_displayed = 0
+
+    def display_every_frame():
+        nonlocal num_displayed
+        while (frame := frames.get()) is not None:
+            display(frame, court)
+            num_displayed += 1
+
+    def display_latest_frame():
+        nonlocal num_displayed
+        while not done.wait(refresh_interval / 1000):
+            frame = mailbox.take()
+            if frame is not None:
+                display(frame, court)
+                mailbox.release(frame)
+                num_displayed += 1
+
+    display_thread = None
+    if mode == 'every frame':
+        display_thread = threading.Thread(target=display_every_frame)
+    elif mode == 'mailbox':
+        display_thread = threading.Thread(target=display_latest_frame)
+    if display_thread is not None:
+        display_thread.start()
+
+    num_processed = 0
+    for img, _ in pipeline.process_next():
+        if mode == 'every frame':
+            frames.put(np.copy(img))
+        elif mode == 'mailbox':
+            if mailbox is None:
+                mailbox = FrameMailbox(img.shape, img.dtype)
+            mailbox.publish(img)
+        num_processed += 1
+    # The analysis is finished once the display has caught up
+    frames.put(None)
+    done.set()
+    if display_thread is not None:
+        display_thread.join()
+    return num_processed, num_displayed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--service-box', nargs=4, type=parse_point, required=True, metavar='X,Y')
+    parser.add_argument('--court-boundary', nargs=2, type=parse_point, required=True, metavar='X,Y')
+    parser.add_argument('--direction', type=int, choices=(-1, 1), required=True)
+    parser.add_argument('--refresh-interval', type=float, default=33, help='Display refresh interval in ms')
+    args = parser.parse_args()
+
+    print(f"{'mode':>11} {'frames/s':>9} {'relative':>8} {'displayed':>9}")
+    headless_fps = None
+    for mode in ('headless', 'every frame', 'mailbox'):
+        # BounceDetector modifies the destination coordinates, so every run gets a fresh copy
+        homography_coords = [(np.array(args.service_box), np.array(args.court_boundary)),
+                             Court.get_homography_dst_coords(args.direction)]
+        num_processed, num_displayed, elapsed = analyse(args.video, homography_coords, args.direction, mode,
+                                                        args.refresh_interval)
+        fps = num_processed / elapsed
+        headless_fps = headless_fps or fps
+        print(f"{mode:>11} {fps:>9.1f} {fps / headless_fps:>8.2f} {num_displayed:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Measures how gating the ball candidates affects the cost and the accuracy of the Tracker in noisy frames.
+
+A synthetic ball flies across the frame, falling under gravity, bouncing off the floor and being hit back and forth,
+which reverses its direction abruptly. Each frame contains the ball (except for a few frames) and a fixed number of
+distractors: either scattered across the whole frame, or crowded into the back of the court like reflections on the
+glass back wall. The pipeline's estimator predicts the ball from the Tracker's selections, as in the Pipeline.
+
+Reported per stream are the time per frame of Tracker.select_from_candidates() and the fraction of frames in which
+the ball is selected, with and without gating.
+
+Usage:
+    python3 benchmarks/gating.py [--frames 3000] [--distractors 0 5 20 50 100 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from double_exponential_estimator import DoubleExponentialEstimator  # noqa: E402
+from tracker import Tracker  # noqa: E402
+from utils.rect import Rect, BoxArray  # noqa: E402
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS, FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+
+
+def synthetic_rally(num_frames: int, num_distractors: int, crowded: bool, rng: np.random.Generator) -> list:
+    """
+    :return: List of (candidates, ball or None if missing) per frame
+    """
+    stream = []
+    x, y, vx, vy = FRAME_WIDTH / 4, FRAME_HEIGHT / 2, 6.0, -6.0
+    for i in range(num_frames):
+        x, y, vy = x + vx, y + vy, vy + 0.3
+        if not 0 <= x < FRAME_WIDTH - 25:
+            vx = -vx
+        if y > FRAME_HEIGHT - 25:
+            vy = -abs(vy) * 0.8
+        if i % 90 == 0:
+            # A hit sends the ball back at a new speed
+            vx, vy = -np.sign(vx) * rng.uniform(4, 12), -rng.uniform(4, 10)
+
+        if crowded:
+            # Slowly shimmering reflections in the upper third of the frame
+            distractor_x = rng.integers(0, FRAME_WIDTH, num_distractors)
+            distractor_y = rng.integers(0, FRAME_HEIGHT // 3, num_distractors)
+        else:
+            distractor_x = rng.integers(0, FRAME_WIDTH, num_distractors)
+            distractor_y = rng.integers(0, FRAME_HEIGHT, num_distractors)
+        sizes = rng.integers(14, 40, (num_distractors, 2))
+        candidates = np.column_stack((distractor_x, distractor_y, sizes))
+
+        ball = None
+        if rng.random() < 0.95:
+            ball = Rect(int(x), int(y), 24, 25)
+            candidates = np.insert(candidates, rng.integers(0, num_distractors + 1), (ball.x, ball.y, 24, 25), axis=0)
+        stream.append((BoxArray(candidates), ball))
+    return stream
+
+
+def track(stream: list, gating: bool) -> (float, float):
+    """
+    :return: Mean time per frame of the candidate selection in microseconds, fraction of frames with a ball in which
+    the ball was selected
+    """
+    tracker = Tracker(gating=gating)
+    estimator = DoubleExponentialEstimator()
+    elapsed = 0
+    hits = 0
+    for i, (candidates, ball) in enumerate(stream):
+        prediction = estimator.predict()
+        if prediction.x < 0 or prediction.y < 0:
+            prediction = Rect(-prediction.width, -prediction.height, prediction.width, prediction.height)
+        start = time.perf_counter()
+        selection = tracker.select_from_candidates(candidates, prediction, i * REFERENCE_FRAME_INTERVAL_MS)
+        elapsed += time.perf_counter() - start
+        estimator.correct(selection)
+        hits += ball is not None and selection == ball
+    num_balls = sum(ball is not None for _, ball in stream)
+    return elapsed / len(stream) * 1e6, hits / num_balls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--distractors', type=int, nargs='+', default=[0, 5, 20, 50, 100, 200])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'stream':>16} {'ungated us':>10} {'gated us':>8} {'ungated found':>13} {'gated found':>11}")
+    for crowded in (False, True):
+        for num_distractors in args.distractors:
+            stream = synthetic_rally(args.frames, num_distractors, crowded, rng)
+            ungated_time, ungated_found = track(stream, gating=False)
+            gated_time, gated_found = track(stream, gating=True)
+            name = f"{'crowd' if crowded else 'scattered'} {num_distractors}"
+            print(f"{name:>16} {ungated_time:>10.1f} {gated_time:>8.1f} {ungated_found:>13.1%} {gated_found:>11.1%}")
+
+
+if __name__ == '__main__':
+    main()
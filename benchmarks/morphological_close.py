@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Checks that the morphological closing of the Detector is bit-identical to the original implementation of nine
+3x3 dilations followed by a 3x3 erosion, and measures the speedup.
+
+Equivalence is checked on the thresholded masks of a recorded video if one is given, and on random masks.
+Timings are taken on random masks at several processing resolutions. The closing is confined to the bounding box of
+the foreground, so its speed depends on how much of the image the foreground spans: the random masks contain only
+the ball, the ball and a player, or two players and noise pixels scattered across the whole image. In the latter
+case the whole image is processed and the closing should be as fast as the original.
+tests/test_morphological_close.py checks the equivalence on a fixed set of recorded masks.
+
+Usage:
+    python3 benchmarks/morphological_close.py [--video VIDEO] [--resolutions 360x640 720x1280 1080x1920]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.utilities import blur_grayscale, morphological_close, FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+
+ITERATIONS = 9
+KERNEL = np.ones((3, 3), np.uint8)
+
+
+def reference_close(image: np.ndarray) -> np.ndarray:
+    """
+    The original closing of the Detector.
+    """
+    dilated = cv.dilate(image, KERNEL, iterations=ITERATIONS)
+    return cv.erode(dilated, KERNEL)
+
+
+def record_masks(video_path: str, max_frames: int) -> list:
+    """
+    :return: Thresholded masks of the video as computed by the Detector before the closing.
+    """
+    stream = cv.VideoCapture(video_path)
+    blurred = []
+    masks = []
+    while len(masks) < max_frames:
+        ok, frame = stream.read()
+        if not ok:
+            break
+        blurred.append(blur_grayscale(cv.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))))
+        if len(blurred) < 3:
+            continue
+        combined = cv.bitwise_and(cv.absdiff(blurred[-3], blurred[-2]), cv.absdiff(blurred[-2], blurred[-1]))
+        ret, thresholded = cv.threshold(combined, 0, 255, cv.THRESH_OTSU)
+        if ret <= 8:
+            _, thresholded = cv.threshold(combined, 24, 255, cv.THRESH_BINARY)
+        masks.append(thresholded)
+        blurred.pop(0)
+    stream.release()
+    return masks
+
+
+# Scenario name -> sizes of the moving blobs at 360x640, fraction of noise pixels
+SCENARIOS = {
+    'ball': ((8,), 0),
+    'ball+player': ((8, 60), 0),
+    'players+noise': ((8, 60, 60), 1e-4),
+}
+
+
+def random_masks(shape: tuple, blob_sizes: tuple, noise: float, count: int, rng: np.random.Generator) -> list:
+    """
+    :return: Masks with blobs of about twice the given size in height scattered across the image, and noise pixels.
+    """
+    height, width = shape
+    scale = width / FRAME_WIDTH
+    masks = []
+    for _ in range(count):
+        mask = np.zeros(shape, np.uint8)
+        for blob_size in blob_sizes:
+            blob_width, blob_height = int(blob_size * scale), int(2 * blob_size * scale)
+            x, y = rng.integers(0, width - blob_width), rng.integers(0, height - blob_height)
+            mask[y:y + blob_height, x:x + blob_width] = rng.integers(0, 2, (blob_height, blob_width)) * 255
+        mask[rng.random(shape) < noise] = 255
+        masks.append(mask)
+    return masks
+
+
+def check_equivalence(masks: list) -> int:
+    """
+    :return: Number of masks whose closing differs from the reference
+    """
+    dst = np.empty_like(masks[0])
+    dilated = np.empty_like(masks[0])
+    return sum(not np.array_equal(reference_close(mask), morphological_close(mask, ITERATIONS, dst, dilated))
+               for mask in masks)
+
+
+def time_per_mask(close, masks: list, repeat: int) -> float:
+    """
+    :return: Mean time in microseconds to close a mask. Each mask is closed repeatedly, as in the Detector the mask
+    has just been written and is still cached.
+    """
+    start = time.perf_counter()
+    for mask in masks:
+        for _ in range(repeat):
+            close(mask)
+    return (time.perf_counter() - start) / (repeat * len(masks)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Video to record masks from')
+    parser.add_argument('--max-frames', type=int, default=1000)
+    parser.add_argument('--resolutions', nargs='+', default=['360x640', '720x1280', '1080x1920'])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    masks_by_name = {}
+    if args.video:
+        masks_by_name[f"video {FRAME_WIDTH}x{FRAME_HEIGHT}"] = record_masks(args.video, args.max_frames)
+    for resolution in args.resolutions:
+        shape = tuple(map(int, reversed(resolution.split('x'))))
+        for scenario, (blob_sizes, noise) in SCENARIOS.items():
+            masks_by_name[f"{scenario} {resolution}"] = random_masks(shape, blob_sizes, noise, 50, rng)
+
+    print(f"{'masks':>24} {'count':>6} {'mismatches':>10} {'original us':>11} {'new us':>8} {'speedup':>8}")
+    failed = False
+    for name, masks in masks_by_name.items():
+        mismatches = check_equivalence(masks)
+        failed |= mismatches > 0
+        dst = np.empty_like(masks[0])
+        dilated = np.empty_like(masks[0])
+        original = time_per_mask(reference_close, masks, args.repeat)
+        new = time_per_mask(lambda mask: morphological_close(mask, ITERATIONS, dst, dilated), masks, args.repeat)
+        print(f"{name:>24} {len(masks):>6} {mismatches:>10} {original:>11.1f} {new:>8.1f} {original / new:>8.2f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
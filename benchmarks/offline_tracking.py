@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Compares finding the ball with the TrajectorySolver over a whole stream of ball candidates with the online loop of
+the Pipeline, i.e. predicting with the DoubleExponentialEstimator, selecting with the Tracker and correcting the
+estimator frame by frame.
+
+The candidate streams are the synthetic rallies of benchmarks/gating.py. Reported per stream are the time per frame
+of either and the fraction of frames with a ball in which the ball was found. Frames the solver interpolates count
+as found if the interpolation lies within a ball size of the ball.
+
+Usage:
+    python3 benchmarks/offline_tracking.py [--frames 3000] [--distractors 0 5 20 50]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from double_exponential_estimator import DoubleExponentialEstimator  # noqa: E402
+from gating import synthetic_rally  # noqa: E402
+from tracker import Tracker  # noqa: E402
+from trajectory_solver import TrajectorySolver  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS  # noqa: E402
+
+
+def track_online(stream: list) -> (float, np.ndarray):
+    """
+    :return: Time per frame in microseconds, (n, 2) array of the selected positions
+    """
+    tracker = Tracker()
+    estimator = DoubleExponentialEstimator()
+    positions = []
+    start = time.perf_counter()
+    for i, (candidates, _) in enumerate(stream):
+        prediction = estimator.predict()
+        if prediction.x < 0 or prediction.y < 0:
+            prediction = Rect(-prediction.width, -prediction.height, prediction.width, prediction.height)
+        selection = tracker.select_from_candidates(candidates, prediction, i * REFERENCE_FRAME_INTERVAL_MS)
+        estimator.correct(selection)
+        positions.append((selection.x, selection.y))
+    return (time.perf_counter() - start) / len(stream) * 1e6, np.array(positions, dtype=np.float64)
+
+
+def track_offline(stream: list) -> (float, np.ndarray):
+    """
+    :return: Time per frame in microseconds, (n, 2) array of the found positions, NaN where none was found
+    """
+    start = time.perf_counter()
+    solver = TrajectorySolver()
+    for i, (candidates, _) in enumerate(stream):
+        solver.add_frame(candidates, i * REFERENCE_FRAME_INTERVAL_MS)
+    _, trajectory = solver.solve()
+    return (time.perf_counter() - start) / len(stream) * 1e6, trajectory[:, :2]
+
+
+def found_fraction(stream: list, positions: np.ndarray) -> float:
+    """
+    :return: Fraction of frames with a ball in which the position lies within a ball size of the ball
+    """
+    balls = [(i, ball) for i, (_, ball) in enumerate(stream) if ball is not None]
+    errors = np.array([np.hypot(*(positions[i] - (ball.x, ball.y))) for i, ball in balls])
+    return float(np.mean(errors < 25))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--distractors', type=int, nargs='+', default=[0, 5, 20, 50])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'stream':>16} {'online us':>9} {'offline us':>10} {'online found':>12} {'offline found':>13}")
+    for crowded in (False, True):
+        for num_distractors in args.distractors:
+            stream = synthetic_rally(args.frames, num_distractors, crowded, rng)
+            online_time, online_positions = track_online(stream)
+            offline_time, offline_positions = track_offline(stream)
+            name = f"{'crowd' if crowded else 'scattered'} {num_distractors}"
+            print(f"{name:>16} {online_time:>9.1f} {offline_time:>10.1f} "
+                  f"{found_fraction(stream, online_positions):>12.1%} "
+                  f"{found_fraction(stream, offline_positions):>13.1%}")
+
+
+if __name__ == '__main__':
+    main()
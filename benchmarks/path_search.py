@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Checks that the path search of the Tracker selects the same candidates as the original implementation, which
+recomputed all paths through the candidate history candidate by candidate on every frame, and compares their speed.
+The speed of the Tracker is also reported with its scalar handling of frames with few candidates switched off, i.e.
+with every frame going through NumPy, which shows what the scalar handling saves for typical footage.
+
+Candidate streams, i.e. the ball candidates, prediction and timestamp of every frame, are recorded from videos and
+generated synthetically with a fixed number of candidates per frame. Both trackers are fed the same streams, and the
+Tracker's gating of frames with many candidates is switched off, as the original implementation has none.
+The original implementation takes quadratically longer with the number of candidates, so it only replays the first
+frames of streams with many candidates.
+
+Usage:
+    python3 benchmarks/path_search.py [VIDEO ...] [--decimation 1] [--synthetic-frames 2000]
+                                      [--candidates 1 2 5 10 20 50 100 200]
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from detector import Detector  # noqa: E402
+from double_exponential_estimator import DoubleExponentialEstimator  # noqa: E402
+from tracker import Tracker  # noqa: E402
+from utils.rect import Rect, BoxArray  # noqa: E402
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS, FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+
+class ReferenceTracker:
+    """
+    Frozen copy of the original candidate history and path search of the Tracker.
+    """
+
+    def __init__(self):
+        self.candidate_history = deque([[Rect(0, 0, 0, 0)], [Rect(0, 0, 0, 0)]])
+        self.history_timestamps = deque()
+        self.history_duration = (6 + 0.5) * REFERENCE_FRAME_INTERVAL_MS
+        self.current_timestamp = None
+        self.prev_best_dist = 0
+        self.dist_jump_cutoff = 100
+        self.best_paths = dict()
+
+    def select_from_candidates(self, ball_candidates: list, prediction: Rect, timestamp: float) -> Rect:
+        if self.current_timestamp is None:
+            for i in range(len(self.candidate_history), 0, -1):
+                self.history_timestamps.append(timestamp - i * REFERENCE_FRAME_INTERVAL_MS)
+        self.current_timestamp = timestamp
+
+        ball_candidates = list(ball_candidates)
+        self.candidate_history.append(ball_candidates)
+        self.history_timestamps.append(timestamp)
+        while self.history_timestamps[0] < timestamp - self.history_duration:
+            self.history_timestamps.popleft()
+            self.candidate_history.popleft()
+        if not ball_candidates:
+            self.candidate_history[-1].extend([prediction])
+
+        best_candidate = self.find_shortest_path_candidate(prediction)
+        return prediction if best_candidate is None else best_candidate
+
+    def find_shortest_path_candidate(self, prediction: Rect) -> Rect:
+        self.best_paths.clear()
+        for i in range(1, len(self.candidate_history)):
+            for point_assumed_best in self.candidate_history[i]:
+                best_dist = sys.maxsize
+                best_from_point = None
+                squareness = np.linalg.norm(point_assumed_best.width - point_assumed_best.height)
+                for from_point in self.candidate_history[i - 1]:
+                    dist = np.linalg.norm((point_assumed_best.x - from_point.x,
+                                           point_assumed_best.y - from_point.y)) + squareness
+                    if dist < best_dist:
+                        best_dist = dist
+                        best_from_point = from_point
+                if best_from_point in self.best_paths:
+                    self.best_paths[point_assumed_best] = (self.best_paths[best_from_point][0] + best_dist,
+                                                           best_from_point, self.best_paths[best_from_point][2] + 1)
+                else:
+                    self.best_paths[point_assumed_best] = [best_dist, best_from_point, 1]
+
+        best_dist = sys.maxsize
+        best_point = None
+        for endpoint_rect in self.best_paths:
+            if self.best_paths[endpoint_rect][2] == len(self.candidate_history) - 1:
+                dist = self.best_paths[endpoint_rect][0]
+                if best_dist > dist:
+                    best_dist = dist
+                    best_point = endpoint_rect
+
+        if self.prev_best_dist < best_dist - self.dist_jump_cutoff:
+            self.prev_best_dist *= 1.2
+            self.candidate_history[-1].extend([prediction])
+            return prediction
+        self.prev_best_dist = best_dist
+        return best_point
+
+
+def record_stream(video_path: str, decimation: int) -> list:
+    """
+    Runs the detection and tracking stages of the Pipeline over a video.
+    :return: List of (ball candidates, prediction, timestamp) per frame
+    """
+    video_reader = VideoReader(video_path, decimation=decimation)
+    video_reader.start_reading()
+    detector = Detector()
+    estimator = DoubleExponentialEstimator()
+    tracker = Tracker()
+    stream = []
+    previous_timestamp = None
+    for frame in video_reader.get_frame():
+        timestamp = video_reader.get_timestamp()
+        if not detector.ready():
+            detector.initialize_with(frame)
+            previous_timestamp = timestamp
+            video_reader.release_frame(frame)
+            continue
+        if timestamp <= previous_timestamp:
+            timestamp = previous_timestamp + decimation * REFERENCE_FRAME_INTERVAL_MS
+        dt = (timestamp - previous_timestamp) / REFERENCE_FRAME_INTERVAL_MS
+        previous_timestamp = timestamp
+
+        candidates = tracker.extract_candidates(detector.process(frame))
+        prediction = estimator.predict(t=1, dt=dt)
+        if prediction.x < 0 or prediction.y < 0:
+            prediction = Rect(-prediction.width, -prediction.height, prediction.width, prediction.height)
+        estimator.correct(tracker.select_from_candidates(candidates, prediction, timestamp))
+        stream.append((candidates, prediction, timestamp))
+        video_reader.release_frame(frame)
+    return stream
+
+
+def synthetic_stream(num_frames: int, num_candidates: int, rng: np.random.Generator) -> list:
+    """
+    :return: List of (ball candidates, prediction, timestamp) per frame for a ball bouncing across the frame among
+    randomly placed distractors, num_candidates in total. The ball is missing from some frames.
+    """
+    stream = []
+    x, y, vx, vy = FRAME_WIDTH / 2, FRAME_HEIGHT / 2, 3.0, -8.0
+    for i in range(num_frames):
+        x, y, vy = x + vx, y + vy, vy + 0.3
+        if not 0 <= x < FRAME_WIDTH - 25:
+            vx = -vx
+        if y > FRAME_HEIGHT - 25:
+            vy = -abs(vy) * 0.9
+        candidates = [Rect(int(rng.integers(0, FRAME_WIDTH)), int(rng.integers(0, FRAME_HEIGHT)),
+                           int(rng.integers(10, 40)), int(rng.integers(10, 40)))
+                      for _ in range(num_candidates)]
+        if rng.random() < 0.9:
+            candidates[int(rng.integers(0, num_candidates))] = Rect(int(x), int(y), 24, 25)
+        prediction = Rect(x + rng.normal(0, 5), y + rng.normal(0, 5), 24, 25)
+        stream.append((BoxArray.from_rects(candidates), prediction, i * REFERENCE_FRAME_INTERVAL_MS))
+    return stream
+
+
+def replay(tracker, stream: list) -> (list, float):
+    """
+    :return: Selected candidate per frame and mean time per frame in microseconds
+    """
+    start = time.perf_counter()
+    selections = [tracker.select_from_candidates(candidates, prediction, timestamp)
+                  for candidates, prediction, timestamp in stream]
+    return selections, (time.perf_counter() - start) / max(len(stream), 1) * 1e6
+
+
+def vectorised_tracker() -> Tracker:
+    """
+    :return: Tracker that handles frames with few candidates with NumPy as well
+    """
+    tracker = Tracker(gating=False)
+    tracker._Tracker__MAX_SCALAR_CANDIDATES = 0
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*', metavar='VIDEO')
+    parser.add_argument('--decimation', type=int, default=1)
+    parser.add_argument('--synthetic-frames', type=int, default=2000)
+    parser.add_argument('--candidates', type=int, nargs='+', default=[1, 2, 5, 10, 20, 50, 100, 200],
+                        help='Numbers of candidates per frame of the synthetic streams')
+    parser.add_argument('--reference-budget', type=int, default=2 * 10 ** 5,
+                        help='Limits the frames replayed by the original implementation to about this many '
+                             'candidate pairs per stream')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    streams = {Path(video).name: record_stream(video, args.decimation) for video in args.videos}
+    for num_candidates in args.candidates:
+        streams[f"synthetic {num_candidates}"] = synthetic_stream(args.synthetic_frames, num_candidates, rng)
+
+    print(f"{'stream':>16} {'frames':>7} {'checked':>7} {'mismatches':>10} {'original us':>11} {'numpy us':>8} "
+          f"{'new us':>8} {'speedup':>8}")
+    failed = False
+    for name, stream in streams.items():
+        max_candidates = max((len(candidates) for candidates, _, _ in stream), default=1)
+        num_checked = max(10, min(len(stream), args.reference_budget // max(max_candidates, 1) ** 2))
+        reference, reference_time = replay(ReferenceTracker(), stream[:num_checked])
+        selections, new_time = replay(Tracker(gating=False), stream)
+        vectorised_selections, vectorised_time = replay(vectorised_tracker(), stream)
+        mismatches = sum(a != b for a, b in zip(reference, selections))
+        failed |= mismatches > 0 or selections != vectorised_selections
+        print(f"{name:>16} {len(stream):>7} {len(reference):>7} {mismatches:>10} {reference_time:>11.1f} "
+              f"{vectorised_time:>8.1f} {new_time:>8.1f} {reference_time / new_time:>8.2f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Checks that AccuracyStatistics records bounces into the same targets as the original linear scan over the target
+rects with utilities.is_within(), and compares the time per bounce of the scan, of record_bounce() and of
+record_bounces().
+
+Target layouts are the court targets in both directions and random layouts of overlapping rects of negative and
+positive widths. Bounces are random whole pixels on and around the court drawing, the corners of the targets and a
+few fractional coordinates.
+
+Usage:
+    python3 benchmarks/target_lookup.py [--bounces 20000] [--layouts 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stats import AccuracyStatistics  # noqa: E402
+from utils.court import Court  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+from utils.utilities import is_within, FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+
+
+def reference_record(stats: AccuracyStatistics, bounces: list) -> list:
+    """
+    :return: Per bounce, the target rect the original linear scan recorded it into
+    """
+    targets = stats.get_target_rects()
+    return [next((rect for rect in targets[1:] if is_within(rect, x, y)), stats.non_target_rect)
+            for x, y in bounces]
+
+
+def recorded_targets(stats: AccuracyStatistics) -> dict:
+    """
+    :return: Mapping from each recorded bounce to the target rect it was recorded into
+    """
+    box_to_bounces = stats._AccuracyStatistics__target_rects
+    return {bounce: rect for rect, bounces in box_to_bounces.items() for bounce in bounces}
+
+
+def random_layout(rng: np.random.Generator) -> list:
+    """
+    :return: Random overlapping target rects, about half of them of negative width
+    """
+    num_rects = int(rng.integers(3, 30))
+    return [Rect(int(rng.integers(0, FRAME_WIDTH)), int(rng.integers(0, FRAME_HEIGHT)),
+                 int(rng.choice((-1, 1)) * rng.integers(1, 150)), int(rng.integers(1, 150)))
+            for _ in range(num_rects)]
+
+
+def random_bounces(target_rects: list, num_bounces: int, rng: np.random.Generator) -> list:
+    """
+    :return: Distinct (x, y) bounces, see the module documentation
+    """
+    xs = rng.integers(-20, FRAME_WIDTH + 20, num_bounces)
+    ys = rng.integers(-20, FRAME_HEIGHT + 20, num_bounces)
+    bounces = set(zip(xs.tolist(), ys.tolist()))
+    for rect in target_rects:
+        bounces.update(((rect.x, rect.y), (rect.x + rect.width, rect.y + rect.height)))
+    bounces.update((float(x) + 0.5, float(y)) for x, y in zip(xs[:100].tolist(), ys[:100].tolist()))
+    return list(bounces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bounces', type=int, default=20000)
+    parser.add_argument('--layouts', type=int, default=20, help='Number of random target layouts')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    layouts = {'court right': Court.create_target_rects(1), 'court left': Court.create_target_rects(-1)}
+    for i in range(args.layouts):
+        layouts[f'random {i}'] = random_layout(rng)
+
+    print(f"{'layout':>12} {'targets':>7} {'bounces':>7} {'mismatches':>10} {'scan us':>7} {'record us':>9} "
+          f"{'batch us':>8}")
+    failed = False
+    for name, target_rects in layouts.items():
+        bounces = random_bounces(target_rects, args.bounces, rng)
+        xs, ys = np.array(bounces).T
+
+        stats = AccuracyStatistics(list(target_rects))
+        start = time.perf_counter()
+        expected = reference_record(stats, bounces)
+        scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for x, y in bounces:
+            stats.record_bounce(x, y)
+        record_time = time.perf_counter() - start
+        batch_stats = AccuracyStatistics(list(target_rects))
+        start = time.perf_counter()
+        batch_stats.record_bounces(xs, ys)
+        batch_time = time.perf_counter() - start
+
+        mismatches = 0
+        for recorded in (recorded_targets(stats), recorded_targets(batch_stats)):
+            mismatches += sum(recorded[bounce] != rect for bounce, rect in zip(bounces, expected))
+        failed |= mismatches > 0
+        print(f"{name:>12} {len(target_rects):>7} {len(bounces):>7} {mismatches:>10} "
+              f"{scan_time / len(bounces) * 1e6:>7.2f} {record_time / len(bounces) * 1e6:>9.2f} "
+              f"{batch_time / len(bounces) * 1e6:>8.2f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compares the throughput of the pipeline detecting the ball candidates on the tracking thread with detecting them on
+a separate thread, and reports how busy each stage was.
+
+The bounces of both runs must be identical, otherwise the benchmark fails.
+
+Usage:
+    python3 benchmarks/threaded_pipeline.py VIDEO --service-box 200,380 340,380 200,450 340,450 \\
+        --court-boundary 0,600 359,600 --direction 1 [--offline]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import Pipeline  # noqa: E402
+from stats import AccuracyStatistics  # noqa: E402
+from utils.court import Court, CourtOverlay  # noqa: E402
+from utils.profiler import StageProfiler  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+
+def parse_point(text: str) -> (int, int):
+    x, y = text.split(',')
+    return int(x), int(y)
+
+
+def analyse(video_path: str, homography_coords: list, direction: int, offline: bool,
+            threaded: bool) -> (list, int, float, dict, dict):
+    """
+    :return: Detected bounces, number of processed frames, elapsed wall time in seconds, stage utilisation and mean
+    stage latencies in ms.
+    """
+    start = time.perf_counter()
+    video_reader = VideoReader(video_path)
+    video_reader.start_reading()
+    stats = AccuracyStatistics(Court.create_target_rects(direction))
+    profiler = StageProfiler(enabled=True)
+    pipeline = Pipeline(video_reader, homography_coords, CourtOverlay(stats.get_target_rects()), stats,
+                        profiler=profiler, offline=offline, threaded=threaded)
+    num_frames = sum(1 for _ in pipeline.process_next())
+    elapsed = time.perf_counter() - start
+    latencies = {stage: summary['mean'] for stage, summary in profiler.get_report()['stages_ms'].items()}
+    return pipeline.get_bounces(), num_frames, elapsed, pipeline.get_stage_utilisation(), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--service-box', nargs=4, type=parse_point, required=True, metavar='X,Y')
+    parser.add_argument('--court-boundary', nargs=2, type=parse_point, required=True, metavar='X,Y')
+    parser.add_argument('--direction', type=int, choices=(-1, 1), required=True)
+    parser.add_argument('--offline', action='store_true', help="Find the ball trajectory once the video has been read")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'frames/s':>9} {'speedup':>7} {'bounces':>7} {'decode':>6} {'detect':>6} {'track':>6}  "
+          f"mean stage ms")
+    results = []
+    for threaded in (False, True):
+        # BounceDetector modifies the destination coordinates, so every run gets a fresh copy
+        homography_coords = [(np.array(args.service_box), np.array(args.court_boundary)),
+                             Court.get_homography_dst_coords(args.direction)]
+        bounces, num_frames, elapsed, utilisation, latencies = analyse(args.video, homography_coords, args.direction,
+                                                                       args.offline, threaded)
+        results.append(bounces)
+        fps = num_frames / elapsed
+        if not threaded:
+            serial_fps = fps
+        stages = ' '.join(f"{stage}={latency:.2f}" for stage, latency in latencies.items())
+        print(f"{'threaded' if threaded else 'serial':>8} {fps:>9.1f} {fps / serial_fps:>7.2f} {len(bounces):>7} "
+              f"{utilisation['decode']:>6.0%} {utilisation['detect']:>6.0%} {utilisation['track']:>6.0%}  {stages}")
+    sys.exit(0 if results[0] == results[1] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from collections import deque
-from typing import Tuple
+from typing import List, Tuple
 
 import cv2 as cv
 import numpy as np
@@ -15,37 +15,45 @@ class BounceDetector:
     Implements ball bounce detection and bounce visualisation based on ball contour path tracking.
     """
 
-    def __init__(self, src: list, dst: list):
+    # BOUNCE_COOLDOWN determines the time that must pass between subsequent bounces
+    # before another bounce can be registered.
+    # The given constant has been hand-picked to be reasonable as 80 frames of 60fps video.
+    # Half a frame is added so that rounding of the video timestamps does not shift the expiry by a frame.
+    BOUNCE_COOLDOWN = (80 + 0.5) * utilities.REFERENCE_FRAME_INTERVAL_MS  # Milliseconds
+    # The peak pattern of bounced() has been hand-picked for 60fps video as 5 contours one frame apart. Of faster
+    # video, the contours closest to one 60fps frame apart make up the pattern. Slower video has to do with
+    # consecutive contours, which still holds for 30fps, but with contours further apart the pattern finds bounces
+    # late, far off their actual location. A quarter frame is added so that 29.97fps video passes.
+    MAX_CONTOUR_INTERVAL = (2 + 0.25) * utilities.REFERENCE_FRAME_INTERVAL_MS  # Milliseconds
+    __PATTERN_LENGTH = 5
+    # Number of contours kept, enough for the pattern of up to 480fps video
+    __HISTORY_LENGTH = (__PATTERN_LENGTH - 1) * 8 + 1
 
-        self.src, self.__court_lower_boundary_L, self.__court_lower_boundary_R = self.__reorder_src_coords(src)
-        self.dst = dst
-        self.__remap_dst_coords(self.dst)
-
-        # Modify service box bottom coordinates for more accurate mapping
-        # An intersection is taken with the line defined by the lower boundary of the court and
-        # the service box vertical lines.
-        # The lower coordinates of the service box corners are then changed to lower coordinates of the court.
+    def __init__(self, src: list, dst: list, cooldown: float = BOUNCE_COOLDOWN, homography_matrix=None):
+        """
+        :param src: Service box and court lower boundary coordinates in the video frame
+        :param dst: Service box coordinates in the court image
+        :param cooldown: Time in milliseconds that must pass after a bounce before another bounce is registered
+        :param homography_matrix: Previously computed compute_homography(src, dst), computed anew if omitted
+        """
+        if homography_matrix is None:
+            homography_matrix = BounceDetector.compute_homography(src, dst)
+        self.__homography_matrix = np.asarray(homography_matrix, dtype=np.float64)
 
-        # Thus this allows to directly map the court via homography and create a 1-to-1 mapping between a court
-        # image and the bounce location in the homography image.
-        self.src[0] = utilities.get_intersect(self.src[0], self.src[1], self.__court_lower_boundary_L[:2],
-                                              self.__court_lower_boundary_R[:2])
-        self.src[-1] = utilities.get_intersect(self.src[2], self.src[3], self.__court_lower_boundary_L[:2],
-                                               self.__court_lower_boundary_R[:2])
-        # endregion
-
-        self.__homography_matrix, _ = cv.findHomography(self.src, self.dst, cv.RANSAC, 5.0)
-        self.__contour_path_history = deque(maxlen=5)
+        self.__contour_path_history = deque(maxlen=self.__HISTORY_LENGTH)
         # Fill with initial dummy values
-        for i in range(self.__contour_path_history.maxlen):
+        for i in range(self.__PATTERN_LENGTH):
             self.__contour_path_history.append([0, 0])
 
-        # BOUNCE_COOLDOWN determines the number of frames that must pass between subsequent frames
-        # before another bounce can be registered.
-        # The given constant has been hand-picked to be reasonable for 60fps video.
-        self.__BOUNCE_COOLDOWN = 80  # Number of frames
+        self.__bounce_cooldown = cooldown
         # Keeps track of cooldown progress
-        self.__bounce_cooldown_counter = 0
+        self.__current_timestamp = 0.0
+        self.__last_bounce_timestamp = float('-inf')
+        # Timestamps (ms) of the entries in __contour_path_history
+        self.__timestamp_history = deque([0.0] * self.__PATTERN_LENGTH, maxlen=self.__HISTORY_LENGTH)
+        # Bounce location and timestamp of the last bounce
+        self.__last_bounce_location = (0, 0)
+        self.__last_bounce_sample_timestamp = 0.0
 
         # Flag for __plot_ball_method initialization
         self.__initialized_plotting = False
@@ -63,32 +71,101 @@ class BounceDetector:
         If this was not implemented, then secondary bounces (such as wall -> glass) would also be mistakenly
         be recognized as bounces.
         """
-        _, current_projected_y = self.__contour_path_history[-1]
-        _, previous_projected_y = self.__contour_path_history[0]
-
-        if self.__bounce_cooldown_counter < 0:  # Only detect bounces once the cooldown has refreshed
+        # Only detect bounces once the cooldown has refreshed
+        if self.__current_timestamp - self.__last_bounce_timestamp > self.__bounce_cooldown:
             # Spotting the peak of the bounce
-            for x_proj, y_proj in self.__contour_path_history:
+            indices = self.__select_pattern()
+            pattern = [self.__contour_path_history[i] for i in indices]
+            for x_proj, y_proj in pattern:
                 if not utilities.is_within_window_height(y_proj):
                     return False
 
-            if self.__contour_path_history[0][1] <= self.__contour_path_history[1][1] < self.__contour_path_history[2][
-                1] \
-                    and self.__contour_path_history[2][1] > self.__contour_path_history[3][1] >= \
-                    self.__contour_path_history[4][1]:
-                self.__bounce_cooldown_counter = self.__BOUNCE_COOLDOWN
+            if pattern[0][1] <= pattern[1][1] < pattern[2][1] and pattern[2][1] > pattern[3][1] >= pattern[4][1]:
+                self.__last_bounce_timestamp = self.__current_timestamp
+                self.__last_bounce_location = int(pattern[2][0]), int(pattern[2][1])
+                self.__last_bounce_sample_timestamp = self.__timestamp_history[indices[2]]
                 return True
         return False
 
-    def update_contour_data(self, contour: Rect) -> None:
+    def __select_pattern(self) -> List[int]:
+        """
+        :return: Indices into the history of the contours of the peak pattern, oldest first. Going back from the
+        newest contour, each is the newest contour at least about one 60fps frame older than the previous one would
+        be, or the next older contour for slower video or if there are too few contours.
+        """
+        timestamps = self.__timestamp_history
+        newest = len(timestamps) - 1
+        indices = [newest]
+        i = newest
+        for j in range(1, self.__PATTERN_LENGTH):
+            threshold = timestamps[newest] - (j - 0.25) * utilities.REFERENCE_FRAME_INTERVAL_MS
+            i -= 1
+            # Leaves an older contour for every remaining one of the pattern
+            while i > self.__PATTERN_LENGTH - 1 - j and timestamps[i] > threshold:
+                i -= 1
+            indices.append(i)
+        return indices[::-1]
+
+    def detect_bounces(self, trajectory: np.ndarray, timestamps: np.ndarray) -> List[Tuple[float, int, int]]:
+        """
+        Detects all bounces along a whole ball trajectory at once, e.g. to re-score a recorded session.
+        The bounces are those a new BounceDetector reports when every contour of the trajectory is passed to
+        update_contour_data() in turn and bounced() is checked after each. The state of this detector is not used.
+        :param trajectory: (n, 4) array of ball contours in (x, y, width, height) form
+        :param timestamps: Video timestamps of the contours in milliseconds
+        :return: List of (timestamp, x, y) bounces as given by get_last_bounce_timestamp() and
+        get_last_bounce_location()
+        """
+        if len(trajectory) == 0:
+            return []
+        history_len = self.__PATTERN_LENGTH
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        centers = trajectory[:, :2] + trajectory[:, 2:] / 2
+        projected = cv.perspectiveTransform(centers.reshape(-1, 1, 2).astype(np.float64),
+                                            self.__homography_matrix).reshape(-1, 2)
+        # As in __init__(), the first contour follows dummy contours projected onto (0, 0) at timestamp 0
+        points = np.concatenate((np.zeros((history_len - 1, 2)), projected))
+        point_timestamps = np.concatenate((np.zeros(history_len - 1), timestamps))
+
+        # Indices of the contours of the pattern once the contour of the row is added, see __select_pattern()
+        newest = np.arange(history_len - 1, len(points))
+        lowest = np.maximum(newest - (self.__HISTORY_LENGTH - 1), 0)
+        indices = [newest]
+        for j in range(1, history_len):
+            threshold = point_timestamps[newest] - (j - 0.25) * utilities.REFERENCE_FRAME_INTERVAL_MS
+            newest_within = np.searchsorted(point_timestamps, threshold, side='right') - 1
+            indices.append(np.minimum(np.maximum(newest_within, lowest + history_len - 1 - j), indices[-1] - 1))
+        ys = points[:, 1]
+        y0, y1, y2, y3, y4 = (ys[i] for i in indices[::-1])
+        within = np.ones(len(y0), bool)
+        for y in (y0, y1, y2, y3, y4):
+            within &= (0 <= y) & (y <= utilities.FRAME_HEIGHT)
+        peaks = np.flatnonzero(within & (y0 <= y1) & (y1 < y2) & (y2 > y3) & (y3 >= y4))
+
+        # The cooldown depends on the previous bounce, which only leaves the few peaks to go through in order
+        bounces = []
+        last_bounce_timestamp = float('-inf')
+        for i in peaks.tolist():
+            if timestamps[i] - last_bounce_timestamp > self.__bounce_cooldown:
+                last_bounce_timestamp = timestamps[i]
+                x, y = points[indices[2][i]]
+                bounces.append((float(point_timestamps[indices[2][i]]), int(x), int(y)))
+        return bounces
+
+    def update_contour_data(self, contour: Rect, timestamp: float = None) -> None:
         """
         Add data to the detector for bounce detection.
         :param contour: Ball contour
+        :param timestamp: Video timestamp of the contour in milliseconds.
+        If omitted, the contour is assumed to follow the previous one by one 60fps frame.
         """
         contour_projection_point = self.__project_point(
             (contour.x + contour.width / 2, contour.y + contour.height / 2, 1))
-        self.__bounce_cooldown_counter -= 1
+        if timestamp is None:
+            timestamp = self.__current_timestamp + utilities.REFERENCE_FRAME_INTERVAL_MS
+        self.__current_timestamp = timestamp
         self.__contour_path_history.append(contour_projection_point)
+        self.__timestamp_history.append(timestamp)
 
         # For real-time plotting uncomment:
         # self.__plot_ball_path()
@@ -99,10 +176,17 @@ class BounceDetector:
         This method retrieves the last known bounce location of the ball.
         :return: 2D ball coordinates
         """
-        # We pick NOT the current contour, but the middle known contour, because
+        # We pick NOT the current contour, but the middle contour of the peak pattern, because
         # the current contour already signals the next positions from the bounce whereas
         # the middle contour actually marks the position of the bounce.
-        return int(self.__contour_path_history[2][0]), int(self.__contour_path_history[2][1])
+        return self.__last_bounce_location
+
+    def get_last_bounce_timestamp(self) -> float:
+        """
+        WARNING: This method returns valid data only if bounced() returns true.
+        :return: Video timestamp in milliseconds of the contour returned by get_last_bounce_location()
+        """
+        return self.__last_bounce_sample_timestamp
 
     def __project_point(self, point):
         """
@@ -148,7 +232,38 @@ class BounceDetector:
         plt.axis([50, None, 0, 740])
         self.fig.canvas.draw()
 
-    def __reorder_src_coords(self, src_coords: list) -> Tuple:
+    @staticmethod
+    def compute_homography(src: list, dst: list) -> np.ndarray:
+        """
+        Computes the homography mapping the video frame onto the court image.
+        :param src: Service box and court lower boundary coordinates in the video frame
+        :param dst: Service box coordinates in the court image
+        :return: 3x3 homography matrix
+        """
+        src, court_lower_boundary_L, court_lower_boundary_R = BounceDetector.__reorder_src_coords(src)
+        BounceDetector.__remap_dst_coords(dst)
+
+        # Modify service box bottom coordinates for more accurate mapping
+        # An intersection is taken with the line defined by the lower boundary of the court and
+        # the service box vertical lines.
+        # The lower coordinates of the service box corners are then changed to lower coordinates of the court.
+
+        # Thus this allows to directly map the court via homography and create a 1-to-1 mapping between a court
+        # image and the bounce location in the homography image.
+        src[0] = utilities.get_intersect(src[0], src[1], court_lower_boundary_L[:2], court_lower_boundary_R[:2])
+        src[-1] = utilities.get_intersect(src[2], src[3], court_lower_boundary_L[:2], court_lower_boundary_R[:2])
+
+        homography_matrix, _ = cv.findHomography(src, dst, cv.RANSAC, 5.0)
+        return homography_matrix
+
+    def get_homography_matrix(self) -> np.ndarray:
+        """
+        :return: 3x3 homography matrix mapping the video frame onto the court image.
+        """
+        return self.__homography_matrix
+
+    @staticmethod
+    def __reorder_src_coords(src_coords: list) -> Tuple:
         """
         :param src_coords: 6 source coordinates [4 box coordinates, 2 boundary coordinates]
         :return: Reordered coordinates starting from left lower service box corner going clockwise and court boundaries'
@@ -173,11 +288,12 @@ class BounceDetector:
 
         return np.array([left_lower, left_upper, right_upper, right_lower]), boundary_L, boundary_R
 
-    def __remap_dst_coords(self, dst) -> None:
+    @staticmethod
+    def __remap_dst_coords(dst) -> None:
         """
         Remaps dst coords from service box corners to service box corners and lower court boundary
         """
         dst[0] = (dst[0][0], Court.side_wall_len)
-        self.dst[1] = (dst[1][0], Court.short_line_from_front_wall)
-        self.dst[2] = (dst[2][0], Court.short_line_from_front_wall)
+        dst[1] = (dst[1][0], Court.short_line_from_front_wall)
+        dst[2] = (dst[2][0], Court.short_line_from_front_wall)
         dst[3] = (dst[3][0], Court.side_wall_len)
\ No newline at end of file
@@ -34,7 +34,15 @@ class Detector:
         # deque is convenient, as once at max capacity, it auto-discards the last frame before adding a new one
         self.__frame_buffer = deque(maxlen=3)  # contains smoothed grayscale images, used as a "sliding window"
         self.__frame_difference_buffer = deque(maxlen=2)  # contains differenced images, used as a "sliding window"
-        self.__dilation_kernel = np.ones((3, 3), np.uint8)
+
+        # Reusable intermediate images, allocated once the frame size is known.
+        # The slots of the sliding windows above are recycled as well: the oldest entry is overwritten in-place
+        # right before it would be discarded.
+        self.__grayscale = None
+        self.__combined = None
+        self.__thresholded = None
+        self.__dilated = None
+        self.__processed = None
 
     def ready(self) -> bool:
         """
@@ -58,25 +66,28 @@ class Detector:
 
         :param frame: A video frame
         :return: A binary image that has differentiated moving parts of the image from static parts.
+        The returned image is reused by the detector and is only valid until the next call.
         """
         self.__add_to_frame_buffer(frame)
 
         # Apply frame differencing to the last two frames
-        difference = cv2.absdiff(self.__frame_buffer[1], self.__frame_buffer[2])
+        difference = cv2.absdiff(self.__frame_buffer[1], self.__frame_buffer[2],
+                                 dst=self.__recycle_slot(self.__frame_difference_buffer))
         self.__frame_difference_buffer.append(difference)
 
         # Combine with boolean "AND"
-        combined = cv2.bitwise_and(self.__frame_difference_buffer[0], self.__frame_difference_buffer[1])
+        combined = cv2.bitwise_and(self.__frame_difference_buffer[0], self.__frame_difference_buffer[1],
+                                   dst=self.__combined)
         # cv.imshow("combined", combined)
         # Threshold the combined image
-        ret, thresholded = cv2.threshold(combined, 0, 255, cv2.THRESH_OTSU)
+        ret, thresholded = cv2.threshold(combined, 0, 255, cv2.THRESH_OTSU, dst=self.__thresholded)
         # cv.imshow("thresholded", thresholded)
         # If Otsu's thresholding picks a low threshold due to low amount of foreground pixels
         if ret <= 8:
-            _, thresholded = cv2.threshold(combined, 24, 255, cv.THRESH_BINARY)
+            _, thresholded = cv2.threshold(combined, 24, 255, cv.THRESH_BINARY, dst=self.__thresholded)
             # cv.imshow("REthresholded", thresholded)
         # Dilate the contours via morphological closing
-        processed = self.__morphological_close(thresholded, 9)
+        processed = morphological_close(thresholded, 9, dst=self.__processed, dilated_dst=self.__dilated)
 
         return processed
 
@@ -84,10 +95,21 @@ class Detector:
         """
         Prepares the frame and adds it to the frame buffer.
 
-        :param frame: A video frame.
+        :param frame: A video frame, or its blur_grayscale() version.
         """
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
+        if self.__grayscale is None:
+            self.__allocate_buffers(frame.shape[:2])
+
+        slot = self.__recycle_slot(self.__frame_buffer)
+        if frame.ndim == 2:
+            # Frames from a grayscale frame cache have already been converted and smoothed
+            if slot is None:
+                frame = np.copy(frame)
+            else:
+                np.copyto(slot, frame)
+                frame = slot
+        else:
+            frame = blur_grayscale(frame, dst=slot, grayscale_dst=self.__grayscale)
 
         self.__frame_buffer.append(frame)
 
@@ -95,14 +117,23 @@ class Detector:
             if len(self.__frame_buffer) == 2:  # We need two frames to start frame differencing
                 self.__frame_difference_buffer.append(cv2.absdiff(self.__frame_buffer[0], self.__frame_buffer[1]))
 
-    def __morphological_close(self, image: np.ndarray, iterations: int) -> np.ndarray:
+    def __allocate_buffers(self, shape: tuple) -> None:
         """
-        Returns the morphological closing (dilation followed by erosion) of the image.
-
-        :param image: Image to apply the operation on.
-        :return: The morphological closing of the image
+        Allocates the reusable intermediate images.
+        :param shape: (height, width) of the video frames
         """
-
-        dilated = cv2.dilate(image, self.__dilation_kernel, iterations=iterations)
-        processed = cv2.erode(dilated, self.__dilation_kernel)
-        return processed
+        self.__grayscale = np.empty(shape, np.uint8)
+        self.__combined = np.empty(shape, np.uint8)
+        self.__thresholded = np.empty(shape, np.uint8)
+        self.__dilated = np.empty(shape, np.uint8)
+        self.__processed = np.empty(shape, np.uint8)
+
+    @staticmethod
+    def __recycle_slot(window: deque):
+        """
+        :param window: Sliding window of images
+        :return: The image about to be discarded by the next append if the window is full, None otherwise.
+        """
+        if len(window) == window.maxlen:
+            return window[0]
+        return None
@@ -9,13 +9,16 @@ class DoubleExponentialEstimator:
     """Provides an implementation for double exponential smoothing.
     """
 
-    def __init__(self, initial_pos=Rect(0, 0, 0, 0), next_pos=Rect(0, 0, 0, 0)):
+    def __init__(self, initial_pos=Rect(0, 0, 0, 0), next_pos=Rect(0, 0, 0, 0), data_smoothing_factor=0.9,
+                 trend_smoothing_factor=0.25):
         """Create and initialize the estimator for forecasting.
         :param initial_pos: Initial observation position of Rectangle [top-left x, top-left y, width, height].
         :param next_pos: Next observation position of Rectangle [top-left x, top-left y, width, height].
+        :param data_smoothing_factor: Weight of the latest observation in the smoothed value, between 0 and 1.
+        :param trend_smoothing_factor: Weight of the latest change in the trend, between 0 and 1.
         """
-        self.__data_smoothing_factor = 0.9  # 0 <= data_smoothing_factor <= 1
-        self.__trend_smoothing_factor = 0.25  # 0 <= trend_smoothing_factor <= 1
+        self.__data_smoothing_factor = data_smoothing_factor  # 0 <= data_smoothing_factor <= 1
+        self.__trend_smoothing_factor = trend_smoothing_factor  # 0 <= trend_smoothing_factor <= 1
 
         self.__position_buffer = deque([initial_pos, next_pos], maxlen=2)
 
@@ -29,9 +32,11 @@ class DoubleExponentialEstimator:
         """
         self.__position_buffer.append(position)
 
-    def predict(self, t=1.0) -> Rect:
+    def predict(self, t=1.0, dt=1.0) -> Rect:
         """Forecasts a Rectangle [top-left x, top-left y, width, height] for time t=X.
         :param t: Time-step for which the forecast is made. Fractional time-steps are supported.
+        :param dt: Duration of a time-step in 60fps frames, i.e. the time between the last two observations.
+        The trend is kept per 60fps frame, so that it remains valid when frames are skipped.
         :return: Predicted future bounding rectangle [top-left x, top-left y, width, height] of tracked object.
         """
         prev_pos = self.__position_buffer[-1]
@@ -39,17 +44,17 @@ class DoubleExponentialEstimator:
         smoothed_previous_x, smoothed_previous_y = self.__previous_smoothed
         trend_previous_x, trend_previous_y = self.__previous_trend
 
-        smoothed_x = self.__calculate_smoothed_value(prev_pos.x, smoothed_previous_x, trend_previous_x)
-        smoothed_y = self.__calculate_smoothed_value(prev_pos.y, smoothed_previous_y, trend_previous_y)
+        smoothed_x = self.__calculate_smoothed_value(prev_pos.x, smoothed_previous_x, dt * trend_previous_x)
+        smoothed_y = self.__calculate_smoothed_value(prev_pos.y, smoothed_previous_y, dt * trend_previous_y)
 
-        trend_x = self.__calculate_trend_estimate(smoothed_x, smoothed_previous_x, trend_previous_x)
-        trend_y = self.__calculate_trend_estimate(smoothed_y, smoothed_previous_y, trend_previous_y)
+        trend_x = self.__calculate_trend_estimate(smoothed_x, smoothed_previous_x, trend_previous_x, dt)
+        trend_y = self.__calculate_trend_estimate(smoothed_y, smoothed_previous_y, trend_previous_y, dt)
 
         # The forecast follows an equation of the form: Prediction = b + tx,
         # Where t designates the time in the future for which the forecast is made.
         # i.e. t=1 means the forecast is for the next possible time-step.
-        prediction_x = smoothed_x + t * trend_x
-        prediction_y = smoothed_y + t * trend_y
+        prediction_x = smoothed_x + t * dt * trend_x
+        prediction_y = smoothed_y + t * dt * trend_y
 
         # Update the previous values of the estimates.
         self.__previous_smoothed = (smoothed_x, smoothed_y)
@@ -69,13 +74,15 @@ class DoubleExponentialEstimator:
         return self.__data_smoothing_factor * observed_true + (1 - self.__data_smoothing_factor) * (
                 prev_smoothed + prev_trend)
 
-    def __calculate_trend_estimate(self, cur_smoothed: float, prev_smoothed: float, prev_trend: float) -> float:
+    def __calculate_trend_estimate(self, cur_smoothed: float, prev_smoothed: float, prev_trend: float,
+                                   dt: float) -> float:
         """Calculate the 'trend value' part of a double-exponential smoothing process.
 
         :param cur_smoothed: Smoothed value at current time-step.
         :param prev_smoothed: Smoothed value at previous time-step.
         :param prev_trend: Previous trend value.
+        :param dt: Duration of the time-step in 60fps frames.
         :return: New trend value.
         """
-        return self.__trend_smoothing_factor * (cur_smoothed - prev_smoothed) + \
+        return self.__trend_smoothing_factor * (cur_smoothed - prev_smoothed) / dt + \
             (1 - self.__trend_smoothing_factor) * prev_trend
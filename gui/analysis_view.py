@@ -7,6 +7,7 @@ import numpy as np
 
 from gui import guistate
 from gui.panel_view import PanelView
+from utils.frame_mailbox import FrameMailbox
 
 
 class AnalysisView:
@@ -15,33 +16,42 @@ class AnalysisView:
     Displays the processed video in parallel with recorded ball bounces
     """
 
-    def __init__(self, master, headless: tk.BooleanVar, init_frame: np.ndarray, pipeline):
+    # Interval in milliseconds at which the view shows the latest processed frame, about 30Hz
+    REFRESH_INTERVAL = 33
+
+    def __init__(self, master, headless: tk.BooleanVar, init_frame: np.ndarray, pipeline,
+                 preview_scale: float = 1.0):
+        """
+        :param preview_scale: Factor the processed frame and the court image are resized by for display
+        """
 
         self.__master = master
 
         # GUI setup
         self.__view = None
         if not headless.get():
-            self.__view = PanelView(master, init_frame)
+            self.__view = PanelView(master, init_frame, preview_scale)
         self.__progress = tk.DoubleVar()
         self.__progress_bar = tkinter.ttk.Progressbar(self.__master, length=master.winfo_width(),
                                                       variable=self.__progress)
         self.__progress_bar.grid(row=1, columnspan=2)
 
         self.__master.title(f"Processing video")
-        self.__update_event_str = "<<processedFrame>>"
 
-        self.__binds = {'<p>': self.__on_pause, '<h>': self.__toggle_headless,
-                        self.__update_event_str: self.__update_view}
+        self.__binds = {'<p>': self.__on_pause, '<h>': self.__toggle_headless}
         for evt, func in self.__binds.items():
             master.bind(evt, func)
 
         self.__pipeline = pipeline
-        self.__court_img = None
-        self.__img = init_frame
+        self.__court = None
+        # The processing thread publishes its latest frame, which the view picks up every REFRESH_INTERVAL
+        self.__frame_mailbox = FrameMailbox(init_frame.shape, init_frame.dtype)
+        self.__refresh_id = None
         self.__running = True
         self.__debug = False
         self.__headless = headless
+        # Plain copy of the headless setting for the processing thread, which must not access Tk variables
+        self.__show_frames = not headless.get()
 
         # Condition to stop analysis processing when application is paused
         self.__pause_condition = threading.Condition(lock=threading.Lock())
@@ -54,24 +64,32 @@ class AnalysisView:
         """
 
         def run():
-            for self.__img, self.__court_img in self.__pipeline.process_next():
+            for img, self.__court in self.__pipeline.process_next():
+                # The pipeline reuses its frame buffers, so the mailbox keeps a copy of the frame
+                if self.__show_frames:
+                    self.__frame_mailbox.publish(img)
                 with self.__pause_condition:
                     while not self.__running: self.__pause_condition.wait()
-                self.__master.event_generate(self.__update_event_str)
 
             # Signal processing complete
             self.__master.event_generate(guistate.OUTPUT)
 
         Thread(target=run, daemon=True).start()
+        self.__refresh_id = self.__master.after(self.REFRESH_INTERVAL, self.__update_view)
 
-    def __update_view(self, event: tk.Event) -> None:
+    def __update_view(self) -> None:
         """
-        Re-draw the frame.
+        Re-draw the latest processed frame, if there is a new one, and schedule the next refresh.
+        Frames processed in between refreshes are never shown.
         """
-        if not self.__headless.get():
-            self.__view.update_label_left(self.__img)
-            self.__view.update_label_right(self.__court_img)
+        img = self.__frame_mailbox.take()
+        if img is not None:
+            if not self.__headless.get() and self.__view is not None:
+                self.__view.update_label_left(img)
+                self.__view.update_label_right(self.__court.render())
+            self.__frame_mailbox.release(img)
         self.__progress.set(self.__pipeline.get_progress() * 100)
+        self.__refresh_id = self.__master.after(self.REFRESH_INTERVAL, self.__update_view)
 
     def __on_pause(self, event: tk.Event) -> None:
         """
@@ -91,11 +109,15 @@ class AnalysisView:
         :param event: TKinter event
         """
         self.__headless.set(not self.__headless.get())
+        self.__show_frames = not self.__headless.get()
 
     def teardown(self) -> None:
         """
         Destroys the Analysis view frame and unbinds all events
         """
+        if self.__refresh_id is not None:
+            self.__master.after_cancel(self.__refresh_id)
+            self.__refresh_id = None
         if self.__view is not None:
             self.__view.teardown()
         self.__progress_bar.destroy()
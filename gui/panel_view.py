@@ -11,9 +11,15 @@ class PanelView(tk.Frame):
     Handles creation and management of a 2-panel side-by-side view.
     """
 
-    def __init__(self, master, init_frame: np.ndarray):
+    def __init__(self, master, init_frame: np.ndarray, scale: float = 1.0):
+        """
+        :param master: Parent widget
+        :param init_frame: OpenCV image initially shown in both panels
+        :param scale: Factor the images are resized by for display, e.g. 0.5 for a cheaper preview
+        """
         tk.Frame.__init__(self, master)
         self.__master = master
+        self.__scale = scale
 
         # Create the frame
         self.frame = tk.Frame(master)
@@ -25,8 +31,11 @@ class PanelView(tk.Frame):
         self.label_right = tk.Label(self.frame)
         self.label_right.grid(column=2, row=0, padx=10, pady=10, columnspan=2)
 
+        # Every label keeps its Tk image, which updates paste into, and the buffer its images are resized into
         self.panel1_tk_img = None
         self.panel2_tk_img = None
+        self.__panel1_resized = None
+        self.__panel2_resized = None
         self.update_label_left(init_frame)
         self.update_label_right(init_frame)
 
@@ -35,23 +44,63 @@ class PanelView(tk.Frame):
         Update image on left PanelView label.
         :param frame: OpenCV image
         """
-        self.panel1_tk_img = PIL.ImageTk.PhotoImage(PIL.Image.fromarray(cv.cvtColor(frame, cv.COLOR_BGR2RGB)))
-        self.label_left.configure(image=self.panel1_tk_img)
+        self.__panel1_resized = self.__resize(frame, self.__panel1_resized)
+        self.panel1_tk_img = self.__update_label(self.label_left, self.panel1_tk_img,
+                                                 frame if self.__panel1_resized is None else self.__panel1_resized)
 
     def update_label_right(self, frame: np.ndarray) -> None:
         """
         Update image on right PanelView label.
         :param frame: OpenCV image
         """
-        self.panel2_tk_img = PIL.ImageTk.PhotoImage(PIL.Image.fromarray(cv.cvtColor(frame, cv.COLOR_BGR2RGB)))
-        self.label_right.configure(image=self.panel2_tk_img)
+        self.__panel2_resized = self.__resize(frame, self.__panel2_resized)
+        self.panel2_tk_img = self.__update_label(self.label_right, self.panel2_tk_img,
+                                                 frame if self.__panel2_resized is None else self.__panel2_resized)
+
+    def __resize(self, frame: np.ndarray, buffer: np.ndarray) -> np.ndarray:
+        """
+        :param buffer: Image previously returned for the same label, which is reused if the size matches
+        :return: The frame resized by the display scale, None if it is shown as is
+        """
+        if self.__scale == 1:
+            return None
+        height, width = max(1, round(frame.shape[0] * self.__scale)), max(1, round(frame.shape[1] * self.__scale))
+        if buffer is None or buffer.shape[:2] != (height, width) or buffer.shape[2:] != frame.shape[2:]:
+            buffer = None
+        return cv.resize(frame, (width, height), dst=buffer, interpolation=cv.INTER_AREA)
+
+    @staticmethod
+    def __update_label(label: tk.Label, tk_img: PIL.ImageTk.PhotoImage,
+                       frame: np.ndarray) -> PIL.ImageTk.PhotoImage:
+        """
+        Shows the frame on the label, pasting it into the label's Tk image if the size matches.
+        :param tk_img: The Tk image shown on the label, None if there is none yet
+        :param frame: OpenCV image, BGR or grayscale
+        :return: The Tk image shown on the label
+        """
+        frame = np.ascontiguousarray(frame)
+        size = (frame.shape[1], frame.shape[0])
+        if frame.ndim == 2:
+            image = PIL.Image.frombuffer('L', size, frame, 'raw', 'L', 0, 1)
+        else:
+            # Swaps the channels while unpacking, which spares an RGB copy of the frame
+            image = PIL.Image.frombuffer('RGB', size, frame, 'raw', 'BGR', 0, 1)
+
+        if tk_img is not None and (tk_img.width(), tk_img.height()) == size:
+            # Tk shows the pasted image without re-configuring the label
+            tk_img.paste(image)
+            return tk_img
+        tk_img = PIL.ImageTk.PhotoImage(image)
+        label.configure(image=tk_img)
+        return tk_img
 
     def mouse_pos_wrt_left_label(self) -> (int, int):
         """
-        :return: Mouse position with respect to the coordinate system of the left label of PanelView.
+        :return: Mouse position with respect to the coordinate system of the left label of PanelView, in pixels of
+        the image shown on it.
         """
-        return self.label_left.winfo_pointerx() - self.label_left.winfo_rootx(), \
-               self.label_left.winfo_pointery() - self.label_left.winfo_rooty()
+        return int((self.label_left.winfo_pointerx() - self.label_left.winfo_rootx()) / self.__scale), \
+               int((self.label_left.winfo_pointery() - self.label_left.winfo_rooty()) / self.__scale)
 
     def teardown(self) -> None:
         """Destroys the created frame"""
@@ -1,11 +1,14 @@
 import tkinter as tk
-from tkinter import messagebox
+import tkinter.ttk
+from tkinter import messagebox, simpledialog
 
 import cv2 as cv
 import numpy as np
 
+from bounce_detector import BounceDetector
 from gui import guistate
 from gui.panel_view import PanelView
+from utils.calibration import Calibration, list_profiles, load_profile, save_profile
 from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT
 
 
@@ -15,10 +18,21 @@ class SetUpWindow:
     the user confirms readiness.
     """
 
-    def __init__(self, master, init_frame: np.ndarray, headless_var: tk.BooleanVar, direction_var: tk.IntVar):
+    # Interval in milliseconds at which mouse motion re-draws the zoom view, about 60Hz
+    MOTION_REFRESH_INTERVAL = 16
+
+    def __init__(self, master, init_frame: np.ndarray, headless_var: tk.BooleanVar, direction_var: tk.IntVar,
+                 resolution: (int, int)):
 
         self.__master = master
         self.__headless = headless_var
+        self.__direction = direction_var
+        # Resolution of the video, calibration profiles are only offered for matching resolutions
+        self.__resolution = resolution
+        # Calibration profile the markers have been loaded from, None if placed by hand
+        self.__loaded_profile = None
+        # Analysis settings of the last loaded profile, which remain valid when markers are moved
+        self.__settings = None
 
         # GUI setup
         self.__view = PanelView(master, init_frame)
@@ -36,8 +50,21 @@ class SetUpWindow:
                                                               variable=direction_var, value=1)
         self.__service_box_right_radiobutton.grid(row=1, column=3)
 
+        self.__profile_combobox = tkinter.ttk.Combobox(self.__view.frame, state='readonly',
+                                                       values=list_profiles(resolution))
+        self.__profile_combobox.set("Load profile...")
+        self.__profile_combobox.bind('<<ComboboxSelected>>', self.__on_profile_selected)
+        self.__profile_combobox.grid(row=2, column=0, columnspan=2)
+        self.__save_profile_button = tk.Button(self.__view.frame, text="Save profile", command=self.__on_save_profile)
+        self.__save_profile_button.grid(row=2, column=2)
+
         self.__img = init_frame
-        self.__img_copy = None
+        # The frame with the markers drawn on, which is only re-drawn when the markers change
+        self.__img_copy = init_frame
+        # Buffer the zoom view is resized into
+        self.__magnified = None
+        # Pending re-draw of the zoom view after mouse motion, None if there is none
+        self.__motion_refresh_id = None
 
         # Stores clicked points
         self.__markers = []
@@ -69,17 +96,26 @@ class SetUpWindow:
         if messagebox.askokcancel("Start analysis?", "All required points have been selected. Start analysis?"):
             self.__master.event_generate(guistate.ANALYSIS)
 
-    def __update_zoom(self) -> None:
+    def __update_markers(self) -> None:
         """
-        Draw the zoomed-in view of the full image.
+        Re-draw the markers on the full image and both views.
         """
         self.__img_copy = np.copy(self.__img)
         self.__draw_markers(self.__img_copy)
+        self.__update_zoom()
+        self.__view.update_label_left(self.__img_copy)
+
+    def __update_zoom(self) -> None:
+        """
+        Draw the zoomed-in view of the full image.
+        """
         from_x, to_x, diff_x, from_y, to_y, diff_y = self.__get_magnifying_coordinates()
 
-        # "window" pixels
+        # "window" pixels, the markers are already drawn on them
         pixels = self.__img_copy[from_y:to_y, from_x:to_x]
-        magnified = cv.resize(pixels, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv.INTER_LINEAR)
+        magnified = cv.resize(pixels, (FRAME_WIDTH, FRAME_HEIGHT), dst=self.__magnified,
+                              interpolation=cv.INTER_LINEAR)
+        self.__magnified = magnified
         # Draw magnifying cursor
         cursor_offset = (diff_x * 9, diff_y * 9)
         rect_cursor_start = np.add((magnified.shape[1] // 2, magnified.shape[0] // 2), cursor_offset)
@@ -157,9 +193,9 @@ class SetUpWindow:
         # Limit the size of the markers list
         if len(self.__markers) < self.__NUM_MARKERS_REQUIRED:
             self.__markers.append((self.__mouse_x, self.__mouse_y))
+            self.__loaded_profile = None
 
-        self.__update_zoom()
-        self.__view.update_label_left(self.__img_copy)
+        self.__update_markers()
         self.__update_title()
         self.__master.update()
 
@@ -171,11 +207,67 @@ class SetUpWindow:
         if len(self.__markers) == self.__NUM_MARKERS_REQUIRED:
             self.__show_start_analysis_dialog()
 
+    def __on_profile_selected(self, event: tk.Event) -> None:
+        """
+        Replaces the markers with the ones of the selected calibration profile.
+        :param event: TKinter event
+        """
+        try:
+            profile = load_profile(self.__profile_combobox.get(), self.__resolution)
+        except (OSError, ValueError, KeyError):
+            messagebox.showerror("Error", "The calibration profile could not be loaded.")
+            return
+
+        self.__markers = profile.service_box_markers + profile.court_lower_boundary_markers
+        self.__direction.set(profile.direction)
+        self.__loaded_profile = profile
+        self.__settings = profile.settings
+
+        self.__update_markers()
+        self.__update_title()
+        self.__master.update()
+        self.__show_start_analysis_dialog()
+
+    def __on_save_profile(self) -> None:
+        """
+        Stores the placed markers as a named calibration profile, together with the resulting homography.
+        """
+        if len(self.__markers) < self.__NUM_MARKERS_REQUIRED:
+            messagebox.showinfo("Save profile", "Place all required points before saving a profile.")
+            return
+
+        name = simpledialog.askstring("Save profile", "Profile name:", parent=self.__master)
+        if not name:
+            return
+
+        calibration = self.get_calibration()
+        if calibration.homography is None:
+            calibration.homography = BounceDetector.compute_homography(
+                *calibration.get_homography_coords()).tolist()
+        try:
+            save_profile(name, calibration)
+        except (OSError, ValueError):
+            messagebox.showerror("Error", "The calibration profile could not be saved.")
+            return
+
+        self.__loaded_profile = calibration
+        self.__profile_combobox.configure(values=list_profiles(self.__resolution))
+        self.__profile_combobox.set(name)
+        self.__show_start_analysis_dialog()
+
     def __on_motion(self, event: tk.Event) -> None:
         """
-        Update mouse position and re-draw zoom view.
+        Schedule a re-draw of the zoom view, so that motion events in between re-draws only cost the scheduling.
         :param event: TKinter event
         """
+        if self.__motion_refresh_id is None:
+            self.__motion_refresh_id = self.__master.after(self.MOTION_REFRESH_INTERVAL, self.__on_motion_refresh)
+
+    def __on_motion_refresh(self) -> None:
+        """
+        Update mouse position and re-draw zoom view.
+        """
+        self.__motion_refresh_id = None
         self.__update_mouse_pos()
         if self.__mouse_within_bounds():
             self.__update_zoom()
@@ -190,8 +282,8 @@ class SetUpWindow:
             self.__mouse_y = 180  # TODO HACK
 
             self.__markers.pop()
-            self.__update_zoom()
-            self.__view.update_label_left(self.__img_copy)
+            self.__loaded_profile = None
+            self.__update_markers()
             self.__update_title()
 
     def __update_mouse_pos(self) -> None:
@@ -240,10 +332,24 @@ class SetUpWindow:
         """
         return self.__markers[self.__num_box_coords:self.__num_box_coords + self.__num_back_court_coords]
 
+    def get_calibration(self) -> Calibration:
+        """
+        :return: Calibration made of the placed markers, including the cached homography if they have been loaded
+        from a calibration profile, and the analysis settings of the last loaded profile.
+        """
+        homography = None
+        if self.__loaded_profile is not None and self.__loaded_profile.direction == self.__direction.get():
+            homography = self.__loaded_profile.homography
+        return Calibration(self.get_service_box_markers(), self.get_court_lower_boundary_coords(),
+                           self.__direction.get(), self.__resolution, homography, self.__settings)
+
     def teardown(self) -> None:
         """
         Destroys the SetUpWindow frame and unbinds all events.
         """
+        if self.__motion_refresh_id is not None:
+            self.__master.after_cancel(self.__motion_refresh_id)
+            self.__motion_refresh_id = None
         self.__view.teardown()
         self.__master.title("")
         for event in self.__binds:
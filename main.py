@@ -2,14 +2,12 @@
 import tkinter as tk
 from tkinter import messagebox
 
-import numpy as np
-
 from gui import file_selection, set_up_view, guistate
 from gui.analysis_view import AnalysisView
 from gui.output_view import OutputView
 from pipeline import Pipeline
 from stats import AccuracyStatistics
-from utils.court import Court
+from utils.court import Court, CourtOverlay
 from utils.video_reader import VideoReader
 
 
@@ -33,7 +31,7 @@ class MainApplication(tk.Frame):
         self.__init_frame = None
         self.__video_reader = None  # To-be-selected by user
         self.__stats_tracker = None
-        self.__court_img = None
+        self.__court = None
 
         self.__headless = tk.BooleanVar()
         self.__service_box_dir = tk.IntVar()
@@ -55,7 +53,8 @@ class MainApplication(tk.Frame):
 
         self.__init_frame = next(self.__video_reader.get_frame())
         # Move into setup view state
-        self.view = set_up_view.SetUpWindow(root, self.__init_frame, self.__headless, self.__service_box_dir)
+        self.view = set_up_view.SetUpWindow(root, self.__init_frame, self.__headless, self.__service_box_dir,
+                                            self.__video_reader.get_resolution())
 
     def __change_state_ANALYSIS(self, evt: tk.Event) -> None:
         """
@@ -64,18 +63,17 @@ class MainApplication(tk.Frame):
         """
 
         # Gather necessary coordinates for homography mapping
-        service_box_coords_src = np.array(self.view.get_service_box_markers())
-        court_lower_coords_src = np.array(self.view.get_court_lower_boundary_coords())
-        service_box_coords_dst = Court.get_homography_dst_coords(self.__service_box_dir.get())
-        homography_coords = [(service_box_coords_src, court_lower_coords_src), service_box_coords_dst]
+        calibration = self.view.get_calibration()
+        homography_coords = calibration.get_homography_coords()
 
         # Tear down the old frame
         self.view.teardown()
 
-        self.__court_img = Court.get_court_drawing()
         self.__stats_tracker = AccuracyStatistics(Court.create_target_rects(self.__service_box_dir.get()))
+        self.__court = CourtOverlay(self.__stats_tracker.get_target_rects())
 
-        pipeline = Pipeline(self.__video_reader, homography_coords, self.__court_img, self.__stats_tracker)
+        pipeline = Pipeline(self.__video_reader, homography_coords, self.__court, self.__stats_tracker,
+                            homography_matrix=calibration.get_homography_matrix(), settings=calibration.settings)
         # Move into analysis view state
         self.view = AnalysisView(self.__master, self.__headless, self.__init_frame, pipeline)
 
@@ -84,7 +82,7 @@ class MainApplication(tk.Frame):
         Assumes state change from Analysis to output state.
         """
         self.view.teardown()
-        self.view = OutputView(self.__master, self.__stats_tracker, self.__court_img)
+        self.view = OutputView(self.__master, self.__stats_tracker, self.__court.render().copy())
 
     def __try_initialize_video_reader(self, file_path) -> bool:
         """
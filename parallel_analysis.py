@@ -0,0 +1,153 @@
+"""
+Analyses a single video in parallel by splitting it into time segments that are processed in separate processes.
+
+Every segment is preceded by a warm-up period. Its frames are analysed to fill the detector frame buffer, the tracker
+history and the bounce detection window, but bounces found during the warm-up belong to the previous segment.
+The segment workers report every bounce they see without applying the bounce cooldown. The cooldown is applied once
+all segments have been merged, so that a bounce close to a segment boundary suppresses later bounces exactly like
+it does in a serial run.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from bounce_detector import BounceDetector
+from pipeline import Pipeline
+from stats import AccuracyStatistics
+from utils.calibration import AnalysisSettings
+from utils.court import Court, CourtOverlay
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS
+from utils.video_reader import VideoReader
+
+# Duration of video analysed in front of every segment to settle the tracking state, in bounce cooldowns of the
+# settings in use, but at least MIN_WARM_UP_DURATION.
+WARM_UP_COOLDOWNS = 2
+MIN_WARM_UP_DURATION = 1000  # Milliseconds
+# Number of frames analysed after the end of a segment. A bounce is only registered two frames after it happened.
+TAIL_FRAMES = 3
+
+
+def analyse_in_segments(video_path: str, homography_coords: list, direction: int, num_workers: int = None,
+                        decimation: int = 1,
+                        homography_matrix: np.ndarray = None,
+                        offline: bool = False,
+                        settings: AnalysisSettings = None) -> Tuple[AccuracyStatistics, CourtOverlay, List[tuple]]:
+    """
+    Analyses the video in parallel time segments and merges the results.
+
+    :param video_path: Path of the video file
+    :param homography_coords: Source and destination coordinates for the court homography
+    :param direction: Service box direction as used in Court.create_target_rects()
+    :param num_workers: Number of worker processes, defaults to the number of CPUs
+    :param decimation: Only every decimation-th frame is analysed
+    :param homography_matrix: Cached homography for homography_coords
+    :param offline: Whether every segment finds the ball trajectory once it has been read, see Pipeline
+    :param settings: Tracking and bounce detection settings, the defaults if omitted
+    :return: Statistics, court image with the bounces and the list of (timestamp, x, y) bounces
+    """
+    num_workers = num_workers or os.cpu_count()
+    settings = AnalysisSettings() if settings is None else settings
+
+    stream = cv.VideoCapture(video_path)
+    total_frames = int(stream.get(cv.CAP_PROP_FRAME_COUNT))
+    fps = stream.get(cv.CAP_PROP_FPS) or 1000 / REFERENCE_FRAME_INTERVAL_MS
+    stream.release()
+
+    # Round to multiples of the decimation, so that the segments analyse the same frames as a serial run would
+    warm_up_duration = max(WARM_UP_COOLDOWNS * settings.bounce_cooldown, MIN_WARM_UP_DURATION)  # Milliseconds
+    warm_up_frames = decimation * math.ceil(warm_up_duration / 1000 * fps / decimation)
+    segments = _split_into_segments(total_frames, num_workers, warm_up_frames, decimation)
+    if homography_matrix is None:
+        # Compute once instead of in every worker
+        homography_matrix = BounceDetector.compute_homography(*homography_coords)
+
+    with ProcessPoolExecutor(max_workers=min(num_workers, len(segments)), initializer=_init_worker) as executor:
+        futures = [executor.submit(_analyse_segment, video_path, homography_coords, homography_matrix, decimation,
+                                   start, end, warm_up_frames, offline, settings) for start, end in segments]
+        segment_bounces = [future.result() for future in futures]
+
+    bounces = merge_segment_bounces(segment_bounces, settings.bounce_cooldown)
+
+    stats = AccuracyStatistics(Court.create_target_rects(direction))
+    court = CourtOverlay(stats.get_target_rects())
+    xs, ys = [x for _, x, _ in bounces], [y for _, _, y in bounces]
+    court.add_ball_projections(xs, ys)
+    stats.record_bounces(xs, ys)
+
+    return stats, court, bounces
+
+
+def merge_segment_bounces(segment_bounces: List[List[tuple]], cooldown: float) -> List[tuple]:
+    """
+    Joins the bounces of all segments and applies the bounce cooldown.
+    :param segment_bounces: Per segment list of (timestamp, x, y) bounces found without a cooldown
+    :param cooldown: Minimum time in milliseconds between two registered bounces, the bounce_cooldown of the
+    settings the segments were analysed with
+    :return: List of (timestamp, x, y) bounces in chronological order
+    """
+    bounces = []
+    last_bounce_timestamp = float('-inf')
+    for bounce in sorted(bounce for bounces_of_segment in segment_bounces for bounce in bounces_of_segment):
+        if bounce[0] - last_bounce_timestamp > cooldown:
+            bounces.append(bounce)
+            last_bounce_timestamp = bounce[0]
+    return bounces
+
+
+def _analyse_segment(video_path: str, homography_coords: list, homography_matrix: np.ndarray, decimation: int,
+                     start: int, end: int, warm_up_frames: int, offline: bool = False,
+                     settings: AnalysisSettings = None) -> List[tuple]:
+    """
+    Worker process entry point.
+    :param start: Index of the first frame of the segment
+    :param end: Index of the first frame after the segment, None for the last segment
+    :return: List of (timestamp, x, y) bounces that happened within the segment, without the bounce cooldown applied
+    """
+    video_reader = VideoReader(video_path, decimation=decimation, start_frame=max(0, start - warm_up_frames),
+                               end_frame=None if end is None else end + TAIL_FRAMES * decimation)
+    video_reader.start_reading()
+    pipeline = Pipeline(video_reader, homography_coords, None, None, bounce_cooldown=0,
+                        homography_matrix=homography_matrix, offline=offline, settings=settings)
+
+    # The segment is delimited by the timestamps of its first frame and of the first frame of the next segment
+    start_timestamp = float('-inf') if start == 0 else None
+    end_timestamp = None
+    for _ in pipeline.process_next():
+        frame_index = video_reader.get_frame_index()
+        if frame_index == start:
+            start_timestamp = video_reader.get_timestamp()
+        elif frame_index == end:
+            end_timestamp = video_reader.get_timestamp()
+
+    if start_timestamp is None:
+        # The segment lies beyond the actual end of the video
+        return []
+    if end_timestamp is None:
+        end_timestamp = float('inf')
+
+    return [bounce for bounce in pipeline.get_bounces() if start_timestamp <= bounce[0] < end_timestamp]
+
+
+def _split_into_segments(total_frames: int, num_workers: int, warm_up_frames: int,
+                          decimation: int) -> List[Tuple[int, int]]:
+    """
+    :return: List of (start frame, end frame) segments covering the video. The last segment ends with None.
+    """
+    # Segments much shorter than the warm-up would mostly repeat work
+    num_segments = max(1, min(num_workers, total_frames // (4 * warm_up_frames)))
+    segment_len = decimation * math.ceil(total_frames / num_segments / decimation)
+
+    segments = [(i * segment_len, (i + 1) * segment_len) for i in range(num_segments)]
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+
+def _init_worker() -> None:
+    """
+    Keeps every worker process single-threaded, as the parallelism comes from the number of processes.
+    """
+    cv.setNumThreads(1)
@@ -1,40 +1,137 @@
+import time
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+
 import numpy as np
 
 from bounce_detector import BounceDetector
 from tracker import Tracker
+from trajectory_solver import TrajectorySolver
 from double_exponential_estimator import DoubleExponentialEstimator
 from detector import Detector
 from stats import AccuracyStatistics
-from utils.court import Court
+from utils.calibration import AnalysisSettings
+from utils.candidate_log import CandidateLog
+from utils.court import CourtOverlay
+from utils.profiler import StageProfiler
 from utils.rect import Rect
-from utils.utilities import draw_rect
+from utils.utilities import draw_rect, REFERENCE_FRAME_INTERVAL_MS
 from utils.video_reader import VideoReader
 
 
 class Pipeline:
 
-    def __init__(self, vr: VideoReader, homography_coords: list, court_img: np.ndarray, stats: AccuracyStatistics):
+    # Number of detected frames that may wait for the tracking stage in threaded mode
+    DETECTION_QUEUE_SIZE = 4
+    # Interval in seconds at which a blocked detection thread checks whether it should stop
+    __POLL_INTERVAL = 0.1
+
+    def __init__(self, vr: VideoReader, homography_coords: list, court: CourtOverlay, stats: AccuracyStatistics,
+                 bounce_cooldown: float = None, homography_matrix: np.ndarray = None,
+                 profiler: StageProfiler = None, offline: bool = False, candidate_log: CandidateLog = None,
+                 settings: AnalysisSettings = None, threaded: bool = False):
+        """
+        :param vr: Video reader that has started reading. Its decimation must leave contours at most
+        BounceDetector.MAX_CONTOUR_INTERVAL apart, otherwise ValueError is raised.
+        :param homography_coords: Source and destination coordinates for the court homography
+        :param court: Court image to add the bounces to, or None to only collect bounces via get_bounces()
+        :param stats: Statistics to record bounces into, or None to only collect bounces via get_bounces()
+        :param bounce_cooldown: Minimum time in milliseconds between two registered bounces, overrides the one of the
+        settings
+        :param homography_matrix: Cached homography for homography_coords, computed anew if omitted
+        :param profiler: Profiler collecting per stage timings, a disabled one is created if omitted
+        :param offline: Whether to find the ball once the whole video has been read instead of frame by frame, see
+        TrajectorySolver. Bounces are then only recorded once process_next() is exhausted, and frames are not drawn on.
+        :param candidate_log: Log to record the input and output of the tracking stages of every frame into, or None
+        :param settings: Tracking and bounce detection settings, the defaults if omitted
+        :param threaded: Whether to detect the ball candidates of the next frames on a separate thread while the
+        current frame is being tracked. The OpenCV calls of the detection release the GIL, so it overlaps with the
+        tracking on multi-core machines. The video reader then runs ahead of the processed frame by up to
+        DETECTION_QUEUE_SIZE frames, so its frame index and timestamp are not the ones of the processed frame.
+        """
+        decimation = vr.get_decimation()
+        if decimation > 1 and decimation * vr.get_frame_interval() > BounceDetector.MAX_CONTOUR_INTERVAL:
+            vr.stop_reading()
+            raise ValueError(f"Decimation {decimation} leaves {1000 / (decimation * vr.get_frame_interval()):.0f} "
+                             f"frames per second, bounces are only detected reliably at "
+                             f"{1000 / BounceDetector.MAX_CONTOUR_INTERVAL:.0f} or more")
+        settings = AnalysisSettings() if settings is None else settings
+        if bounce_cooldown is None:
+            bounce_cooldown = settings.bounce_cooldown
 
         # Set up the processing pipeline
         self.__video_reader = vr
         self.__detector = Detector()
-        self.__estimator = DoubleExponentialEstimator()
-        self.__tracker = Tracker()
+        self.__estimator = DoubleExponentialEstimator(data_smoothing_factor=settings.data_smoothing_factor,
+                                                      trend_smoothing_factor=settings.trend_smoothing_factor)
+        self.__tracker = Tracker(dist_jump_cutoff=settings.dist_jump_cutoff, avg_area=settings.avg_area,
+                                 min_area_ratio=settings.min_area_ratio, max_area_ratio=settings.max_area_ratio)
         self.stats_tracker = stats
-        self.__court_img = court_img
-        Court.draw_targets_grid(self.__court_img, stats.get_target_rects())
-        self.__bounce_detector = BounceDetector(*homography_coords)
+        self.__court = court
+        self.__bounce_detector = BounceDetector(*homography_coords, cooldown=bounce_cooldown,
+                                                homography_matrix=homography_matrix)
+        # Video timestamp (ms) of the previously processed frame
+        self.__previous_timestamp = None
+        # Recorded bounces as (timestamp, x, y)
+        self.__bounces = []
+        self.__trajectory_solver = TrajectorySolver() if offline else None
+        # Timestamps and ball per frame found by the trajectory solver
+        self.__trajectory = None
+        self.__candidate_log = candidate_log
+        self.__profiler = StageProfiler() if profiler is None else profiler
+        self.__threaded = threaded
+        if threaded:
+            # The detection thread holds the frame it detects the ball candidates in and the detected frames queued
+            vr.hold_frames(self.DETECTION_QUEUE_SIZE + 1)
+        # Time in ns spent processing in process_next(), and busy in the detection and tracking stages
+        self.__wall_time = 0
+        self.__detect_time = 0
+        self.__track_time = 0
 
         self.__initialize_preprocessor()
+        if candidate_log is not None:
+            candidate_log.start(self.__previous_timestamp, self.__bounce_detector.get_homography_matrix())
 
-    def process_next(self) -> (np.ndarray, np.ndarray):
+    def process_next(self) -> (np.ndarray, CourtOverlay):
         """
         Process the next frame from the video.
-        :return: Processed frame and court image
+        The processed frame is handed back to the video reader for reuse once the next frame is requested.
+        :return: Processed frame and court image, which is only drawn once rendered
         """
-        for frame in self.__video_reader.get_frame():
-            processed = self.__process_frame(frame)
-            yield processed, self.__court_img
+        frames = self.__detect_threaded() if self.__threaded else self.__detect_serial()
+        start = time.perf_counter_ns()
+        try:
+            for frame, timestamp, contours in frames:
+                processed = self.__track_frame(frame, timestamp, contours)
+                self.__wall_time += time.perf_counter_ns() - start
+                yield processed, self.__court
+                start = time.perf_counter_ns()
+                self.__video_reader.release_frame(frame)
+            if self.__trajectory_solver is not None:
+                self.__solve_trajectory()
+            self.__wall_time += time.perf_counter_ns() - start
+        finally:
+            # Stops the detection thread should the frames not be processed to the end
+            frames.close()
+
+    def get_bounces(self) -> list:
+        """
+        :return: List of (timestamp in ms, x, y) of all bounces detected so far, x and y in court coordinates.
+        """
+        return self.__bounces
+
+    def get_trajectory(self) -> (np.ndarray, np.ndarray):
+        """
+        :return: Timestamps in ms and (n, 4) array of the ball per frame as found offline, see TrajectorySolver.solve().
+        None unless offline and the whole video has been processed.
+        """
+        return self.__trajectory
+
+    def get_profiler(self) -> StageProfiler:
+        """
+        :return: Profiler of the processing stages, which can be enabled at any time.
+        """
+        return self.__profiler
 
     def get_progress(self) -> float:
         """
@@ -42,31 +139,216 @@ class Pipeline:
         """
         return self.__video_reader.get_progress()
 
-    def __process_frame(self, frame: np.ndarray) -> np.ndarray:
+    def get_stage_utilisation(self) -> dict:
+        """
+        :return: Fraction of the time spent in process_next() that the decoding, detection and tracking stages were
+        busy, the decoding being busy whenever it was not blocked on a full buffer. In threaded mode the stages run
+        concurrently, so the frame rate is bound by the busiest stage rather than by their sum.
+        """
+        wall_time = self.__wall_time / 1e9
+        if not wall_time:
+            return {}
+        producer_stall_time, _ = self.__video_reader.get_stall_times()
+        return {'decode': max(0.0, 1 - producer_stall_time / wall_time),
+                'detect': self.__detect_time / 1e9 / wall_time,
+                'track': self.__track_time / 1e9 / wall_time}
+
+    def __detect_serial(self):
+        """
+        Detects the ball candidates of every frame on the calling thread.
+        :return: Generator of (frame, timestamp, joined contours)
+        """
+        profiler = self.__profiler
+        for frame in self.__video_reader.get_frame():
+            profiler.start_frame()
+            profiler.count('queue_depth', self.__video_reader.get_queue_depth())
+            start = time.perf_counter_ns()
+            preprocessed = self.__detector.process(frame)
+            profiler.lap('detect')
+            contours = self.__tracker.join_contours(preprocessed)
+            profiler.lap('join')
+            self.__detect_time += time.perf_counter_ns() - start
+            yield frame, self.__video_reader.get_timestamp(), contours
+
+    def __detect_threaded(self):
+        """
+        Detects the ball candidates of every frame on a separate thread, which runs ahead by up to
+        DETECTION_QUEUE_SIZE frames and blocks while the tracking stage is behind.
+        :return: Generator of (frame, timestamp, joined contours) in the order of the video
+        """
+        detected = Queue(maxsize=self.DETECTION_QUEUE_SIZE)
+        stopped = Event()
+
+        def put(item) -> bool:
+            while not stopped.is_set():
+                try:
+                    detected.put(item, timeout=self.__POLL_INTERVAL)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def detect():
+            try:
+                for frame in self.__video_reader.get_frame():
+                    if stopped.is_set():
+                        return
+                    queue_depth = self.__video_reader.get_queue_depth()
+                    start = time.perf_counter_ns()
+                    preprocessed = self.__detector.process(frame)
+                    detected_at = time.perf_counter_ns()
+                    contours = self.__tracker.join_contours(preprocessed)
+                    end = time.perf_counter_ns()
+                    # The timings are accounted for by the tracking stage, which owns the profiler and stage times
+                    if not put((frame, self.__video_reader.get_timestamp(), contours, queue_depth,
+                                detected_at - start, end - detected_at)):
+                        return
+                put(None)
+            except Exception as e:
+                # Raised again by the tracking stage
+                put(e)
+
+        def get():
+            try:
+                return detected.get_nowait()
+            except Empty:
+                pass
+            while True:
+                try:
+                    return detected.get(timeout=self.__POLL_INTERVAL)
+                except Empty:
+                    if not detection_thread.is_alive() and detected.empty():
+                        # The detection thread ended without handing over the end of the video
+                        return None
+
+        detection_thread = Thread(target=detect, daemon=True)
+        detection_thread.start()
+        profiler = self.__profiler
+        try:
+            while True:
+                wait_start = time.perf_counter_ns()
+                item = get()
+                wait_latency = time.perf_counter_ns() - wait_start
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                frame, timestamp, contours, queue_depth, detect_latency, join_latency = item
+                self.__detect_time += detect_latency + join_latency
+                profiler.start_frame()
+                # Time the tracking stage waited for the detection of the frame
+                profiler.add('wait', wait_latency)
+                profiler.count('queue_depth', queue_depth)
+                profiler.count('detection_queue_depth', detected.qsize())
+                profiler.add('detect', detect_latency)
+                profiler.add('join', join_latency)
+                yield frame, timestamp, contours
+        finally:
+            # The detection thread finishes the frame it is detecting at most, as the frame pool never blocks
+            stopped.set()
+            detection_thread.join()
+
+    def __track_frame(self, frame: np.ndarray, timestamp: float, contours: np.ndarray) -> np.ndarray:
+        """
+        Tracks the ball through a single frame whose ball candidates have been detected
+        :param frame: Raw video frame
+        :param timestamp: Video timestamp of the frame in milliseconds
+        :param contours: Joined contours of the frame as returned by Tracker.join_contours()
+        :return: Processed frame
+        """
+        start = time.perf_counter_ns()
+        try:
+            return self.__process_frame(frame, timestamp, contours)
+        finally:
+            self.__track_time += time.perf_counter_ns() - start
+
+    def __process_frame(self, frame: np.ndarray, timestamp: float, contours: np.ndarray) -> np.ndarray:
         """
         Processes a single frame
         :param frame: Raw video frame
+        :param timestamp: Video timestamp of the frame in milliseconds
+        :param contours: Joined contours of the frame as returned by Tracker.join_contours()
         :return: Processed frame
         """
 
-        preprocessed = self.__detector.process(frame)
-        prediction = self.__estimator.predict(t=1)
+        profiler = self.__profiler
+
+        if timestamp <= self.__previous_timestamp:
+            # Some containers do not provide usable timestamps, assume 60fps video instead
+            timestamp = self.__previous_timestamp + self.__video_reader.get_decimation() * REFERENCE_FRAME_INTERVAL_MS
+        # Time since the previous frame in 60fps frames, larger than one if frames are being skipped
+        dt = (timestamp - self.__previous_timestamp) / REFERENCE_FRAME_INTERVAL_MS
+        self.__previous_timestamp = timestamp
+
+        if self.__trajectory_solver is not None:
+            self.__trajectory_solver.add_frame(self.__tracker.screen_contours(contours), timestamp)
+            profiler.lap('track')
+            if self.__candidate_log is not None:
+                self.__candidate_log.record(timestamp, contours)
+            self.__count_candidates()
+            return frame
+
+        prediction = self.__estimator.predict(t=1, dt=dt)
         if prediction.x < 0 or prediction.y < 0:
             prediction = Rect(-prediction.width, -prediction.height, prediction.width, prediction.height)
-        ball_bounding_box = self.__tracker.select_most_probable_candidate(preprocessed, prediction)
+        profiler.lap('predict')
+        ball_bounding_box = self.__tracker.select_from_candidates(self.__tracker.screen_contours(contours), prediction,
+                                                                  timestamp)
+        profiler.lap('track')
+        if self.__candidate_log is not None:
+            self.__candidate_log.record(timestamp, contours, prediction, ball_bounding_box)
         self.__estimator.correct(position=ball_bounding_box)
+        profiler.lap('correct')
 
         # region drawing
         draw_rect(frame, prediction, (0, 255, 0))
         draw_rect(frame, ball_bounding_box, (255, 0, 0))
+        profiler.lap('draw')
 
-        self.__bounce_detector.update_contour_data(ball_bounding_box)
-        if self.__bounce_detector.bounced():
-            x, y = self.__bounce_detector.get_last_bounce_location()
-            Court.draw_ball_projection(self.__court_img, x, y)
-            self.stats_tracker.record_bounce(x, y)
+        self.__bounce_detector.update_contour_data(ball_bounding_box, timestamp)
+        bounced = self.__bounce_detector.bounced()
+        profiler.lap('bounce')
+        self.__count_candidates()
+        if bounced:
+            self.__record_bounce(self.__bounce_detector.get_last_bounce_timestamp(),
+                                 *self.__bounce_detector.get_last_bounce_location())
         return frame
 
+    def __solve_trajectory(self) -> None:
+        """
+        Finds the ball trajectory through the candidates of all frames and detects the bounces along it.
+        Frames in which the ball was not found are left out of the bounce detection.
+        """
+        timestamps, trajectory = self.__trajectory_solver.solve()
+        self.__trajectory = timestamps, trajectory
+        if self.__candidate_log is not None:
+            self.__candidate_log.set_balls(trajectory)
+        found = ~np.isnan(trajectory[:, 0])
+        for timestamp, x, y in self.__bounce_detector.detect_bounces(trajectory[found], timestamps[found]):
+            self.__record_bounce(timestamp, x, y)
+
+    def __record_bounce(self, timestamp: float, x: int, y: int) -> None:
+        """
+        Records a bounce.
+        :param timestamp: Video timestamp of the bounce in milliseconds
+        :param x: X-coordinate of the bounce in the court image
+        :param y: Y-coordinate of the bounce in the court image
+        """
+        if self.__court is not None:
+            self.__court.add_ball_projection(x, y)
+        if self.stats_tracker is not None:
+            self.stats_tracker.record_bounce(x, y)
+        self.__bounces.append((timestamp, x, y))
+
+    def __count_candidates(self) -> None:
+        """
+        Records the number of contours and ball candidates of the frame with the profiler.
+        """
+        if self.__profiler.is_enabled():
+            num_contours, num_candidates = self.__tracker.get_candidate_counts()
+            self.__profiler.count('contours', num_contours)
+            self.__profiler.count('candidates', num_candidates)
+
     def __initialize_preprocessor(self) -> None:
         """
         Readies the preprocessor by gathering initial frames.
@@ -74,5 +356,8 @@ class Pipeline:
         """
         for frame in self.__video_reader.get_frame():
             if self.__detector.ready():
+                self.__video_reader.release_frame(frame)
                 return
             self.__detector.initialize_with(frame)
+            self.__previous_timestamp = self.__video_reader.get_timestamp()
+            self.__video_reader.release_frame(frame)
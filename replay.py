@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Re-runs the tracking and bounce detection of recorded analyses without the videos.
+
+Logs are recorded with batch.py --record. Every log is replayed through the Tracker and the estimator frame by frame
+as in the Pipeline, or through the trajectory solver with --offline, and the bounces are detected along the resulting
+ball trajectory. The analysis settings can be changed for the replay, e.g. to tune them on archived sessions, see
+also sweep.py.
+With --bounces-only, the recorded balls are kept and only the bounce detection is re-run.
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from batch import write_results, init_worker
+from bounce_detector import BounceDetector
+from double_exponential_estimator import DoubleExponentialEstimator
+from stats import AccuracyStatistics
+from tracker import Tracker
+from trajectory_solver import TrajectorySolver
+from utils.calibration import AnalysisSettings, Calibration
+from utils.candidate_log import CandidateLog
+from utils.court import Court, CourtOverlay
+from utils.rect import Rect
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS
+
+LOG_SUFFIX = "_log.npz"
+
+
+def find_logs(paths: List[str]) -> List[Path]:
+    """
+    :param paths: Log files and directories containing log files
+    :return: Log file paths, directories expanded in alphabetical order
+    """
+    logs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            logs.extend(sorted(file for file in path.iterdir() if file.name.endswith(LOG_SUFFIX)))
+        else:
+            logs.append(path)
+    return logs
+
+
+def create_tracker(settings: AnalysisSettings) -> Tracker:
+    """
+    :return: Tracker with the settings, as created by the Pipeline
+    """
+    return Tracker(dist_jump_cutoff=settings.dist_jump_cutoff, avg_area=settings.avg_area,
+                   min_area_ratio=settings.min_area_ratio, max_area_ratio=settings.max_area_ratio)
+
+
+def track_online(log: CandidateLog, settings: AnalysisSettings) -> np.ndarray:
+    """
+    Selects the ball frame by frame as the Pipeline does.
+    :return: (n, 4) array of the selected balls
+    """
+    tracker = create_tracker(settings)
+    estimator = DoubleExponentialEstimator(data_smoothing_factor=settings.data_smoothing_factor,
+                                           trend_smoothing_factor=settings.trend_smoothing_factor)
+    previous_timestamp = log.get_initial_timestamp()
+    balls = []
+    for timestamp, contours in zip(log.get_timestamps().tolist(), log.get_contours()):
+        dt = 1 if previous_timestamp is None else (timestamp - previous_timestamp) / REFERENCE_FRAME_INTERVAL_MS
+        previous_timestamp = timestamp
+        prediction = estimator.predict(t=1, dt=dt)
+        if prediction.x < 0 or prediction.y < 0:
+            prediction = Rect(-prediction.width, -prediction.height, prediction.width, prediction.height)
+        ball = tracker.select_from_candidates(tracker.screen_contours(contours), prediction, timestamp)
+        estimator.correct(position=ball)
+        balls.append((ball.x, ball.y, ball.width, ball.height))
+    return np.array(balls, dtype=np.float64).reshape(-1, 4)
+
+
+def track_offline(log: CandidateLog, settings: AnalysisSettings) -> np.ndarray:
+    """
+    Finds the ball in all frames at once, see TrajectorySolver. Only the screening settings apply.
+    :return: (n, 4) array of the balls, NaN where none was found
+    """
+    tracker = create_tracker(settings)
+    solver = TrajectorySolver()
+    for timestamp, contours in zip(log.get_timestamps().tolist(), log.get_contours()):
+        solver.add_frame(tracker.screen_contours(contours), timestamp)
+    _, trajectory = solver.solve()
+    return trajectory
+
+
+def find_balls(log: CandidateLog, settings: AnalysisSettings, offline: bool) -> np.ndarray:
+    """
+    :param log: Recorded log
+    :param settings: Analysis settings to track with
+    :param offline: Whether to find the ball with the trajectory solver
+    :return: (n, 4) array of the balls, NaN where none was found
+    """
+    return track_offline(log, settings) if offline else track_online(log, settings)
+
+
+def detect_log_bounces(log: CandidateLog, balls: np.ndarray, bounce_cooldown: float) -> List[Tuple[float, int, int]]:
+    """
+    :param log: Recorded log
+    :param balls: (n, 4) array of the balls in the frames of the log, NaN where none was found
+    :param bounce_cooldown: Minimum time in milliseconds between two registered bounces
+    :return: List of (timestamp, x, y) bounces, see BounceDetector.detect_bounces()
+    """
+    found = ~np.isnan(balls[:, 0])
+    bounce_detector = BounceDetector(None, None, cooldown=bounce_cooldown,
+                                     homography_matrix=log.get_homography_matrix())
+    return bounce_detector.detect_bounces(balls[found], log.get_timestamps()[found])
+
+
+def replay_log(log_path: Path, output_dir: Path, direction: int, settings: AnalysisSettings, offline: bool,
+               bounces_only: bool) -> (int, int):
+    """
+    Replays a single log and writes its results if an output directory is given.
+    :param log_path: Path of the log file
+    :param output_dir: Directory to write the results into, or None
+    :param direction: Service box direction to score the bounces with, the recorded one if None
+    :param settings: Analysis settings to replay with
+    :param offline: Whether to find the ball with the trajectory solver
+    :param bounces_only: Whether to keep the recorded balls and only detect the bounces anew
+    :return: Number of frames and number of detected bounces
+    """
+    log = CandidateLog.load(str(log_path))
+    balls = log.get_balls() if bounces_only else find_balls(log, settings, offline)
+    bounces = detect_log_bounces(log, balls, settings.bounce_cooldown)
+
+    if output_dir is not None:
+        direction = log.get_direction() if direction is None else direction
+        if direction is None:
+            raise ValueError("The log does not record the service box direction, pass --direction")
+        stats = AccuracyStatistics(Court.create_target_rects(direction))
+        court = CourtOverlay(stats.get_target_rects())
+        xs, ys = [x for _, x, _ in bounces], [y for _, _, y in bounces]
+        court.add_ball_projections(xs, ys)
+        stats.record_bounces(xs, ys)
+        write_results(Path(log_path.name[:-len(LOG_SUFFIX)]), output_dir, stats, court)
+    return len(balls), len(bounces)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('logs', nargs='+', metavar='LOG', help="Log files or directories of log files")
+    parser.add_argument('-o', '--output-dir', help="Directory for the results (default: only print a summary)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--direction', type=int, choices=(1, -1),
+                        help="Service box direction to score the bounces with (default: the recorded one)")
+    parser.add_argument('-c', '--calibration',
+                        help="Calibration file to take the analysis settings from (default: the default settings)")
+    parser.add_argument('--avg-area', type=float,
+                        help="Expected area of the ball in pixels, candidates are screened by it")
+    parser.add_argument('--dist-jump-cutoff', type=float,
+                        help="How much the shortest path may grow before the prediction is selected instead")
+    parser.add_argument('--bounce-cooldown', type=float, help="Minimum time in ms between two bounces")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument('--offline', action='store_true',
+                            help="Find the ball trajectory over each whole log instead of frame by frame")
+    mode_group.add_argument('--bounces-only', action='store_true',
+                            help="Keep the recorded balls and only detect the bounces anew")
+    args = parser.parse_args()
+
+    output_dir = None
+    if args.output_dir is not None:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+    logs = find_logs(args.logs)
+    settings = Calibration.load(args.calibration).settings if args.calibration else None
+    settings = AnalysisSettings() if settings is None else settings
+    overrides = {name: getattr(args, name) for name in ('avg_area', 'dist_jump_cutoff', 'bounce_cooldown')
+                 if getattr(args, name) is not None}
+    settings = dataclasses.replace(settings, **overrides)
+
+    start = time.perf_counter()
+    total_frames = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        futures = {executor.submit(replay_log, log_path, output_dir, args.direction, settings, args.offline,
+                                   args.bounces_only): log_path for log_path in logs}
+        for future in as_completed(futures):
+            log_path = futures[future]
+            try:
+                num_frames, num_bounces = future.result()
+            except Exception as e:
+                failed.append(log_path)
+                print(f"[failed] {log_path}: {e!r}", file=sys.stderr)
+                continue
+            total_frames += num_frames
+            print(f"[ok] {log_path}: {num_frames} frames, {num_bounces} bounces")
+
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(logs) - len(failed)}/{len(logs)} logs, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed:.1f} frames/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
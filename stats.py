@@ -3,8 +3,8 @@ from typing import List
 import cv2 as cv
 import numpy as np
 
-from utils import utilities
-from utils.rect import Rect
+from utils.rect import Rect, BoxArray
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT
 
 
 class AccuracyStatistics:
@@ -16,6 +16,13 @@ class AccuracyStatistics:
 
         # Maps each target rect to a list of ball bounces
         self.__target_rects = {key: [] for key in target_rects}
+        # The target rects in the order of the mapping, for finding the target of a bounce in one go
+        self.__target_boxes = BoxArray.from_rects(self.__target_rects.keys())
+        # The bounce lists of the mapping in the same order, which spares hashing the rects per bounce
+        self.__target_bounces = list(self.__target_rects.values())
+        # Index of the target rect every pixel lies within, see __create_label_map().
+        # Pixel (x, y) is at [y - top, x - left] of the map, where (left, top) is the label origin.
+        self.__label_map, self.__label_origin = self.__create_label_map(self.__target_boxes)
         self.__total_shots = 0
 
         # Marks the naming target_rects
@@ -28,16 +35,72 @@ class AccuracyStatistics:
         :param y: Ball bounce y coordinate
         """
 
-        # Find which target box the bounce landed in and record the bounce
-        for target_rect in self.__target_rects.keys():
-            if utilities.is_within(target_rect, x, y):
-                self.__target_rects[target_rect].append((x, y))
-                break
-        else:
-            self.__target_rects[self.non_target_rect].append((x, y))
-
+        self.__target_bounces[self.__find_target(x, y)].append((x, y))
         self.__total_shots += 1
 
+    def record_bounces(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """
+        Records many ball bounce locations at once, as record_bounce() does one by one.
+        :param xs: Ball bounce x coordinates
+        :param ys: Ball bounce y coordinates
+        """
+        xs, ys = np.asarray(xs).ravel(), np.asarray(ys).ravel()
+        # Look up the bounces on whole pixels at once, and the others like record_bounce()
+        left, top = self.__label_origin
+        height, width = self.__label_map.shape
+        whole = (xs == np.floor(xs)) & (ys == np.floor(ys))
+        on_map = whole & (left <= xs) & (xs < left + width) & (top <= ys) & (ys < top + height)
+        targets = np.zeros(len(xs), np.intp)
+        targets[on_map] = self.__label_map[(ys[on_map] - top).astype(np.intp), (xs[on_map] - left).astype(np.intp)]
+        for i in np.flatnonzero(~whole).tolist():
+            targets[i] = self.__find_target(xs[i], ys[i])
+
+        target_bounces = self.__target_bounces
+        for target, bounce in zip(targets.tolist(), zip(xs.tolist(), ys.tolist())):
+            target_bounces[target].append(bounce)
+        self.__total_shots += len(xs)
+
+    def __find_target(self, x: float, y: float) -> int:
+        """
+        :return: Index of the first target rect (x, y) lies within, 0 for the non-target bucket if there is none.
+        """
+        ix, iy = int(x), int(y)
+        if ix != x or iy != y:
+            # Between pixels, test the target rects themselves
+            within = self.__target_boxes.contains(x, y)
+            return int(within.argmax()) if within.any() else 0
+        left, top = self.__label_origin
+        height, width = self.__label_map.shape
+        if left <= ix < left + width and top <= iy < top + height:
+            return int(self.__label_map[iy - top, ix - left])
+        return 0
+
+    @staticmethod
+    def __create_label_map(target_boxes: BoxArray) -> (np.ndarray, (int, int)):
+        """
+        :param target_boxes: The target rects, the non-target bucket first
+        :return: Array covering the court drawing and all target rects, which holds for every pixel the index of the
+        first target rect the pixel lies within as by utilities.is_within(), boundaries included, or 0 for the
+        non-target bucket. And the (x, y) coordinates of its top-left pixel.
+        """
+        boxes = target_boxes.get_array()[1:]
+        # Pixels within the rects, empty rects have none
+        lefts = np.ceil(np.minimum(boxes[:, 0], boxes[:, 0] + boxes[:, 2])).astype(int)
+        rights = np.floor(np.maximum(boxes[:, 0], boxes[:, 0] + boxes[:, 2])).astype(int)
+        tops = np.ceil(boxes[:, 1]).astype(int)
+        bottoms = np.floor(boxes[:, 1] + boxes[:, 3]).astype(int)
+        non_empty = (lefts <= rights) & (tops <= bottoms)
+
+        left = min(lefts[non_empty].min(initial=0), 0)
+        top = min(tops[non_empty].min(initial=0), 0)
+        right = max(rights[non_empty].max(initial=0), FRAME_WIDTH - 1)
+        bottom = max(bottoms[non_empty].max(initial=0), FRAME_HEIGHT - 1)
+        label_map = np.zeros((bottom - top + 1, right - left + 1), np.int16 if len(target_boxes) > 256 else np.uint8)
+        # Earlier rects take precedence, so they are drawn last
+        for i in np.flatnonzero(non_empty)[::-1].tolist():
+            label_map[tops[i] - top:bottoms[i] - top + 1, lefts[i] - left:rights[i] - left + 1] = i + 1
+        return label_map, (int(left), int(top))
+
     def get_target_rects(self) -> List[Rect]:
         """
         :return: List of tracked target rectangles.
@@ -58,17 +121,20 @@ class AccuracyStatistics:
         """
         result = []
         bounce_data = self.get_box_to_num_shots()
-        total_bounces = self.__total_shots
+        # Avoid dividing by zero if no bounces were recorded
+        total_bounces = max(self.__total_shots, 1)
 
         num_bounces_other = len(self.__target_rects[self.non_target_rect])
-        result.append(f"OTHER: \t{num_bounces_other / total_bounces * 100:.1f}% \t{num_bounces_other}/{total_bounces}\n\n")
+        result.append(f"OTHER: \t{num_bounces_other / total_bounces * 100:.1f}% "
+                      f"\t{num_bounces_other}/{self.__total_shots}\n\n")
 
         count = self.__box_index_start
         for box in bounce_data.keys():
             if box == self.non_target_rect:
                 continue
             num_bounces = len(self.__target_rects[box])
-            result.append(f"{chr(count)}:\t {(num_bounces / total_bounces) * 100:.1f}%  \t{num_bounces}/{total_bounces}\n\n")
+            result.append(f"{chr(count)}:\t {(num_bounces / total_bounces) * 100:.1f}%  "
+                          f"\t{num_bounces}/{self.__total_shots}\n\n")
             count += 1
 
         return ''.join(result)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Tunes the analysis settings to a court by replaying recorded logs with many settings and scoring the detected
+bounces against labelled ones.
+
+Logs are recorded with batch.py --record, see replay.py. The labelled bounces of a log <video>_log.npz are read from
+<video>_bounces.json next to it: a JSON list of {"timestamp": ms, "x": x, "y": y} objects, in which the court
+coordinates x and y are optional. A detected bounce matches a labelled one within --tolerance ms. Settings are ranked
+by the F1 score of the matches over all logs, then by the mean distance of the matched bounces to the labelled
+locations.
+
+Swept settings are given as NAME=V1,V2,... to search the grid of all combinations of the values, or, with --samples,
+also as NAME=LOW:HIGH to draw random settings. Settings that are not swept keep the values of the calibration given
+with -c, or the defaults, which are evaluated as the baseline. The best settings can be written into the calibration
+or saved as a calibration profile, which batch.py and the set-up view then analyse with.
+
+Example:
+    python3 sweep.py recordings/ -c court.json --param avg_area=400,500,600,700 --param bounce_cooldown=1000,1340
+"""
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from batch import init_worker
+from replay import LOG_SUFFIX, find_logs, find_balls, detect_log_bounces
+from utils.calibration import AnalysisSettings, Calibration, save_profile
+from utils.candidate_log import CandidateLog
+
+LABELS_SUFFIX = "_bounces.json"
+# Settings that change the selected balls, per tracking mode. The others only change the bounce detection.
+TRACKING_SETTINGS = ('avg_area', 'min_area_ratio', 'max_area_ratio', 'dist_jump_cutoff', 'data_smoothing_factor',
+                     'trend_smoothing_factor')
+OFFLINE_TRACKING_SETTINGS = ('avg_area', 'min_area_ratio', 'max_area_ratio')
+
+# Logs and labelled bounces of a worker process, see _init_sweep_worker()
+_logs = []
+
+
+@dataclass
+class Score:
+    """
+    Matches of detected bounces to labelled bounces.
+    """
+    true_positives: int = 0
+    false_positives: int = 0
+    false_negatives: int = 0
+    error_sum: float = 0  # Sum of the distances of matched bounces to located labels in court pixels
+    num_located: int = 0  # Number of matched bounces with a located label
+
+    def add(self, other: 'Score') -> None:
+        """
+        Adds the matches of another set of bounces.
+        :param other: Score of the other bounces
+        """
+        self.true_positives += other.true_positives
+        self.false_positives += other.false_positives
+        self.false_negatives += other.false_negatives
+        self.error_sum += other.error_sum
+        self.num_located += other.num_located
+
+    def get_precision(self) -> float:
+        """
+        :return: Fraction of the detected bounces that match a labelled bounce, 1 if none were detected.
+        """
+        detected = self.true_positives + self.false_positives
+        return self.true_positives / detected if detected else 1.0
+
+    def get_recall(self) -> float:
+        """
+        :return: Fraction of the labelled bounces that were detected, 1 if there are none.
+        """
+        labelled = self.true_positives + self.false_negatives
+        return self.true_positives / labelled if labelled else 1.0
+
+    def get_f1(self) -> float:
+        """
+        :return: Harmonic mean of precision and recall.
+        """
+        precision, recall = self.get_precision(), self.get_recall()
+        return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    def get_mean_error(self) -> float:
+        """
+        :return: Mean distance in court pixels of the matched bounces to the labelled locations, NaN if none are
+        located.
+        """
+        return self.error_sum / self.num_located if self.num_located else float('nan')
+
+
+def load_labels(path: Path) -> np.ndarray:
+    """
+    :param path: Path of a labels file, see the module documentation
+    :return: (n, 3) array of the labelled (timestamp, x, y) bounces in chronological order, x and y NaN if not given
+    """
+    with open(path) as file:
+        data = json.load(file)
+    labels = np.array([(bounce['timestamp'], bounce.get('x', np.nan), bounce.get('y', np.nan)) for bounce in data],
+                      dtype=np.float64).reshape(-1, 3)
+    return labels[np.argsort(labels[:, 0], kind='stable')]
+
+
+def score_bounces(bounces: List[Tuple[float, int, int]], labels: np.ndarray, tolerance: float) -> Score:
+    """
+    Matches detected bounces to labelled bounces. Both are in chronological order, so going through the labels in
+    order and matching the earliest detection within the tolerance that has not been matched yet finds the most
+    matches.
+    :param bounces: Detected (timestamp, x, y) bounces in chronological order
+    :param labels: Labelled bounces, see load_labels()
+    :param tolerance: Largest time in ms between a detected and a labelled bounce that match
+    :return: Score of the detected bounces
+    """
+    score = Score()
+    i = 0
+    for timestamp, x, y in labels.tolist():
+        while i < len(bounces) and bounces[i][0] < timestamp - tolerance:
+            i += 1
+            score.false_positives += 1
+        if i < len(bounces) and bounces[i][0] <= timestamp + tolerance:
+            score.true_positives += 1
+            if not np.isnan(x):
+                score.error_sum += float(np.hypot(bounces[i][1] - x, bounces[i][2] - y))
+                score.num_located += 1
+            i += 1
+        else:
+            score.false_negatives += 1
+    score.false_positives += len(bounces) - i
+    return score
+
+
+def parse_param(text: str) -> Tuple[str, Union[List[float], Tuple[float, float]]]:
+    """
+    :param text: Swept setting as NAME=V1,V2,... or NAME=LOW:HIGH
+    :return: Name of the setting and the list of its values, or the (low, high) tuple of its range
+    """
+    name, _, values = text.partition('=')
+    if name not in {field.name for field in dataclasses.fields(AnalysisSettings)}:
+        raise argparse.ArgumentTypeError(f"Unknown setting {name!r}")
+    try:
+        if ':' in values:
+            low, high = map(float, values.split(':'))
+            return name, (low, high)
+        return name, [float(value) for value in values.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid values of {name}: {values!r}")
+
+
+def grid_settings(base: AnalysisSettings, params: dict) -> List[AnalysisSettings]:
+    """
+    :param base: Values of the settings that are not swept
+    :param params: Lists of values per swept setting
+    :return: Settings for all combinations of the values
+    """
+    names = list(params)
+    return [dataclasses.replace(base, **dict(zip(names, values)))
+            for values in itertools.product(*(params[name] for name in names))]
+
+
+def random_settings(base: AnalysisSettings, params: dict, samples: int,
+                    rng: np.random.Generator) -> List[AnalysisSettings]:
+    """
+    :param base: Values of the settings that are not swept
+    :param params: List of values or (low, high) range per swept setting
+    :param samples: Number of settings to draw
+    :param rng: Random number generator
+    :return: Settings with every swept setting drawn from its values, or uniformly from its range
+    """
+    settings = []
+    for _ in range(samples):
+        values = {name: float(rng.uniform(*values)) if isinstance(values, tuple) else float(rng.choice(values))
+                  for name, values in params.items()}
+        settings.append(dataclasses.replace(base, **values))
+    return settings
+
+
+def _tracking_key(settings: AnalysisSettings, offline: bool) -> tuple:
+    """
+    :return: Values of the settings that change the selected balls
+    """
+    return tuple(getattr(settings, name) for name in (OFFLINE_TRACKING_SETTINGS if offline else TRACKING_SETTINGS))
+
+
+def _init_sweep_worker(log_paths: List[Path], label_paths: List[Path]) -> None:
+    """
+    Worker process initializer, which loads the logs and labels once for all settings the worker evaluates.
+    """
+    init_worker()
+    _logs.extend((CandidateLog.load(str(log_path)), load_labels(label_path))
+                 for log_path, label_path in zip(log_paths, label_paths))
+
+
+def _evaluate(settings: List[AnalysisSettings], offline: bool, tolerance: float) -> List[Score]:
+    """
+    Worker process entry point.
+    :param settings: Settings that only differ in the bounce detection, so that the balls are found once for all
+    :return: Score over all logs per settings
+    """
+    scores = [Score() for _ in settings]
+    for log, labels in _logs:
+        balls = find_balls(log, settings[0], offline)
+        for score, log_settings in zip(scores, settings):
+            score.add(score_bounces(detect_log_bounces(log, balls, log_settings.bounce_cooldown), labels, tolerance))
+    return scores
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='+', metavar='LOG', help="Log files or directories of log files")
+    parser.add_argument('-c', '--calibration',
+                        help="Calibration of the court, whose settings are the baseline and which the best settings "
+                             "are saved with")
+    parser.add_argument('--param', type=parse_param, action='append', default=[], metavar='NAME=VALUES',
+                        help="Swept setting as NAME=V1,V2,... or, with --samples, NAME=LOW:HIGH. Settings: " +
+                             ", ".join(field.name for field in dataclasses.fields(AnalysisSettings)))
+    parser.add_argument('--samples', type=int, help="Draw this many random settings instead of searching the grid")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random search")
+    parser.add_argument('--offline', action='store_true', help="Find the ball trajectory over each whole log")
+    parser.add_argument('--tolerance', type=float, default=150,
+                        help="Largest time in ms between a detected and a labelled bounce that match")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--top', type=int, default=10, help="Number of settings to print")
+    parser.add_argument('--table', help="CSV file to write all evaluated settings into, best first")
+    parser.add_argument('--save-calibration', metavar='FILE', help="Write the calibration with the best settings")
+    parser.add_argument('--save-profile', metavar='NAME', help="Save the calibration with the best settings as a "
+                                                               "calibration profile")
+    args = parser.parse_args()
+
+    params = dict(args.param)
+    if not params:
+        parser.error("No setting to sweep, pass --param")
+    if args.samples is None and any(isinstance(values, tuple) for values in params.values()):
+        parser.error("Ranges of values require --samples")
+    if (args.save_calibration or args.save_profile) and not args.calibration:
+        parser.error("Saving the best settings requires --calibration")
+
+    log_paths = find_logs(args.logs)
+    label_paths = [log_path.with_name(log_path.name[:-len(LOG_SUFFIX)] + LABELS_SUFFIX) for log_path in log_paths]
+    missing = [str(label_path) for label_path in label_paths if not label_path.is_file()]
+    if not log_paths or missing:
+        parser.error("No logs given" if not log_paths else f"Missing labelled bounces: {', '.join(missing)}")
+
+    calibration = Calibration.load(args.calibration) if args.calibration else None
+    baseline = calibration.settings if calibration is not None and calibration.settings is not None \
+        else AnalysisSettings()
+    candidates = [baseline] + (grid_settings(baseline, params) if args.samples is None else
+                               random_settings(baseline, params, args.samples, np.random.default_rng(args.seed)))
+    groups = {}
+    for i, settings in enumerate(candidates):
+        groups.setdefault(_tracking_key(settings, args.offline), []).append(i)
+
+    start = time.perf_counter()
+    scores = [None] * len(candidates)
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(groups)), initializer=_init_sweep_worker,
+                             initargs=(log_paths, label_paths)) as executor:
+        futures = {executor.submit(_evaluate, [candidates[i] for i in indices], args.offline, args.tolerance):
+                   indices for indices in groups.values()}
+        for future in as_completed(futures):
+            for i, score in zip(futures[future], future.result()):
+                scores[i] = score
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(candidates)} settings on {len(log_paths)} logs in {elapsed:.1f}s")
+
+    # Ties keep the baseline first, so that settings are only changed for a better score
+    ranking = sorted(range(len(candidates)), key=lambda i: (-scores[i].get_f1(), np.nan_to_num(
+        scores[i].get_mean_error(), nan=np.inf), i))
+    names = list(params)
+    print(f"{'rank':>4} {'f1':>6} {'prec':>6} {'recall':>6} {'error':>6} " +
+          " ".join(f"{name:>{max(len(name), 8)}}" for name in names))
+    for rank, i in enumerate(ranking[:args.top], 1):
+        score = scores[i]
+        print(f"{rank:>4} {score.get_f1():>6.3f} {score.get_precision():>6.3f} {score.get_recall():>6.3f} "
+              f"{score.get_mean_error():>6.1f} " +
+              " ".join(f"{getattr(candidates[i], name):>{max(len(name), 8)}.4g}" for name in names) +
+              (" (baseline)" if i == 0 else ""))
+
+    if args.table:
+        fields = [field.name for field in dataclasses.fields(AnalysisSettings)]
+        with open(args.table, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['rank', 'f1', 'precision', 'recall', 'mean_error', 'true_positives', 'false_positives',
+                             'false_negatives'] + fields)
+            for rank, i in enumerate(ranking, 1):
+                score = scores[i]
+                writer.writerow([rank, score.get_f1(), score.get_precision(), score.get_recall(),
+                                 score.get_mean_error(), score.true_positives, score.false_positives,
+                                 score.false_negatives] + [getattr(candidates[i], field) for field in fields])
+
+    if calibration is not None:
+        tuned = dataclasses.replace(calibration, settings=candidates[ranking[0]])
+        if args.save_calibration:
+            tuned.save(args.save_calibration)
+            print(f"Saved the best settings into {args.save_calibration}")
+        if args.save_profile:
+            try:
+                save_profile(args.save_profile, tuned)
+            except ValueError as e:
+                print(f"The profile could not be saved: {e}", file=sys.stderr)
+                return 1
+            print(f"Saved the best settings as profile {args.save_profile!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
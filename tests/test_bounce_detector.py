@@ -0,0 +1,106 @@
+"""
+Checks that BounceDetector.detect_bounces() finds the same bounces in a whole trajectory as the streaming
+update_contour_data() and bounced() calls of the Pipeline, see benchmarks/bounce_detection.py.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from bounce_detection import DEFAULT_CALIBRATION, synthetic_trajectory  # noqa: E402
+from bounce_detector import BounceDetector  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+from utils.utilities import FRAME_HEIGHT, REFERENCE_FRAME_INTERVAL_MS  # noqa: E402
+
+# Projects every contour onto its top left corner, so that trajectories can be given in court coordinates
+IDENTITY = np.eye(3)
+
+
+def stream_bounces(timestamps: np.ndarray, trajectory: np.ndarray, **kwargs) -> list:
+    """
+    :return: Bounces found by feeding the contours one by one, as the Pipeline does
+    """
+    bounce_detector = BounceDetector(*DEFAULT_CALIBRATION.get_homography_coords(), **kwargs)
+    bounces = []
+    for timestamp, contour in zip(timestamps.tolist(), trajectory.tolist()):
+        bounce_detector.update_contour_data(Rect(*contour), timestamp)
+        if bounce_detector.bounced():
+            bounces.append((bounce_detector.get_last_bounce_timestamp(),
+                            *bounce_detector.get_last_bounce_location()))
+    return bounces
+
+
+def heights_trajectory(ys: list) -> np.ndarray:
+    """
+    :return: Contours of zero size at the given heights
+    """
+    return np.array([(100, y, 0, 0) for y in ys], np.float64).reshape(-1, 4)
+
+
+class DetectBouncesTest(unittest.TestCase):
+
+    def assert_same_bounces(self, timestamps: np.ndarray, trajectory: np.ndarray, **kwargs) -> list:
+        """
+        :param kwargs: Passed to the BounceDetector
+        :return: Bounces found
+        """
+        expected = stream_bounces(timestamps, trajectory, **kwargs)
+        bounce_detector = BounceDetector(*DEFAULT_CALIBRATION.get_homography_coords(), **kwargs)
+        self.assertEqual(bounce_detector.detect_bounces(trajectory, timestamps), expected)
+        return expected
+
+    def test_synthetic_trajectories(self):
+        rng = np.random.default_rng(0)
+        for fps in (25, 29.97, 30, 60, 120, 240, 1000):
+            with self.subTest(fps=fps):
+                timestamps, trajectory = synthetic_trajectory(3000, fps, rng)
+                self.assertTrue(self.assert_same_bounces(timestamps, trajectory))
+
+    def test_empty_trajectory(self):
+        self.assertEqual(self.assert_same_bounces(np.empty(0), np.empty((0, 4))), [])
+
+    def test_cooldown_boundary(self):
+        # A peak every 10 contours 16ms apart, so the bounces are exactly 160ms apart
+        ys = [300, 300, 300, 400, 410, 420, 410, 400, 300, 300] * 20
+        timestamps = np.arange(len(ys)) * 16.0
+        trajectory = heights_trajectory(ys)
+        every_peak = self.assert_same_bounces(timestamps, trajectory, cooldown=159.5, homography_matrix=IDENTITY)
+        self.assertEqual(len(every_peak), 20)
+        every_other_peak = self.assert_same_bounces(timestamps, trajectory, cooldown=160,
+                                                    homography_matrix=IDENTITY)
+        self.assertEqual(every_other_peak, every_peak[::2])
+
+    def test_pattern_boundaries(self):
+        # Peak patterns with equal heights, which are allowed next to the oldest and the newest contour only, and
+        # with heights at and just beyond the frame border
+        patterns = {(400, 410, 420, 410, 400): True, (400, 400, 420, 410, 410): True,
+                    (400, 420, 420, 410, 400): False, (400, 410, 420, 420, 400): False,
+                    (0, 10, 20, 10, 0): True, (-1, 10, 20, 10, 0): False, (0, 10, 20, 10, -1): False,
+                    (620, 630, FRAME_HEIGHT, 630, 620): True, (620, 630, FRAME_HEIGHT + 1, 630, 620): False}
+        for pattern, is_bounce in patterns.items():
+            with self.subTest(pattern=pattern):
+                ys = [300] * 5 + list(pattern) + [300] * 5
+                timestamps = np.arange(len(ys)) * REFERENCE_FRAME_INTERVAL_MS
+                bounces = self.assert_same_bounces(timestamps, heights_trajectory(ys), homography_matrix=IDENTITY)
+                self.assertEqual(bounces, [(timestamps[7], 100, pattern[2])] if is_bounce else [])
+
+    def test_contour_intervals(self):
+        # Contour intervals at and around those where the pattern changes from consecutive contours to contours about
+        # one 60fps frame apart, see BounceDetector.MAX_CONTOUR_INTERVAL, mixed within the trajectory
+        rng = np.random.default_rng(1)
+        intervals = [1, 2, 4, 0.75 * REFERENCE_FRAME_INTERVAL_MS, 12.5, 13, 16, REFERENCE_FRAME_INTERVAL_MS, 17,
+                     1.75 * REFERENCE_FRAME_INTERVAL_MS, 33, BounceDetector.MAX_CONTOUR_INTERVAL, 40]
+        _, trajectory = synthetic_trajectory(3000, 60, rng)
+        timestamps = np.cumsum(rng.choice(intervals, len(trajectory)))
+        self.assertTrue(self.assert_same_bounces(timestamps, trajectory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Checks that a CandidateLog reads back as it was saved.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.candidate_log import CandidateLog  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+
+
+class CandidateLogTest(unittest.TestCase):
+
+    def save_and_load(self, log: CandidateLog) -> CandidateLog:
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "log.npz")
+            log.save(path)
+            return CandidateLog.load(path)
+
+    def assert_same_log(self, loaded: CandidateLog, log: CandidateLog) -> None:
+        self.assertEqual(loaded.get_direction(), log.get_direction())
+        self.assertEqual(loaded.get_initial_timestamp(), log.get_initial_timestamp())
+        np.testing.assert_array_equal(loaded.get_homography_matrix(), log.get_homography_matrix())
+        np.testing.assert_array_equal(loaded.get_timestamps(), log.get_timestamps())
+        self.assertEqual(len(loaded.get_contours()), len(log.get_contours()))
+        for loaded_contours, contours in zip(loaded.get_contours(), log.get_contours()):
+            self.assertEqual(loaded_contours.shape, contours.shape)
+            np.testing.assert_array_equal(loaded_contours, contours)
+        np.testing.assert_array_equal(loaded.get_predictions(), log.get_predictions())
+        np.testing.assert_array_equal(loaded.get_balls(), log.get_balls())
+        np.testing.assert_array_equal(loaded.get_projections(), log.get_projections())
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(0)
+        log = CandidateLog(-1)
+        homography_matrix = np.array([[1.5, 0.1, -20], [0.05, 2, 10], [1e-4, 2e-4, 1]])
+        log.start(983.25, homography_matrix)
+        for i in range(50):
+            # Frames without contours at the start, in between and at the end
+            num_contours = 0 if i in (0, 1, 20, 49) else int(rng.integers(1, 8))
+            contours = rng.integers(0, 640, (num_contours, 5)).astype(np.int64)
+            prediction = None if i % 7 == 0 else Rect(float(rng.normal(100, 20)), 200.5, 24, 25)
+            ball = None if num_contours == 0 else Rect(*contours[0, :4].tolist())
+            log.record(1000 + i * 1000 / 60, contours, prediction, ball)
+
+        loaded = self.save_and_load(log)
+        self.assert_same_log(loaded, log)
+        self.assertTrue(np.isnan(loaded.get_predictions()[0]).all())
+        self.assertTrue(np.isnan(loaded.get_balls()[20]).all())
+        self.assertEqual(loaded.get_contours()[20].shape, (0, 5))
+
+        # Balls found offline replace the recorded ones
+        balls = log.get_balls()
+        balls[::3] = [10, 20.5, 24, 25]
+        log.set_balls(balls)
+        self.assert_same_log(self.save_and_load(log), log)
+
+    def test_empty_log(self):
+        for log in (CandidateLog(), CandidateLog(1)):
+            with self.subTest(direction=log.get_direction()):
+                loaded = self.save_and_load(log)
+                self.assert_same_log(loaded, log)
+                self.assertEqual(loaded.get_contours(), [])
+                self.assertEqual(loaded.get_projections().shape, (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Checks that the FrameCache loads the frames as written and evicts the least recently used cache files.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.frame_cache import FrameCache  # noqa: E402
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT  # noqa: E402
+
+FRAME_SIZE = FRAME_WIDTH * FRAME_HEIGHT
+
+
+class FrameCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.__dir.name)
+        self.registry_dir = self.dir / "registry"
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.__dir.cleanup()
+
+    def create_video(self, name: str) -> str:
+        """
+        :return: Path of a file standing in for a video, only its content matters to the cache
+        """
+        video_path = self.dir / name
+        video_path.write_bytes(self.rng.bytes(1000))
+        return str(video_path)
+
+    def cache_video(self, frame_cache: FrameCache, video_path: str, num_frames: int, max_frames: int) -> tuple:
+        """
+        :return: Frames and timestamps written to the cache
+        """
+        frames = self.rng.integers(0, 256, (num_frames,) + frame_cache.get_frame_shape(), np.uint8)
+        timestamps = np.arange(num_frames) * 1000 / 60
+        writer = frame_cache.create_writer(video_path, max_frames)
+        self.assertIsNotNone(writer)
+        for frame, timestamp in zip(frames, timestamps):
+            self.assertTrue(writer.write(frame, timestamp))
+        writer.finish()
+        return frames, timestamps
+
+    def cache_files(self) -> list:
+        return sorted(path.name for path in self.dir.glob(".*.npy*"))
+
+    def entry_path(self, video_path: str) -> Path:
+        """
+        :return: Registry entry of the cached video
+        """
+        name = Path(video_path).name
+        return next(path for path in self.registry_dir.glob("*.json") if f"/.{name}." in path.read_text())
+
+    def test_round_trip(self):
+        frame_cache = FrameCache(100 * FRAME_SIZE, grayscale=True, registry_dir=self.registry_dir)
+        video_path = self.create_video("a.mp4")
+        self.assertIsNone(frame_cache.load(video_path))
+        frames, timestamps = self.cache_video(frame_cache, video_path, 7, 20)
+
+        cached_frames, cached_timestamps = frame_cache.load(video_path)
+        np.testing.assert_array_equal(cached_frames, frames)
+        np.testing.assert_array_equal(cached_timestamps, timestamps)
+        # The cache file holds the frames written only, not the maximum number of frames
+        frames_path = Path(cached_frames.filename)
+        self.assertEqual(np.load(frames_path, mmap_mode='r').shape, frames.shape)
+        self.assertEqual(frames_path.stat().st_size, cached_frames.offset + frames.nbytes)
+        self.assertEqual(len(list(self.registry_dir.glob("*.json"))), 1)
+
+        # Other resolutions and colour frames are cached separately
+        self.assertIsNone(FrameCache(100 * FRAME_SIZE, registry_dir=self.registry_dir).load(video_path))
+
+    def test_modified_video(self):
+        frame_cache = FrameCache(100 * FRAME_SIZE, grayscale=True, registry_dir=self.registry_dir)
+        video_path = self.create_video("a.mp4")
+        self.cache_video(frame_cache, video_path, 3, 3)
+        stat = os.stat(video_path)
+        os.utime(video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(frame_cache.load(video_path))
+
+    def test_eviction(self):
+        # Room for 25 frames and the headers of the cache files, the reservation of a writer counts its maximum number
+        # of frames
+        frame_cache = FrameCache(25 * FRAME_SIZE + 1024, grayscale=True, registry_dir=self.registry_dir)
+        a, b, c, d = (self.create_video(f"{name}.mp4") for name in "abcd")
+        self.cache_video(frame_cache, a, 10, 10)
+        self.cache_video(frame_cache, b, 5, 10)
+        # The second video only counts the 5 frames written, so the third one fits without evicting any
+        self.cache_video(frame_cache, c, 10, 10)
+        self.assertTrue(all(frame_cache.load(video_path) is not None for video_path in (a, b, c)))
+
+        # The fourth video needs room for 10 frames, which evicts the least recently used videos, b and then c
+        for video_path, last_use in ((b, 1000), (c, 2000), (a, 3000)):
+            os.utime(self.entry_path(video_path), (last_use, last_use))
+        writer = frame_cache.create_writer(d, 10)
+        self.assertIsNone(frame_cache.load(b))
+        self.assertIsNone(frame_cache.load(c))
+        self.assertIsNotNone(frame_cache.load(a))
+        writer.abort()
+        self.assertEqual(self.cache_files(), [f".a.mp4.{Path(self.entry_path(a)).stem}.{suffix}"
+                                              for suffix in ("npy", "timestamps.npy")])
+
+    def test_overflow(self):
+        frame_cache = FrameCache(100 * FRAME_SIZE, grayscale=True, registry_dir=self.registry_dir)
+        video_path = self.create_video("a.mp4")
+        writer = frame_cache.create_writer(video_path, 2)
+        frame = np.zeros(frame_cache.get_frame_shape(), np.uint8)
+        self.assertTrue(writer.write(frame, 0))
+        self.assertTrue(writer.write(frame, 1))
+        # The writer is aborted, and neither the cache file nor its reservation remain
+        self.assertFalse(writer.write(frame, 2))
+        self.assertEqual(self.cache_files(), [])
+        self.assertEqual(list(self.registry_dir.glob("*.json")), [])
+        self.assertIsNone(frame_cache.load(video_path))
+        self.assertIsNone(frame_cache.create_writer(video_path, 101))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Checks that the morphological closing of the Detector is bit-identical to the original implementation of nine 3x3
+dilations followed by a 3x3 erosion.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.utilities import morphological_close  # noqa: E402
+
+# Thresholded masks of a recorded video as computed by the Detector before the closing, every 6th frame, see
+# benchmarks/morphological_close.py
+MASKS_PATH = Path(__file__).resolve().parent.parent / "resources" / "test" / "detector_masks.npz"
+ITERATIONS = 9
+KERNEL = np.ones((3, 3), np.uint8)
+
+
+def reference_close(image: np.ndarray) -> np.ndarray:
+    """
+    The original closing of the Detector.
+    """
+    dilated = cv.dilate(image, KERNEL, iterations=ITERATIONS)
+    return cv.erode(dilated, KERNEL)
+
+
+class MorphologicalCloseTest(unittest.TestCase):
+
+    def assert_identical_closing(self, masks: list) -> None:
+        # The buffers are reused across masks as in the Detector, so stale content must not leak into the result
+        dst = np.full_like(masks[0], 255)
+        dilated = np.full_like(masks[0], 255)
+        for i, mask in enumerate(masks):
+            with self.subTest(mask=i):
+                np.testing.assert_array_equal(morphological_close(mask, ITERATIONS, dst, dilated),
+                                              reference_close(mask))
+                np.testing.assert_array_equal(morphological_close(mask, ITERATIONS), reference_close(mask))
+
+    def test_recorded_masks(self):
+        with np.load(MASKS_PATH) as data:
+            masks = np.unpackbits(data['masks'], axis=-1).astype(np.uint8) * 255
+        self.assert_identical_closing(list(masks))
+
+    def test_foreground_at_the_borders(self):
+        masks = []
+        for y, x in ((0, 0), (0, 359), (639, 0), (639, 359), (320, 0), (5, 180)):
+            mask = np.zeros((640, 360), np.uint8)
+            mask[y, x] = 255
+            masks.append(mask)
+        self.assert_identical_closing(masks)
+
+    def test_scattered_foreground(self):
+        # The foreground spans most of the image, which is then processed as a whole
+        rng = np.random.default_rng(0)
+        masks = [np.where(rng.random((640, 360)) < 1e-4, 255, 0).astype(np.uint8) for _ in range(5)]
+        mask = np.zeros((640, 360), np.uint8)
+        mask[10, 5] = mask[600, 350] = 255
+        masks.append(mask)
+        self.assert_identical_closing(masks)
+
+    def test_empty_mask(self):
+        self.assert_identical_closing([np.zeros((640, 360), np.uint8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Checks that analysing a video in parallel segments finds the same bounces as a serial run.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from bounce_detection import DEFAULT_CALIBRATION, synthetic_trajectory  # noqa: E402
+from bounce_detector import BounceDetector  # noqa: E402
+from decimation import synthetic_clip  # noqa: E402
+from parallel_analysis import TAIL_FRAMES, analyse_in_segments, merge_segment_bounces  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from utils.calibration import AnalysisSettings  # noqa: E402
+from utils.video_reader import VideoReader  # noqa: E402
+
+
+class MergeSegmentBouncesTest(unittest.TestCase):
+
+    def test_split_trajectory(self):
+        # The segments are analysed as the segment workers do, without a cooldown and with a warm-up in front
+        homography_coords = DEFAULT_CALIBRATION.get_homography_coords()
+        timestamps, trajectory = synthetic_trajectory(6000, 60, np.random.default_rng(0))
+        for cooldown in (0, 500, BounceDetector.BOUNCE_COOLDOWN, 3000):
+            serial = BounceDetector(*homography_coords, cooldown=cooldown).detect_bounces(trajectory, timestamps)
+            self.assertTrue(serial)
+            for num_segments in (2, 3, 7, 16):
+                with self.subTest(cooldown=cooldown, segments=num_segments):
+                    boundaries = np.linspace(0, len(timestamps), num_segments + 1).astype(int).tolist()
+                    segment_bounces = []
+                    for start, end in zip(boundaries[:-1], boundaries[1:]):
+                        first = max(0, start - 20)
+                        last = min(end + TAIL_FRAMES, len(timestamps))
+                        bounces = BounceDetector(*homography_coords, cooldown=0).detect_bounces(
+                            trajectory[first:last], timestamps[first:last])
+                        end_timestamp = timestamps[end] if end < len(timestamps) else float('inf')
+                        segment_bounces.append([bounce for bounce in bounces
+                                                if timestamps[start] <= bounce[0] < end_timestamp])
+                    self.assertEqual(merge_segment_bounces(segment_bounces, cooldown), serial)
+
+
+class AnalyseInSegmentsTest(unittest.TestCase):
+
+    def test_settings_cooldown(self):
+        # A cooldown longer than the time between the shots of the clip, which suppresses every other bounce. The
+        # warm-up follows it, so that the clip is split into 2 segments.
+        settings = AnalysisSettings(bounce_cooldown=2500)
+        with tempfile.TemporaryDirectory() as clip_dir:
+            video_path = str(Path(clip_dir) / "clip.mp4")
+            synthetic_clip(video_path, 30, 40, DEFAULT_CALIBRATION, np.random.default_rng(0))
+
+            video_reader = VideoReader(video_path)
+            video_reader.start_reading()
+            pipeline = Pipeline(video_reader, DEFAULT_CALIBRATION.get_homography_coords(), None, None,
+                                settings=settings)
+            for _ in pipeline.process_next():
+                pass
+            _, _, bounces = analyse_in_segments(video_path, DEFAULT_CALIBRATION.get_homography_coords(),
+                                                DEFAULT_CALIBRATION.direction, num_workers=4, settings=settings)
+        self.assertTrue(bounces)
+        self.assertEqual(bounces, pipeline.get_bounces())
+
+
+if __name__ == '__main__':
+    unittest.main()
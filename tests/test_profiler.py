@@ -0,0 +1,55 @@
+"""
+Checks the latency and counter summaries of the StageProfiler against exact ones.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.profiler import StageProfiler  # noqa: E402
+
+
+class StageProfilerTest(unittest.TestCase):
+
+    def test_summaries(self):
+        rng = np.random.default_rng(0)
+        latencies = rng.lognormal(14, 1, 20000).astype(np.int64)  # ns
+        candidates = rng.poisson(3, 20000)
+        contours = np.concatenate((np.zeros(500, np.int64), rng.integers(0, 2000, 19500)))
+        profiler = StageProfiler(enabled=True)
+        for latency, num_candidates, num_contours in zip(latencies.tolist(), candidates.tolist(),
+                                                         contours.tolist()):
+            profiler.add('detect', latency)
+            profiler.count('candidates', num_candidates)
+            profiler.count('contours', num_contours)
+        report = profiler.get_report()
+
+        for summary, values in ((report['stages_ms']['detect'], latencies / 1e6),
+                                (report['counters']['candidates'], candidates),
+                                (report['counters']['contours'], contours)):
+            self.assertEqual(summary['count'], len(values))
+            self.assertAlmostEqual(summary['mean'], values.mean(), delta=1e-9 * values.mean())
+            self.assertEqual(summary['max'], values.max())
+            for q in (50, 95):
+                self.assertAlmostEqual(summary[f'p{q}'], np.percentile(values, q, method='lower'),
+                                       delta=0.025 * np.percentile(values, q))
+        # Small integers are not blurred with their neighbours
+        self.assertEqual(report['counters']['candidates']['p50'], np.median(candidates))
+        self.assertEqual(report['counters']['candidates']['p95'], np.percentile(candidates, 95, method='lower'))
+
+    def test_disabled(self):
+        profiler = StageProfiler()
+        profiler.add('detect', 100)
+        profiler.count('candidates', 1)
+        self.assertEqual(profiler.get_report()['stages_ms'], {})
+        self.assertEqual(profiler.get_report()['counters'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Checks that AccuracyStatistics records bounces into the same targets as the original linear scan over the target
+rects with utilities.is_within(), see benchmarks/target_lookup.py.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from stats import AccuracyStatistics  # noqa: E402
+from target_lookup import random_bounces, random_layout, recorded_targets, reference_record  # noqa: E402
+from utils.court import Court  # noqa: E402
+from utils.rect import Rect  # noqa: E402
+
+
+class TargetLookupTest(unittest.TestCase):
+
+    def assert_same_targets(self, target_rects: list, bounces: list) -> None:
+        """
+        Records the bounces one by one and in a batch, and compares their targets with those of the scan.
+        """
+        stats = AccuracyStatistics(list(target_rects))
+        expected = reference_record(stats, bounces)
+        for x, y in bounces:
+            stats.record_bounce(x, y)
+        batch_stats = AccuracyStatistics(list(target_rects))
+        xs, ys = np.array(bounces, np.float64).reshape(-1, 2).T
+        batch_stats.record_bounces(xs, ys)
+        for recorded in (recorded_targets(stats), recorded_targets(batch_stats)):
+            # Reports the first mismatch only, the lists are long
+            mismatches = ((bounce, recorded[bounce], rect) for bounce, rect in zip(bounces, expected)
+                          if recorded[bounce] != rect)
+            self.assertIsNone(next(mismatches, None))
+
+    def test_court_targets(self):
+        for direction in (1, -1):
+            with self.subTest(direction=direction):
+                target_rects = Court.create_target_rects(direction)
+                # Every pixel in and around the targets
+                boxes = np.array([(min(r.x, r.x + r.width), r.y, max(r.x, r.x + r.width), r.y + r.height)
+                                  for r in target_rects])
+                left, top = np.floor(boxes[:, :2].min(axis=0)).astype(int) - 2
+                right, bottom = np.ceil(boxes[:, 2:].max(axis=0)).astype(int) + 2
+                bounces = [(x, y) for y in range(top, bottom + 1) for x in range(left, right + 1)]
+                self.assert_same_targets(target_rects, bounces)
+
+    def test_random_layouts(self):
+        rng = np.random.default_rng(0)
+        for i in range(10):
+            with self.subTest(layout=i):
+                target_rects = random_layout(rng)
+                self.assert_same_targets(target_rects, random_bounces(target_rects, 3000, rng))
+
+    def test_special_rects(self):
+        # Empty rects, rects of fractional coordinates and rects beyond the frame
+        target_rects = [Rect(10, 10, 0, 0), Rect(20, 20, -5, 0), Rect(30.5, 30.5, 10.25, 4.5),
+                        Rect(50.5, 50, -10.5, 10), Rect(-10, -10, 20, 20), Rect(350, 630, 30, 30)]
+        rng = np.random.default_rng(1)
+        bounces = random_bounces(target_rects, 3000, rng)
+        bounces += [(x, y) for x in range(-12, 60) for y in range(-12, 60)]
+        bounces += [(10.0, 10.0), (30.5, 30.5), (40.75, 35.0), (40.0, 35.0), (50.5, 60.0), (40.0, 50.0)]
+        self.assert_same_targets(target_rects, list(dict.fromkeys(bounces)))
+
+    def test_many_targets(self):
+        # More targets than fit into the 8-bit labels. Equal rects would share their bounces, so they are dropped.
+        rng = np.random.default_rng(2)
+        target_rects = [rect for layout in (random_layout(rng) for _ in range(40)) for rect in layout]
+        target_rects = list(dict.fromkeys(target_rects))
+        self.assertGreater(len(target_rects), 256)
+        self.assert_same_targets(target_rects, random_bounces(target_rects, 3000, rng))
+
+
+if __name__ == '__main__':
+    unittest.main()
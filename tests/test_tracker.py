@@ -0,0 +1,154 @@
+"""
+Checks that the Tracker extracts and selects the same ball candidates as its original implementation, see benchmarks/.
+
+Run from the repository root with:
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from box_joining import reference_join, random_masks, sorted_bounding_boxes, _join_nearby_bounding_boxes  # noqa: E402
+from path_search import ReferenceTracker, synthetic_stream  # noqa: E402
+from tracker import Tracker  # noqa: E402
+from utils.rect import Rect, BoxArray  # noqa: E402
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS, morphological_close  # noqa: E402
+
+# Thresholded masks of a recorded video as computed by the Detector before the closing, every 6th frame
+MASKS_PATH = Path(__file__).resolve().parent.parent / "resources" / "test" / "detector_masks.npz"
+
+
+def reference_join_contours(mask: np.ndarray) -> np.ndarray:
+    """
+    The original joining of the contours of the Tracker, which took the bounding boxes of the Canny edges of the mask.
+    """
+    contours, _ = cv.findContours(cv.Canny(mask, 0, 1), cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    bounding_boxes = sorted((cv.boundingRect(contour) for contour in contours), key=lambda box: box[0])
+    bounding_boxes = np.array([(x, y, w, h, w * h) for x, y, w, h in bounding_boxes], np.int64).reshape(-1, 5)
+    return reference_join(bounding_boxes)
+
+
+class PathSearchTest(unittest.TestCase):
+    """
+    Feeds the same candidate streams to the original path search, which recomputed all paths on every frame, and to
+    the incremental one of the Tracker. Gating is switched off, as the original has none.
+    """
+
+    def assert_same_selections(self, stream: list, tracker: Tracker = None) -> list:
+        """
+        :param stream: List of (ball candidates, prediction, timestamp) per frame
+        :param tracker: Tracker to feed the stream to, a new one without gating if omitted
+        :return: Selections of the Tracker
+        """
+        reference = ReferenceTracker()
+        tracker = Tracker(gating=False) if tracker is None else tracker
+        selections = []
+        for i, (candidates, prediction, timestamp) in enumerate(stream):
+            expected = reference.select_from_candidates(candidates, prediction, timestamp)
+            selections.append(tracker.select_from_candidates(candidates, prediction, timestamp))
+            self.assertEqual(selections[-1], expected, f"frame {i}")
+        return selections
+
+    def test_synthetic_streams(self):
+        rng = np.random.default_rng(0)
+        # The original takes quadratically longer with the number of candidates
+        for num_candidates, num_frames in ((1, 300), (2, 300), (3, 300), (5, 300), (10, 200), (40, 40)):
+            with self.subTest(candidates=num_candidates):
+                self.assert_same_selections(synthetic_stream(num_frames, num_candidates, rng))
+
+    def test_empty_frames(self):
+        # The prediction stands in for the candidates of frames without any
+        stream = synthetic_stream(300, 3, np.random.default_rng(1))
+        stream = [(BoxArray() if i % 4 == 1 or 100 <= i < 110 else candidates, prediction, timestamp)
+                  for i, (candidates, prediction, timestamp) in enumerate(stream)]
+        selections = self.assert_same_selections(stream)
+        self.assertEqual(selections[101], stream[101][1])
+
+    def test_single_layer_history(self):
+        # After a gap longer than the history, the history only holds the current frame, so there is no path
+        stream = synthetic_stream(300, 3, np.random.default_rng(2))
+        gap = 100 * REFERENCE_FRAME_INTERVAL_MS
+        stream = [(candidates, prediction, timestamp + gap * (i >= 100) + gap * (i >= 200))
+                  for i, (candidates, prediction, timestamp) in enumerate(stream)]
+        tracker = Tracker(gating=False)
+        selections = self.assert_same_selections(stream[:101], tracker)
+        self.assertEqual(len(tracker._Tracker__candidate_history), 1)
+        self.assertEqual(selections[100], stream[100][1])
+        self.assert_same_selections(stream)
+
+    def test_jump_past_cutoff(self):
+        # The only candidate moves further than dist_jump_cutoff at once, so the prediction is selected instead
+        stream = []
+        for i in range(100):
+            candidate = Rect(10, 10, 24, 25) if i < 50 else Rect(300, 600, 24, 25)
+            prediction = Rect(10 + i % 3, 10, 24, 25)
+            stream.append((BoxArray.from_rects([candidate]), prediction, i * REFERENCE_FRAME_INTERVAL_MS))
+        selections = self.assert_same_selections(stream)
+        self.assertEqual(selections[49], Rect(10, 10, 24, 25))
+        self.assertEqual(selections[50], stream[50][1])
+
+
+class JoinContoursTest(unittest.TestCase):
+
+    def test_recorded_masks(self):
+        with np.load(MASKS_PATH) as data:
+            masks = np.unpackbits(data['masks'], axis=-1).astype(np.uint8) * 255
+        tracker = Tracker()
+        for i, mask in enumerate(masks):
+            with self.subTest(mask=i):
+                # The Tracker is given the closed masks of the Detector
+                mask = morphological_close(mask, 9)
+                np.testing.assert_array_equal(tracker.join_contours(mask), reference_join_contours(mask))
+
+
+class BoxJoiningTest(unittest.TestCase):
+    """
+    Compares the sweep-line joining of nearby bounding boxes with the original greedy joining.
+    """
+
+    def assert_same_joins(self, boxes_per_mask: list) -> None:
+        for i, bounding_boxes in enumerate(boxes_per_mask):
+            with self.subTest(mask=i):
+                np.testing.assert_array_equal(_join_nearby_bounding_boxes(bounding_boxes),
+                                              reference_join(bounding_boxes))
+
+    def test_random_masks(self):
+        rng = np.random.default_rng(0)
+        for scenario in ('players', 'fragments', 'noise'):
+            with self.subTest(scenario=scenario):
+                self.assert_same_joins([sorted_bounding_boxes(mask) for mask in random_masks(scenario, 30, rng)])
+
+    def test_random_boxes(self):
+        # Overlapping boxes and boxes with equal x-coordinates, in any order among equal x-coordinates
+        rng = np.random.default_rng(1)
+        boxes_per_mask = []
+        for num_boxes in (0, 1, 2, 3, 10, 100, 500):
+            bounding_boxes = np.column_stack((rng.integers(0, 100, num_boxes), rng.integers(0, 640, num_boxes),
+                                              rng.integers(1, 30, (num_boxes, 2)), np.zeros(num_boxes, np.int64)))
+            bounding_boxes[:, 4] = bounding_boxes[:, 2] * bounding_boxes[:, 3]
+            boxes_per_mask.append(bounding_boxes[np.argsort(bounding_boxes[:, 0], kind='stable')].astype(np.int64))
+        self.assert_same_joins(boxes_per_mask)
+
+    def test_join_distances(self):
+        # Boxes right at and one pixel beyond the join distances of 5 horizontally and 10 vertically
+        boxes_per_mask = []
+        for dx, dy in ((5, 0), (6, 0), (0, 10), (0, 11), (5, 10), (5, -10), (6, -11)):
+            boxes_per_mask.append(np.array([[100, 300, 10, 10, 100], [110 + dx, 310 + dy, 10, 10, 100]], np.int64))
+        # The right border of a group is that of the box added last, even if it lies further left
+        boxes_per_mask.append(np.array([[100, 300, 40, 10, 400], [102, 305, 4, 4, 16], [112, 300, 4, 4, 16]],
+                                       np.int64))
+        self.assert_same_joins(boxes_per_mask)
+        self.assertEqual(len(_join_nearby_bounding_boxes(boxes_per_mask[0])), 1)
+        self.assertEqual(len(_join_nearby_bounding_boxes(boxes_per_mask[1])), 2)
+        self.assertEqual(len(_join_nearby_bounding_boxes(boxes_per_mask[2])), 1)
+        self.assertEqual(len(_join_nearby_bounding_boxes(boxes_per_mask[3])), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
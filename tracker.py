@@ -1,12 +1,12 @@
+import math
 import sys
 from collections import deque
-from operator import itemgetter
-from typing import List
 
 import cv2 as cv
 import numpy as np
 
-from utils.rect import Rect
+from utils.rect import Rect, BoxArray
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS, FRAME_WIDTH, FRAME_HEIGHT
 
 
 class Tracker:
@@ -14,84 +14,253 @@ class Tracker:
     Implements selection of the most probable ball contour from a list of contours.
     """
 
-    def __init__(self):
-        self.__candidate_history = deque(maxlen=7)  # deque(list[Rect], list[Rect], ...)
+    def __init__(self, gating: bool = True, dist_jump_cutoff: float = 100, avg_area: float = 24*25,
+                 min_area_ratio: float = 0.3, max_area_ratio: float = 3):
+        """
+        :param gating: Whether to prune ball candidates that the ball cannot have reached before the path search in
+        frames with many candidates, see __gate_candidates()
+        :param dist_jump_cutoff: How much longer than the previous shortest path the shortest path may get before the
+        prediction is selected instead
+        :param avg_area: Expected area of the ball in pixels
+        :param min_area_ratio: Joined contours smaller than min_area_ratio * avg_area are no ball candidates
+        :param max_area_ratio: Joined contours larger than max_area_ratio * avg_area are no ball candidates
+        """
+        self.__candidate_history = deque()  # deque(BoxArray, BoxArray, ...)
+        # For every candidate in the history, the distances of the transitions along the shortest path ending in the
+        # candidate, oldest first. A path through a history of n frames has n - 1 transitions:
+        # deque(np.ndarray of shape (num_candidates, n - 1), ...)
+        self.__path_distances = deque()
+        # Video timestamp (ms) of each entry in the candidate history
+        self.__history_timestamps = deque()
+        # The candidate history spans 7 frames of 60fps video, i.e. 6 frame intervals.
+        # Half a frame is added so that rounding of the video timestamps does not drop an entry too early.
+        self.__HISTORY_DURATION = (6 + 0.5) * REFERENCE_FRAME_INTERVAL_MS  # Milliseconds
+        # Frames with at most this many candidates are handled with plain Python arithmetic, which is faster than
+        # NumPy for the one or two candidates of most frames and gives bit-identical distances
+        self.__MAX_SCALAR_CANDIDATES = 4
 
         # Dummy entries for initial start-up of the detector.
+        # Their timestamps are assigned once the timestamp of the first frame is known.
         dummy_candidate = Rect(0, 0, 0, 0)
         # Means that during frame 1, we had a single ball candidate: 'dummy candidate'
-        self.__candidate_history.append([dummy_candidate])
+        self.__append_layer(BoxArray.from_rects([dummy_candidate]))
         # Similarly, means that during frame 2, we also had single ball candidate: 'dummy candidate'
-        self.__candidate_history.append([dummy_candidate])
-
-        self.avg_area = 24*25  # Experimentally found nice constant
+        self.__append_layer(BoxArray.from_rects([dummy_candidate]))
+        self.__current_timestamp = None
+        # Time in ms since the previous frame
+        self.__frame_interval = REFERENCE_FRAME_INTERVAL_MS
+
+        # Frames with more than MAX_CANDIDATES candidates are gated: candidates further than GATE_RADIUS per 60fps
+        # frame, plus GATE_VELOCITY_GAIN times the distance the ball is predicted to move, from all candidates of the
+        # previous frame and from the prediction are dropped, and at most MAX_CANDIDATES candidates are kept.
+        self.__gating = gating
+        self.__GATE_RADIUS = 60  # Pixels
+        self.__GATE_VELOCITY_GAIN = 2
+        self.__MAX_CANDIDATES = 32
+        # Distances to the closest candidate are looked up in a grid of GRID_CELL_SIZE pixel cells over the frame
+        self.__GRID_CELL_SIZE = 8
+        self.__grid = np.empty((-(-FRAME_HEIGHT // self.__GRID_CELL_SIZE), -(-FRAME_WIDTH // self.__GRID_CELL_SIZE)),
+                               np.uint8)
+        # (x, y) of all candidates of the previous frame, gated or not
+        self.__previous_positions = np.empty((0, 2))
+        # The candidate selected in the previous frame
+        self.__last_selection = None
+
+        self.avg_area = avg_area  # Experimentally found nice constant by default
+        self.__min_area_ratio = min_area_ratio
+        self.__max_area_ratio = max_area_ratio
         self.__prev_best_dist = 0
-        self.__dist_jump_cutoff = 100
+        self.__dist_jump_cutoff = dist_jump_cutoff
 
-        """ Mapping: goal: Rect -> (total_distance_required: float, from_rect: Rect, from_rect_layer_number: int) 
-        total_distance_required gives the distance from layer 1 to reach current goal Rect. """
-        self.__best_paths = dict()
+        # Number of joined contours and of ball candidates in the latest frame
+        self.__num_contours = 0
+        self.__num_candidates = 0
 
-    def select_most_probable_candidate(self, frame: np.ndarray, prediction: Rect) -> Rect:
+    def select_most_probable_candidate(self, frame: np.ndarray, prediction: Rect, timestamp: float = None) -> Rect:
         """
         Selects the contour from the frame that most likely appears to be a ball candidate.
 
         :param frame: Binarized video frame containing contours.
         :param prediction: Predicted contour of the ball in the frame.
+        :param timestamp: Video timestamp of the frame in milliseconds.
+        If omitted, the frame is assumed to follow the previous one by one 60fps frame.
         :returns: Contour in image corresponding to ball
         """
+        return self.select_from_candidates(self.extract_candidates(frame), prediction, timestamp)
 
-        # Clean the contours and store suitable candidates as ball candidates.
-        self.__update_ball_candidates(frame, prediction)
-
-        # Obtain the best ball candidate by searching for most continuous path
-        # through the previous and up-to-current ball candidates.
-        best_candidate = self.__find_shortest_path_candidate(prediction)
-
-        # best_candidate is None in case of no candidates at all -> prediction is
-        # selected as the most probable ball candidate.
-        if best_candidate is None:
-            best_candidate = prediction
-
-        return best_candidate
-
-    def __update_ball_candidates(self, frame: np.ndarray, prediction: Rect) -> None:
+    def extract_candidates(self, frame: np.ndarray) -> BoxArray:
         """
-        Process contours in the frame and update list of ball candidates from the contours.
-        :param prediction: Predicted Rect ball candidate
+        Process contours in the frame and screen them for ball candidates.
         :param frame: Binarized video frame containing contours.
+        :return: Ball candidates of the frame
         """
 
         # Reduce noise by joining together nearby contours
-        cleaned_contours = self.__join_contours(frame)
+        cleaned_contours = self.join_contours(frame)
 
         # region DEBUG: Show detector view
         # frame_copy = cv.cvtColor(frame, cv.COLOR_GRAY2RGB)
-        # for contour in cleaned_contours:
-        #     utilities.draw_rect(frame_copy, contour, (255, 255, 0))
+        # for x, y, width, height, _ in cleaned_contours:
+        #     utilities.draw_rect(frame_copy, Rect(x, y, width, height), (255, 255, 0))
         # cv.imshow("Tracker view", frame_copy)
         # endregion
 
+        return self.screen_contours(cleaned_contours)
+
+    def screen_contours(self, cleaned_contours: np.ndarray) -> BoxArray:
+        """
+        Screens joined contours for ball candidates by their area.
+        :param cleaned_contours: N x 5 array of the joined boxes as returned by join_contours()
+        :return: Ball candidates among the boxes
+        """
         # Sort the contours in ascending order based on contour area
         # (Ideally the largest contour is the player and the smallest contour is the ball)
-        cleaned_contours.sort(key=lambda rect: rect.area())
+        cleaned_contours = cleaned_contours[np.argsort(cleaned_contours[:, 4], kind='stable')]
+        box_areas = cleaned_contours[:, 4]
         # Filter tiny and excessively large contours
-        ball_candidates = list(
-            filter(lambda r: 0.3 * self.avg_area <= r.area() <= 3 * self.avg_area, cleaned_contours))
+        is_candidate = (self.__min_area_ratio * self.avg_area <= box_areas) & \
+            (box_areas <= self.__max_area_ratio * self.avg_area)
+        ball_candidates = cleaned_contours[is_candidate]
 
         # Throw away the biggest contour (most likely to be the player) only if such a big contour even exists
         # This prevents the undesirable action of discarding the real ball if it is the largest contour
-        if ball_candidates:
-            if cleaned_contours[-1].area() > self.avg_area * 1.5:
-                ball_candidates = cleaned_contours[:(len(cleaned_contours) - 1)]
+        if len(ball_candidates):
+            if box_areas[-1] > self.avg_area * 1.5:
+                ball_candidates = cleaned_contours[:-1]
+        self.__num_contours = len(cleaned_contours)
+        self.__num_candidates = len(ball_candidates)
+        return BoxArray(ball_candidates[:, :4])
+
+    def select_from_candidates(self, ball_candidates: BoxArray, prediction: Rect, timestamp: float = None) -> Rect:
+        """
+        Adds the ball candidates of a frame to the candidate history and selects the most probable one.
 
-        self.__candidate_history.append(ball_candidates)
+        :param ball_candidates: Ball candidates of the frame as returned by extract_candidates()
+        :param prediction: Predicted contour of the ball in the frame.
+        :param timestamp: Video timestamp of the frame in milliseconds.
+        If omitted, the frame is assumed to follow the previous one by one 60fps frame.
+        :returns: Candidate corresponding to the ball
+        """
+        self.__advance_time(timestamp)
+        if self.__gating:
+            ball_candidates = self.__gate_candidates(ball_candidates, prediction)
 
         # If all candidates were screened out, meaning there likely was no ball contour we automatically add the
         # prediction as a candidate at current time-step.
         # The above situation can arise due to occlusion (overlapping contours) or ball going out of frame.
-        if not ball_candidates:
-            self.__candidate_history[-1].extend([prediction])
+        if not len(ball_candidates):
+            ball_candidates = BoxArray.from_rects([prediction])
+        self.__update_ball_candidates(ball_candidates)
+
+        # Obtain the best ball candidate by searching for most continuous path
+        # through the previous and up-to-current ball candidates.
+        best_candidate = self.__find_shortest_path_candidate(prediction)
+
+        # best_candidate is None in case of no candidates at all -> prediction is
+        # selected as the most probable ball candidate.
+        if best_candidate is None:
+            best_candidate = prediction
+
+        self.__last_selection = best_candidate
+        return best_candidate
+
+    def get_candidate_counts(self) -> (int, int):
+        """
+        :return: Number of contours and number of ball candidates found in the latest frame.
+        """
+        return self.__num_contours, self.__num_candidates
+
+    def __update_ball_candidates(self, ball_candidates: BoxArray) -> None:
+        """
+        Adds the ball candidates of the current frame to the candidate history.
+        :param ball_candidates: Non-empty candidates
+        """
+        # Forget candidates that will have fallen out of the time window
+        while self.__history_timestamps and \
+                self.__history_timestamps[0] < self.__current_timestamp - self.__HISTORY_DURATION:
+            self.__history_timestamps.popleft()
+            self.__candidate_history.popleft()
+            self.__path_distances.popleft()
+
+        self.__append_layer(ball_candidates)
+        self.__history_timestamps.append(self.__current_timestamp)
+
+    def __advance_time(self, timestamp: float) -> None:
+        """
+        Moves the tracker to the timestamp of the frame being processed.
+        :param timestamp: Video timestamp in milliseconds or None to advance by one 60fps frame.
+        """
+        if self.__current_timestamp is None:
+            if timestamp is None:
+                timestamp = 0.0
+            # Place the dummy entries one frame apart right before the first frame
+            for i in range(len(self.__candidate_history), 0, -1):
+                self.__history_timestamps.append(timestamp - i * REFERENCE_FRAME_INTERVAL_MS)
+        elif timestamp is None:
+            timestamp = self.__current_timestamp + REFERENCE_FRAME_INTERVAL_MS
+        else:
+            self.__frame_interval = timestamp - self.__current_timestamp
+
+        self.__current_timestamp = timestamp
+
+    def __gate_candidates(self, ball_candidates: BoxArray, prediction: Rect) -> BoxArray:
+        """
+        Prunes the ball candidates the ball cannot have reached if there are more than MAX_CANDIDATES of them, so that
+        the cost of the path search does not grow with the number of moving objects in the background.
+
+        The reach of a candidate is its distance to the closest candidate of the previous frame or to the prediction,
+        plus its squareness as in the transitions of the path search. As the ball was among the candidates of the
+        previous frame even if it was not selected, a lost ball remains reachable.
+        Candidates whose reach exceeds a radius that grows with the time since the previous frame and with the
+        predicted movement of the ball are dropped. If this would drop all candidates, the ball has moved
+        unexpectedly, and all candidates are kept instead. Either way, only the MAX_CANDIDATES candidates of the
+        smallest reach are kept.
+
+        :param ball_candidates: Ball candidates of the frame
+        :param prediction: Predicted contour of the ball in the frame
+        :return: Remaining candidates in their original order
+        """
+        previous_positions = self.__previous_positions
+        self.__previous_positions = ball_candidates.get_positions()
+        if len(ball_candidates) <= self.__MAX_CANDIDATES:
+            return ball_candidates
+
+        reference_positions = np.vstack((previous_positions, (prediction.x, prediction.y)))
+        reach = self.__get_distances_to_closest(ball_candidates.get_positions(), reference_positions) + \
+            np.abs(ball_candidates.get_widths() - ball_candidates.get_heights())
+
+        radius = self.__GATE_RADIUS * self.__frame_interval / REFERENCE_FRAME_INTERVAL_MS
+        if self.__last_selection is not None:
+            radius += self.__GATE_VELOCITY_GAIN * np.hypot(prediction.x - self.__last_selection.x,
+                                                           prediction.y - self.__last_selection.y)
+        within = reach <= radius
+        if within.any():
+            ball_candidates, reach = ball_candidates.take(within), reach[within]
+
+        if len(ball_candidates) > self.__MAX_CANDIDATES:
+            closest = np.sort(np.argpartition(reach, self.__MAX_CANDIDATES - 1)[:self.__MAX_CANDIDATES])
+            ball_candidates = ball_candidates.take(closest)
+        return ball_candidates
+
+    def __get_distances_to_closest(self, positions: np.ndarray, reference_positions: np.ndarray) -> np.ndarray:
+        """
+        Looks up the distances in a uniform grid over the frame, whose cells hold the distance to the closest cell
+        containing a reference position. The cost is linear in the number of positions, and the distances are
+        accurate to about the size of a cell. Positions outside the frame are moved onto its border.
+
+        :param positions: (n, 2) array of (x, y) positions
+        :param reference_positions: Non-empty (m, 2) array of (x, y) positions
+        :return: Distance in pixels from each position to the closest reference position
+        """
+        grid = self.__grid
+        upper_bounds = (grid.shape[1] - 1, grid.shape[0] - 1)
+        grid.fill(255)
+        reference_cells = np.clip(reference_positions // self.__GRID_CELL_SIZE, 0, upper_bounds).astype(np.intp)
+        grid[reference_cells[:, 1], reference_cells[:, 0]] = 0
+        distance_map = cv.distanceTransform(grid, cv.DIST_L2, cv.DIST_MASK_5)
+
+        cells = np.clip(positions // self.__GRID_CELL_SIZE, 0, upper_bounds).astype(np.intp)
+        return distance_map[cells[:, 1], cells[:, 0]] * self.__GRID_CELL_SIZE
 
     def __find_shortest_path_candidate(self, prediction) -> Rect:
         """
@@ -100,64 +269,101 @@ class Tracker:
         A most probable ball candidate is selected based on the idea that
         the movement of a squash ball follows a continuous path.
 
+        Every candidate is reached from the candidate of the previous frame closest to it. As this choice does not
+        depend on the earlier frames, the path ending in a candidate is determined once the candidate is added to
+        the history, see __append_layer(). Only the length of the path within the history window is left to sum up.
+
         :return: Ball candidate at the end of the shortest trajectory through the candidates.
         """
-        self.__best_paths.clear()
-
-        # Iterate over the collection of each frame's ball candidates
-        # We start from 1 because we don't have anything to compare the first observation against
-        for i in range(1, len(self.__candidate_history)):
-            # for each candidate Rect in a candidate history "snapshot", assume that the most probable path goes
-            # through the candidate
-            for point_assumed_best in self.__candidate_history[i]:
-                best_dist = sys.maxsize
-                best_from_point = None  # Which point was the best to reach 'point_assumed_best'
-
-                squareness = np.linalg.norm(point_assumed_best.width - point_assumed_best.height)
-                # Calculate which was the most probable observation point we came from
-                # i.e. this loops over the previous observation layer and compares distances between them.
-                for from_point in self.__candidate_history[i - 1]:
-                    dist = np.linalg.norm((point_assumed_best.x - from_point.x, point_assumed_best.y - from_point.y)) + squareness
-                    # Remember the shortest distance and from which point it is achieved
-                    if dist < best_dist:
-                        best_dist = dist
-                        best_from_point = from_point
-
-                if best_from_point in self.__best_paths:
-                    # Extend the path
-                    self.__best_paths[point_assumed_best] = (self.__best_paths[best_from_point][0] + best_dist,
-                                                             best_from_point,
-                                                             self.__best_paths[best_from_point][2] + 1)
-                else:
-                    # Add a start entry for the path
-                    self.__best_paths[point_assumed_best] = [best_dist, best_from_point, 1]
-
         best_dist = sys.maxsize
         best_point = None
 
-        # Iterate over end-of-path rectangles
-        for endpoint_rect in self.__best_paths:
-            # Only end-Rects that are reached through traversing the full path are considered
-            # If this check was not in place, then shorter noisy paths would corrupt the search.
-            if self.__best_paths[endpoint_rect][2] == len(self.__candidate_history) - 1:
-                dist = self.__best_paths[endpoint_rect][0]
-
-                if best_dist > dist:
-                    # self.__candidate_history[-1].extend([prediction])
-                    best_dist = dist
-                    best_point = endpoint_rect
+        # Paths lead from the oldest candidates in the history to the current ones
+        distances = self.__path_distances[-1]
+        if distances.shape[1] > 0 and len(distances) <= self.__MAX_SCALAR_CANDIDATES:
+            # sum() adds up in path order as well
+            path_lengths = [sum(path_distances) for path_distances in distances.tolist()]
+            best_dist = min(path_lengths)
+            best_point = self.__candidate_history[-1][path_lengths.index(best_dist)]
+        elif distances.shape[1] > 0:
+            # Add up the transitions in path order, which np.sum() does not guarantee, so that equally long paths
+            # compare as equal
+            path_lengths = distances[:, 0].copy()
+            for transition_distances in distances.T[1:]:
+                path_lengths += transition_distances
+
+            # The first of equally long paths wins
+            best_index = int(path_lengths.argmin())
+            best_dist = path_lengths[best_index]
+            best_point = self.__candidate_history[-1][best_index]
 
         # Avoid sudden jumps in case the ball is lost for a frame or two
         if self.__prev_best_dist < best_dist - self.__dist_jump_cutoff:
             self.__prev_best_dist *= 1.2  # Inflate the distance as to not get stuck in a loop
-            self.__candidate_history[-1].extend([prediction])
+            self.__extend_layer(BoxArray.from_rects([prediction]))
             return prediction
 
         self.__prev_best_dist = best_dist
 
         return best_point
 
-    def __join_contours(self, frame: np.ndarray) -> list:
+    def __append_layer(self, ball_candidates: BoxArray) -> None:
+        """
+        Appends the candidates of a new frame to the candidate history.
+        :param ball_candidates: Candidates of the frame
+        """
+        self.__candidate_history.append(BoxArray())
+        self.__path_distances.append(None)
+        self.__extend_layer(ball_candidates)
+
+    def __extend_layer(self, ball_candidates: BoxArray) -> None:
+        """
+        Adds candidates to the latest frame of the candidate history and extends the shortest paths to them.
+        :param ball_candidates: Additional candidates of the latest frame
+        """
+        # Paths never span more transitions than the history holds
+        num_transitions = len(self.__candidate_history) - 1
+        if num_transitions == 0:
+            # There is nothing to come from
+            distances = np.empty((len(ball_candidates), 0))
+        elif len(ball_candidates) <= self.__MAX_SCALAR_CANDIDATES and \
+                len(self.__candidate_history[-2]) <= self.__MAX_SCALAR_CANDIDATES:
+            # The same as below candidate by candidate, in the same order of operations
+            previous_positions = self.__candidate_history[-2].get_positions().tolist()
+            best_from = []
+            best_distances = []
+            for x, y, width, height in ball_candidates.get_array().tolist():
+                squareness = abs(width - height)
+                transition_distances = [math.sqrt((x - from_x) * (x - from_x) + (y - from_y) * (y - from_y)) +
+                                        squareness for from_x, from_y in previous_positions]
+                best_distances.append(min(transition_distances))
+                best_from.append(transition_distances.index(best_distances[-1]))
+            previous_distances = self.__path_distances[-2]
+            distances = np.empty((len(ball_candidates), num_transitions))
+            distances[:, :-1] = previous_distances[best_from, previous_distances.shape[1] - (num_transitions - 1):]
+            distances[:, -1] = best_distances
+        else:
+            squareness = np.abs(ball_candidates.get_widths() - ball_candidates.get_heights())
+            # Distances from every candidate of the previous frame (columns) to every new candidate (rows)
+            offsets = ball_candidates.get_positions()[:, np.newaxis, :] - \
+                self.__candidate_history[-2].get_positions()[np.newaxis, :, :]
+            transition_distances = np.sqrt(offsets[..., 0] ** 2 + offsets[..., 1] ** 2) + squareness[:, np.newaxis]
+
+            # Each candidate is reached from the closest candidate of the previous frame, the first one on ties
+            best_from = transition_distances.argmin(axis=1)
+            # Extend the paths
+            previous_distances = self.__path_distances[-2]
+            distances = np.empty((len(ball_candidates), num_transitions))
+            distances[:, :-1] = previous_distances[best_from, previous_distances.shape[1] - (num_transitions - 1):]
+            distances[:, -1] = transition_distances.min(axis=1)
+
+        if len(self.__candidate_history[-1]):
+            ball_candidates = BoxArray.concatenate((self.__candidate_history[-1], ball_candidates))
+            distances = np.concatenate((self.__path_distances[-1], distances))
+        self.__candidate_history[-1] = ball_candidates
+        self.__path_distances[-1] = distances
+
+    def join_contours(self, frame: np.ndarray) -> np.ndarray:
         """"
         :param frame: A preprocessed frame
 
@@ -172,80 +378,97 @@ class Tracker:
 
         The result should ideally be one large and one small bounding box, that is, the player- and ball candidate
         respectively.
+
+        :return: N x 5 array of the joined boxes, one [x, y, width, height, area] row per box.
         """
 
-        # Obtain all contours from the image
-        contours, _ = cv.findContours(cv.Canny(frame, 0, 1), cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        # Obtain the outer contours of all foreground regions. The frame is binary, so they can be traced directly.
+        contours, _ = cv.findContours(frame, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        bounding_boxes = self.__get_bounding_boxes(contours)
 
-        bounding_boxes = []
-        for contour in contours:
-            bounding_boxes.append(cv.boundingRect(contour))
+        # Sort the bounding boxes according to their x-coordinate in increasing order, bottom to top for equal ones
+        bounding_boxes = bounding_boxes[np.lexsort((-bounding_boxes[:, 1], bounding_boxes[:, 0]))]
 
-        # Sort the bounding boxes according to their x-coordinate in increasing order
-        bounding_boxes.sort(key=itemgetter(0))
+        return self.__join_nearby_bounding_boxes(bounding_boxes)
 
-        bounding_boxes = self.__join_nearby_bounding_boxes(bounding_boxes)
+    @staticmethod
+    def __get_bounding_boxes(contours: tuple) -> np.ndarray:
+        """
+        :param contours: Contours as returned by cv.findContours()
+        :return: N x 5 array of [x, y, width, height, area] bounding boxes of the contours, area being width * height.
+        """
+        if not contours:
+            return np.empty((0, 5), dtype=np.int64)
 
-        return [Rect(*rect) for rect in bounding_boxes]
+        # Reduce the points of all contours at once instead of calling cv.boundingRect() on every contour
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.cumsum([0] + [len(contour) for contour in contours[:-1]])
+        top_left = np.minimum.reduceat(points, starts)
+        bottom_right = np.maximum.reduceat(points, starts) + 1
 
-    def __join_nearby_bounding_boxes(self, bounding_boxes: List[list]) -> list:
+        # The boxes used to be taken from the Canny edges of the regions, which run one pixel outside of the top and
+        # left border of a region. Grow the boxes accordingly, as the candidate size limits have been tuned to these.
+        # The boxes of closed masks are unchanged by this, see tests/test_tracker.py, except for regions touching the
+        # image border: Canny found no edge along the border and could split such a region into several boxes, the
+        # contour of the mask always encloses the whole region.
+        top_left = np.maximum(top_left - 1, 0)
+
+        sizes = bottom_right - top_left
+        return np.column_stack((top_left, sizes, sizes[:, 0] * sizes[:, 1])).astype(np.int64)
+
+    @staticmethod
+    def __join_nearby_bounding_boxes(bounding_boxes: np.ndarray) -> np.ndarray:
         """
-        :param bounding_boxes: Sorted list of bounding_boxes(rectangles)
-        :return: List of rectangles [[x, y, width, height], ...]
+        :param bounding_boxes: N x 5 array of [x, y, width, height, area] rows sorted by x
+        :return: Array of the joined boxes in the same layout, in the order of their leftmost box
 
         Many thanks to user HansHirse on StackOverflow.
         #https://stackoverflow.com/questions/55376338/how-to-join-nearby-bounding-boxes-in-opencv-python/55385454#55385454
         Algorithm has been adapted for squash-specific use.
+
+        Boxes are joined greedily in the order of x: the leftmost box not joined yet starts a group, and every
+        following box at most join_distance_x to the right of the group's right border and at most join_distance_y
+        apart vertically is added to it. The right border of the group is set to that of the added box, and a box may
+        be added to several groups. Joining is not transitive, nearby boxes can end up in different groups.
+
+        Instead of scanning the following boxes once per group, the boxes are swept from left to right and every box
+        is checked against all open groups, which gives the same groups. A group is closed once the sweep is more
+        than join_distance_x past its right border. A box starts a group only if it is more than join_distance_y
+        apart vertically from all open groups, so the top rows of the first boxes of any two open groups are at least
+        join_distance_y + 2 apart. The number of open groups is thus limited by the frame height, to 54 at
+        FRAME_HEIGHT = 640, which bounds the cost per box even if the player is broken into many fragments.
         """
 
         join_distance_x = 5
         join_distance_y = 2 * join_distance_x
-        processed = [False] * len(bounding_boxes)
-        new_bounds = []
-
-        for i, rect1 in enumerate(bounding_boxes):
-            if not processed[i]:
-
-                processed[i] = True
-                current_x_min, current_y_min, current_x_max, current_y_max = self.__get_rectangle_contours(rect1)
-
-                for j, rect2 in enumerate(bounding_boxes[(i + 1):], start=(i + 1)):
-
-                    cand_x_min, cand_y_min, cand_x_max, cand_y_max = self.__get_rectangle_contours(rect2)
-
-                    if current_x_max + join_distance_x >= cand_x_min:
+        if len(bounding_boxes) < 2:
+            return bounding_boxes
+
+        # Groups as [x_min, y_min, x_max, y_max] in the order they were started.
+        # Plain lists are much faster to loop over than array rows.
+        groups = []
+        open_groups = []
+        for x_min, y_min, width, height, _ in bounding_boxes.tolist():
+            x_max, y_max = x_min + width, y_min + height
+            joined = False
+            still_open = []
+            for group in open_groups:
+                if group[2] + join_distance_x < x_min:
+                    # No further box can be nearby the group
+                    continue
+                if group[1] - join_distance_y <= y_max and y_min <= group[3] + join_distance_y:
+                    group[1], group[2], group[3] = min(group[1], y_min), x_max, max(group[3], y_max)
+                    joined = True
+                still_open.append(group)
+            if not joined:
+                group = [x_min, y_min, x_max, y_max]
+                groups.append(group)
+                still_open.append(group)
+            open_groups = still_open
 
-                        if current_y_min < cand_y_min:
-                            if not current_y_max + join_distance_y >= cand_y_min:
-                                continue
-                        else:
-                            if not current_y_min - join_distance_y <= cand_y_max:
-                                continue
-
-                        processed[j] = True
-
-                        # Reset coordinates of current rect
-                        current_x_max = cand_x_max
-                        current_y_min = min(current_y_min, cand_y_min)
-                        current_y_max = max(current_y_max, cand_y_max)
-                    else:
-                        break
-                new_bounds.append([current_x_min, current_y_min,
-                                   current_x_max - current_x_min, current_y_max - current_y_min])
-
-        return new_bounds
-
-    @staticmethod
-    def __get_rectangle_contours(rectangle: list) -> list:
-        """
-        Takes a rectangle and returns the coordinates of the top-left and
-        bottom-right corner.
-
-        :param rectangle: 4-tuple (top-left x, top-left y, width, height)
-        :return: [x_top_left, y_top_left, x_bottom_right, y_bottom_right]
-        """
-        x_min, y_min, width, height = rectangle
-        x_max = x_min + width
-        y_max = y_min + height
+        new_bounds = []
+        for x_min, y_min, x_max, y_max in groups:
+            width, height = x_max - x_min, y_max - y_min
+            new_bounds.append([x_min, y_min, width, height, width * height])
 
-        return [x_min, y_min, x_max, y_max]
+        return np.array(new_bounds, dtype=np.int64)
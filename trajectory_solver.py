@@ -0,0 +1,196 @@
+import numpy as np
+
+from utils.rect import BoxArray
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS
+
+
+class TrajectorySolver:
+    """
+    Finds the ball trajectory through the ball candidates of a whole video at once, for offline analysis.
+
+    Unlike the Tracker, which has to select a candidate as soon as a frame arrives, the solver sees the candidates of
+    all frames, so later frames can decide which candidate was the ball. It finds the cheapest assignment of a
+    candidate, or no candidate, to every frame:
+    - Moving from a candidate to a candidate of a later frame costs their distance plus the squareness of the latter,
+    as in the path search of the Tracker. Up to MAX_GAP_DURATION may lie between the two, e.g. while the ball is
+    hidden behind a player, and the ball is interpolated in the frames in between.
+    - Every frame without a candidate of the trajectory costs MISS_COST, so candidates are only skipped if reaching
+    them would be a detour.
+    - A trajectory may end and start over at any candidate for RESTART_COST, e.g. after the ball left the frame.
+    The assignment is found by dynamic programming over the frames. Only the NUM_SOURCES cheapest candidates of a
+    frame are continued in later frames, which bounds the cost per frame however many candidates there are.
+    """
+
+    def __init__(self):
+        # Cost of a frame in which the ball is not at one of the candidates
+        self.__MISS_COST = 25
+        # Cost of starting a new trajectory, like the distance cutoff for jumps of the Tracker
+        self.__RESTART_COST = 100
+        # Longest time in ms the ball may be missing between two candidates of a trajectory
+        self.__MAX_GAP_DURATION = (6 + 0.5) * REFERENCE_FRAME_INTERVAL_MS
+        # Only this many of the cheapest candidates of a frame are continued in later frames
+        self.__NUM_SOURCES = 8
+
+        self.__candidates = []  # BoxArray per frame
+        self.__timestamps = []
+
+    def add_frame(self, ball_candidates: BoxArray, timestamp: float) -> None:
+        """
+        Records the ball candidates of the next frame.
+        :param ball_candidates: Ball candidates of the frame, may be empty
+        :param timestamp: Video timestamp of the frame in milliseconds
+        """
+        self.__candidates.append(ball_candidates)
+        self.__timestamps.append(timestamp)
+
+    def solve(self) -> (np.ndarray, np.ndarray):
+        """
+        Finds the ball in every recorded frame.
+        :return: Timestamps of the frames in ms, (n, 4) float array of the ball per frame in (x, y, width, height)
+        form. Rows of frames outside of any trajectory are NaN.
+        """
+        timestamps = np.array(self.__timestamps, dtype=np.float64)
+        boxes = BoxArray.concatenate(self.__candidates).get_array().astype(np.float64) if self.__candidates \
+            else np.empty((0, 4))
+        # Candidates of frame i are boxes[offsets[i]:offsets[i + 1]]
+        offsets = np.zeros(len(timestamps) + 1, np.intp)
+        np.cumsum([len(candidates) for candidates in self.__candidates], out=offsets[1:])
+
+        adjusted_costs, path_from, null_costs, null_from = self.__find_shortest_paths(boxes, offsets, timestamps)
+        chosen = self.__backtrack(adjusted_costs, path_from, null_costs, null_from, offsets)
+        return timestamps, self.__build_trajectory(boxes, chosen, path_from, timestamps)
+
+    def __find_shortest_paths(self, boxes: np.ndarray, offsets: np.ndarray,
+                              timestamps: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        :param boxes: (n, 4) array of the candidates of all frames
+        :param offsets: Candidates of frame i are boxes[offsets[i]:offsets[i + 1]]
+        :param timestamps: Timestamps of the frames
+        :return: Per candidate, the cost of the cheapest assignment of the frames up to its own that ends in the
+        candidate, minus MISS_COST times the index of its frame, and the candidate this assignment comes from, -1
+        for a restart. Per frame, the cost of the cheapest assignment of the frames up to it without a candidate in
+        it, and the candidate of the previous frame this assignment comes from, -1 for none.
+        """
+        num_frames = len(timestamps)
+        num_sources = self.__NUM_SOURCES
+        xs, ys = boxes[:, 0], boxes[:, 1]
+        squareness = np.abs(boxes[:, 2] - boxes[:, 3])
+        # Cost of the cheapest assignment of frames 0 to i that ends in candidate i, minus MISS_COST times the frame
+        # index of the candidate, so that the cost of the frames skipped up to a later frame is added at once
+        adjusted_costs = np.empty(len(boxes))
+        path_from = np.empty(len(boxes), np.intp)
+        # Cost of the cheapest assignment of frames 0 to i without a candidate in frame i
+        null_costs = np.empty(num_frames)
+        null_from = np.full(num_frames, -1, np.intp)
+        # Row i + 1 holds the NUM_SOURCES cheapest candidates of frame i, padded with infinite costs.
+        # Row 0 stands for the time before the first frame.
+        source_xs = np.zeros((num_frames + 1, num_sources))
+        source_ys = np.zeros((num_frames + 1, num_sources))
+        source_costs = np.full((num_frames + 1, num_sources), np.inf)
+        source_indices = np.zeros((num_frames + 1, num_sources), np.intp)
+        # First row within MAX_GAP_DURATION of every frame, but at least the row of the previous frame
+        window_starts = (np.minimum(np.searchsorted(timestamps, timestamps - self.__MAX_GAP_DURATION - 1e-6),
+                                    np.arange(num_frames) - 1) + 1).tolist()
+        offsets = offsets.tolist()
+
+        null_cost = 0.0  # Before the first frame
+        # Adjusted cost and index of the cheapest candidate of the previous frame
+        previous_best = None
+        for i in range(num_frames):
+            start, end = offsets[i], offsets[i + 1]
+            num_candidates = end - start
+            if num_candidates:
+                window = slice(window_starts[i], i + 1)
+                transitions = np.hypot(xs[start:end, np.newaxis] - source_xs[window].ravel(),
+                                       ys[start:end, np.newaxis] - source_ys[window].ravel())
+                transitions += source_costs[window].ravel()
+                best_from = transitions.argmin(axis=1)
+                costs = transitions.min(axis=1)
+                sources = source_indices[window].ravel()[best_from]
+                restart_cost = null_cost + self.__RESTART_COST - (i - 1) * self.__MISS_COST
+                restarted = costs >= restart_cost
+                costs[restarted] = restart_cost
+                sources[restarted] = -1
+                costs += squareness[start:end] - self.__MISS_COST
+                adjusted_costs[start:end] = costs
+                path_from[start:end] = sources
+
+                if num_candidates > num_sources:
+                    cheapest = np.argpartition(costs, num_sources - 1)[:num_sources]
+                    source_xs[i + 1] = xs[start:end][cheapest]
+                    source_ys[i + 1] = ys[start:end][cheapest]
+                    source_costs[i + 1] = costs[cheapest]
+                    source_indices[i + 1] = cheapest + start
+                else:
+                    source_xs[i + 1, :num_candidates] = xs[start:end]
+                    source_ys[i + 1, :num_candidates] = ys[start:end]
+                    source_costs[i + 1, :num_candidates] = costs
+                    source_indices[i + 1, :num_candidates] = np.arange(start, end)
+
+            # Without a candidate in frame i, coming from a frame without a candidate or from the previous frame
+            if previous_best is not None and previous_best[0] + (i - 1) * self.__MISS_COST < null_cost:
+                null_cost = previous_best[0] + (i - 1) * self.__MISS_COST
+                null_from[i] = previous_best[1]
+            null_cost += self.__MISS_COST
+            null_costs[i] = null_cost
+            if num_candidates:
+                best = int(costs.argmin())
+                previous_best = costs[best], best + start
+            else:
+                previous_best = None
+
+        return adjusted_costs, path_from, null_costs, null_from
+
+    def __backtrack(self, adjusted_costs: np.ndarray, path_from: np.ndarray, null_costs: np.ndarray,
+                    null_from: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        Follows the cheapest assignment of all frames back from the last frame.
+        See __find_shortest_paths() for the parameters.
+        :return: Index of the candidate chosen in every frame, -1 for frames without one.
+        """
+        num_frames = len(offsets) - 1
+        chosen = np.full(num_frames, -1, np.intp)
+        if num_frames == 0:
+            return chosen
+
+        # The cheapest assignment ends either in a candidate of the last frame or without one
+        i, candidate = num_frames - 1, -1
+        last_start, last_end = offsets[-2], offsets[-1]
+        if last_end > last_start:
+            best_last = adjusted_costs[last_start:last_end].argmin() + last_start
+            if adjusted_costs[best_last] + i * self.__MISS_COST < null_costs[i]:
+                candidate = best_last
+
+        frame_of = np.repeat(np.arange(num_frames), np.diff(offsets))
+        while i >= 0:
+            if candidate >= 0:
+                chosen[i] = candidate
+                previous = path_from[candidate]
+                if previous >= 0:
+                    i, candidate = frame_of[previous], previous
+                else:
+                    i, candidate = i - 1, -1
+            else:
+                candidate = null_from[i]
+                i -= 1
+        return chosen
+
+    @staticmethod
+    def __build_trajectory(boxes: np.ndarray, chosen: np.ndarray, path_from: np.ndarray,
+                           timestamps: np.ndarray) -> np.ndarray:
+        """
+        :return: Chosen candidate per frame, interpolated in the frames skipped between two candidates of a
+        trajectory, NaN elsewhere.
+        """
+        trajectory = np.full((len(chosen), 4), np.nan)
+        frames = np.flatnonzero(chosen >= 0)
+        trajectory[frames] = boxes[chosen[frames]]
+
+        # Consecutive chosen frames that are linked, but not adjacent, enclose a gap
+        linked = path_from[chosen[frames[1:]]] == chosen[frames[:-1]]
+        for first, last in zip(frames[:-1][linked], frames[1:][linked]):
+            if last - first > 1:
+                fractions = (timestamps[first + 1:last] - timestamps[first]) / (timestamps[last] - timestamps[first])
+                trajectory[first + 1:last] = trajectory[first] + \
+                    fractions[:, np.newaxis] * (trajectory[last] - trajectory[first])
+        return trajectory
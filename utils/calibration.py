@@ -0,0 +1,142 @@
+import hashlib
+import json
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.court import Court
+from utils.utilities import REFERENCE_FRAME_INTERVAL_MS
+
+# Directory holding the named calibration profiles
+PROFILE_DIR = Path.home() / ".squash_drive_analyst" / "profiles"
+
+
+@dataclass
+class AnalysisSettings:
+    """
+    Tunable constants of the tracking and bounce detection stages. The defaults are the hand-picked values, see
+    sweep.py for tuning them to a court.
+    """
+    avg_area: float = 24 * 25  # Expected area of the ball in pixels, see Tracker
+    min_area_ratio: float = 0.3  # Joined contours smaller than min_area_ratio * avg_area are no ball candidates
+    max_area_ratio: float = 3  # Joined contours larger than max_area_ratio * avg_area are no ball candidates
+    dist_jump_cutoff: float = 100  # See Tracker
+    bounce_cooldown: float = (80 + 0.5) * REFERENCE_FRAME_INTERVAL_MS  # Milliseconds, see BounceDetector
+    data_smoothing_factor: float = 0.9  # See DoubleExponentialEstimator
+    trend_smoothing_factor: float = 0.25  # See DoubleExponentialEstimator
+
+
+@dataclass
+class Calibration:
+    """
+    Court markers of a video as placed in the set-up view, which are needed to run the analysis.
+    """
+    service_box_markers: List[Tuple[int, int]]  # 4 service box corners
+    court_lower_boundary_markers: List[Tuple[int, int]]  # 2 points on the rear boundary of the court
+    direction: int  # Service box direction, right(1) or left(-1)
+    resolution: Tuple[int, int] = None  # (width, height) of the video the markers were placed on
+    homography: List[List[float]] = None  # Cached 3x3 homography matrix computed from the markers and direction
+    settings: AnalysisSettings = None  # Analysis settings tuned for the court, the defaults if None
+
+    def get_homography_coords(self) -> list:
+        """
+        :return: Source and destination coordinates for the court homography as expected by the Pipeline.
+        """
+        service_box_coords_src = np.array(self.service_box_markers)
+        court_lower_coords_src = np.array(self.court_lower_boundary_markers)
+        service_box_coords_dst = Court.get_homography_dst_coords(self.direction)
+        return [(service_box_coords_src, court_lower_coords_src), service_box_coords_dst]
+
+    def get_homography_matrix(self) -> np.ndarray:
+        """
+        :return: The cached homography matrix, or None if it has not been computed.
+        """
+        return None if self.homography is None else np.array(self.homography)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the calibration to a JSON file. A cached homography is stored together with a hash of the markers
+        and the direction it was computed from.
+        :param path: File path
+        """
+        data = asdict(self)
+        if self.homography is not None:
+            data['homography_markers'] = self.__get_marker_hash()
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
+
+    @staticmethod
+    def load(path: str) -> 'Calibration':
+        """
+        Reads a calibration from a JSON file.
+        :param path: File path
+        :return: The calibration. A cached homography is dropped if the markers or the direction have been edited
+        since it was computed, so that it is computed anew.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        calibration = Calibration(service_box_markers=[tuple(marker) for marker in data['service_box_markers']],
+                                  court_lower_boundary_markers=[tuple(marker)
+                                                               for marker in data['court_lower_boundary_markers']],
+                                  direction=int(data['direction']),
+                                  resolution=tuple(data['resolution']) if data.get('resolution') else None,
+                                  homography=data.get('homography'),
+                                  settings=AnalysisSettings(**data['settings']) if data.get('settings') else None)
+        if data.get('homography_markers') != calibration.__get_marker_hash():
+            calibration.homography = None
+        return calibration
+
+    def __get_marker_hash(self) -> str:
+        """
+        :return: Hash of the markers and the direction, which determine the homography.
+        """
+        markers = [[[float(coordinate) for coordinate in marker] for marker in self.service_box_markers],
+                   [[float(coordinate) for coordinate in marker] for marker in self.court_lower_boundary_markers],
+                   int(self.direction)]
+        return hashlib.sha256(json.dumps(markers).encode()).hexdigest()
+
+
+def save_profile(name: str, calibration: Calibration, profile_dir: Path = PROFILE_DIR) -> None:
+    """
+    Stores a calibration as a named profile. Profiles are kept per video resolution, so the calibration must
+    specify the resolution it was made for.
+    :param name: Profile name
+    :param calibration: Calibration to store
+    :param profile_dir: Directory holding the profiles
+    """
+    if calibration.resolution is None:
+        raise ValueError("A calibration profile requires the video resolution")
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    calibration.save(str(_profile_path(name, calibration.resolution, profile_dir)))
+
+
+def load_profile(name: str, resolution: Tuple[int, int], profile_dir: Path = PROFILE_DIR) -> Calibration:
+    """
+    :param name: Profile name
+    :param resolution: (width, height) of the video the profile is going to be used for
+    :param profile_dir: Directory holding the profiles
+    :return: The calibration stored under the name for the given resolution
+    :raises FileNotFoundError: If no such profile exists for the resolution
+    """
+    return Calibration.load(str(_profile_path(name, resolution, profile_dir)))
+
+
+def list_profiles(resolution: Tuple[int, int], profile_dir: Path = PROFILE_DIR) -> List[str]:
+    """
+    :param resolution: (width, height) of a video
+    :param profile_dir: Directory holding the profiles
+    :return: Alphabetically sorted names of the profiles usable for videos of the resolution
+    """
+    suffix = f"_{resolution[0]}x{resolution[1]}.json"
+    return sorted(path.name[:-len(suffix)] for path in profile_dir.glob(f"*{suffix}"))
+
+
+def _profile_path(name: str, resolution: Tuple[int, int], profile_dir: Path) -> Path:
+    """
+    :return: Path of the profile file, which is keyed by both the name and the video resolution.
+    """
+    if not name or Path(name).name != name:
+        raise ValueError(f"Invalid profile name: {name!r}")
+    return profile_dir / f"{name}_{resolution[0]}x{resolution[1]}.json"
@@ -0,0 +1,158 @@
+from typing import List
+
+import cv2 as cv
+import numpy as np
+
+from utils.rect import Rect
+
+
+class CandidateLog:
+    """
+    Records what the tracking stages of the Pipeline see and decide in every frame, so that they can be re-run
+    without decoding the video and running the Detector again, see replay.py.
+
+    Per frame, the log holds the timestamp, the joined contours the ball candidates are screened from, the
+    prediction, the selected ball and its projection onto the court. Logs are saved as compressed .npz files.
+    Contours are kept before the screening, so that the screening can be re-tuned as well.
+    """
+
+    def __init__(self, direction: int = None):
+        """
+        :param direction: Service box direction of the analysis as used in Court.create_target_rects(), if known
+        """
+        self.__direction = direction
+        # Homography of the analysis, which projects the balls onto the court
+        self.__homography_matrix = np.eye(3)
+        # Timestamp (ms) of the frame before the first recorded one
+        self.__initial_timestamp = None
+        self.__timestamps = []
+        self.__contours = []  # N x 5 array of joined contours per frame
+        self.__predictions = []
+        self.__balls = []
+        self.__projections = None
+
+    def start(self, initial_timestamp: float, homography_matrix: np.ndarray) -> None:
+        """
+        Called by the Pipeline before the first frame is recorded.
+        :param initial_timestamp: Timestamp in ms of the frame before the first recorded one, which the time step of
+        the first prediction is measured from
+        :param homography_matrix: 3x3 homography matrix the bounces are detected with
+        """
+        self.__initial_timestamp = initial_timestamp
+        self.__homography_matrix = np.asarray(homography_matrix, dtype=np.float64)
+        self.__projections = None
+
+    def record(self, timestamp: float, contours: np.ndarray, prediction: Rect = None, ball: Rect = None) -> None:
+        """
+        Records the next frame.
+        :param timestamp: Video timestamp of the frame in ms
+        :param contours: N x 5 array of the joined contours of the frame, see Tracker.join_contours()
+        :param prediction: Predicted ball, None if there is none
+        :param ball: Selected ball, None if not known yet, see set_balls()
+        """
+        self.__timestamps.append(timestamp)
+        self.__contours.append(contours)
+        self.__predictions.append((np.nan,) * 4 if prediction is None else
+                                  (prediction.x, prediction.y, prediction.width, prediction.height))
+        self.__balls.append((np.nan,) * 4 if ball is None else (ball.x, ball.y, ball.width, ball.height))
+        self.__projections = None
+
+    def set_balls(self, balls: np.ndarray) -> None:
+        """
+        Replaces the balls of all recorded frames, e.g. once they have been found offline.
+        :param balls: (n, 4) array of the balls in (x, y, width, height) form, NaN where there is none
+        """
+        self.__balls = [tuple(ball) for ball in np.asarray(balls, dtype=np.float64).tolist()]
+        self.__projections = None
+
+    def get_homography_matrix(self) -> np.ndarray:
+        """
+        :return: 3x3 homography matrix of the analysis.
+        """
+        return self.__homography_matrix
+
+    def get_direction(self) -> int:
+        """
+        :return: Service box direction of the analysis, None if unknown.
+        """
+        return self.__direction
+
+    def get_initial_timestamp(self) -> float:
+        """
+        :return: Timestamp in ms of the frame before the first recorded one.
+        """
+        return self.__initial_timestamp
+
+    def get_timestamps(self) -> np.ndarray:
+        """
+        :return: Timestamps of the recorded frames in ms.
+        """
+        return np.array(self.__timestamps, dtype=np.float64)
+
+    def get_contours(self) -> List[np.ndarray]:
+        """
+        :return: N x 5 array of the joined contours of every recorded frame.
+        """
+        return self.__contours
+
+    def get_predictions(self) -> np.ndarray:
+        """
+        :return: (n, 4) array of the predictions, NaN where there was none.
+        """
+        return np.array(self.__predictions, dtype=np.float64).reshape(-1, 4)
+
+    def get_balls(self) -> np.ndarray:
+        """
+        :return: (n, 4) array of the selected balls, NaN where there was none.
+        """
+        return np.array(self.__balls, dtype=np.float64).reshape(-1, 4)
+
+    def get_projections(self) -> np.ndarray:
+        """
+        :return: (n, 2) array of the centres of the balls projected onto the court, NaN where there was no ball.
+        """
+        if self.__projections is None:
+            balls = self.get_balls()
+            centers = balls[:, :2] + balls[:, 2:] / 2
+            # perspectiveTransform() returns None instead of an empty array
+            self.__projections = cv.perspectiveTransform(centers.reshape(-1, 1, 2), self.__homography_matrix)\
+                .reshape(-1, 2) if len(centers) else np.empty((0, 2))
+        return self.__projections
+
+    def save(self, path: str) -> None:
+        """
+        Writes the log to a compressed .npz file.
+        :param path: File path
+        """
+        contour_counts = [len(contours) for contours in self.__contours]
+        contours = np.concatenate(self.__contours) if self.__contours else np.empty((0, 5))
+        np.savez_compressed(path,
+                            homography_matrix=self.__homography_matrix,
+                            direction=np.nan if self.__direction is None else self.__direction,
+                            initial_timestamp=np.nan if self.__initial_timestamp is None else self.__initial_timestamp,
+                            timestamps=self.get_timestamps(),
+                            contour_counts=np.array(contour_counts, dtype=np.int32),
+                            contours=contours.astype(np.int32),
+                            predictions=self.get_predictions(),
+                            balls=self.get_balls(),
+                            projections=self.get_projections())
+
+    @staticmethod
+    def load(path: str) -> 'CandidateLog':
+        """
+        Reads a log written by save().
+        :param path: File path
+        :return: The log
+        """
+        with np.load(path) as data:
+            direction = float(data['direction'])
+            log = CandidateLog(None if np.isnan(direction) else int(direction))
+            initial_timestamp = float(data['initial_timestamp'])
+            log.start(None if np.isnan(initial_timestamp) else initial_timestamp, data['homography_matrix'])
+            log.__timestamps = data['timestamps'].tolist()
+            boundaries = np.cumsum(data['contour_counts'])[:-1]
+            log.__contours = np.split(data['contours'].astype(np.int64), boundaries) if len(log.__timestamps) else []
+            log.__predictions = [tuple(prediction) for prediction in data['predictions'].tolist()]
+            log.__balls = [tuple(ball) for ball in data['balls'].tolist()]
+            log.__projections = data['projections']
+        return log
@@ -1,4 +1,6 @@
-from typing import List
+import threading
+from functools import lru_cache
+from typing import List, Tuple
 
 import cv2 as cv
 import numpy as np
@@ -102,44 +104,24 @@ class Court:
             utilities.draw_rect(court_img, rect, color=(0, 0, 0), line_width=1)
 
     @staticmethod
-    def draw_ball_projection(court: np.ndarray, x: int, y: int) -> None:
+    def get_court_base(target_rects: List[Rect]) -> np.ndarray:
         """
-        Draws a circle on court at location (x,y)
-        :param court: Image to be drawn on
-        :param x: Center-coordinate x
-        :param y: Center-coordinate y
+        Court drawing with the grid of the target rects, which is drawn once per target layout and then shared.
+        :param target_rects: List of rects to be drawn
+        :return: Read-only image, which has to be copied to be drawn on
         """
+        return Court.__draw_court_base(tuple(target_rects))
 
-        chunk_size = 11
-        circle_radius = 6
-
-        # Make sure x, y are within bounds
-        if x >= utilities.FRAME_WIDTH:
-            x = utilities.FRAME_WIDTH - chunk_size
-        elif x <= chunk_size:
-            x = chunk_size
-
-        if y >= utilities.FRAME_HEIGHT:
-            y = utilities.FRAME_HEIGHT - chunk_size
-        elif y <= chunk_size:
-            y = chunk_size
-
-        # Select a chunk of the court
-        y_chunk_lower = y - chunk_size // 2
-        y_chunk_upper = y + chunk_size // 2 + 1
-        x_chunk_lower = x - chunk_size // 2
-        x_chunk_upper = x + chunk_size // 2 + 1
-
-        court_chunk = court[y_chunk_lower: y_chunk_upper, x_chunk_lower: x_chunk_upper]
-        court_chunk_copy = np.copy(court_chunk)
-
-        # Draw the ball as a circle on the copied chunk
-        cv.circle(court_chunk_copy, center=(chunk_size // 2, chunk_size // 2),
-                  radius=circle_radius, color=(255, 0, 0), thickness=-1)
-        # # Introduce transparency
-        chunk_with_circle = cv.addWeighted(court_chunk, 0.7, court_chunk_copy, 0.3, 1.0)
-        # Store the chunk back into the original court image
-        court[y_chunk_lower: y_chunk_upper, x_chunk_lower: x_chunk_upper] = chunk_with_circle
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def __draw_court_base(target_rects: Tuple[Rect, ...]) -> np.ndarray:
+        """
+        :return: Read-only court drawing with the target grid, see get_court_base()
+        """
+        court_img = Court.get_court_drawing()
+        Court.draw_targets_grid(court_img, target_rects)
+        court_img.flags.writeable = False
+        return court_img
 
     @staticmethod
     def create_target_rects(direction: int) -> List[Rect]:
@@ -186,3 +168,143 @@ class Court:
                 Court.service_box_back_inner_L,
                 Court.service_box_front_inner_L
             ])
+
+
+class CourtOverlay:
+    """
+    Court image of an analysis: the ball bounces drawn over the court base, see Court.get_court_base().
+
+    Adding a bounce only counts the bounces covering each pixel. The bounces are blended into the base once the image
+    is requested with render(): only the pixels of the bounces added since the previous render() if there are few, as
+    while the analysis is shown, or the whole image at once if there are many, e.g. once a batch analysis is done.
+    A bounce is a disc of BALL_COLOR at BALL_OPACITY, so a pixel covered by k bounces shows the colour at
+    1 - (1 - BALL_OPACITY)^k, the same as blending the discs one after the other.
+    Bounces may be added in one thread while the image is rendered in another.
+    """
+
+    BALL_COLOR = (255, 0, 0)
+    BALL_OPACITY = 0.3
+
+    def __init__(self, target_rects: List[Rect]):
+        """
+        :param target_rects: Target rects of the analysis, drawn as a grid on the court
+        """
+        self.__base = Court.get_court_base(target_rects)
+        # Number of bounces covering each pixel
+        self.__coverage = np.zeros(self.__base.shape[:2], np.uint32)
+        # The disc of a bounce is drawn within a chunk of CHUNK_SIZE x CHUNK_SIZE pixels around it
+        self.__CHUNK_SIZE = 11
+        disc = np.zeros((self.__CHUNK_SIZE, self.__CHUNK_SIZE), np.uint8)
+        cv.circle(disc, center=(self.__CHUNK_SIZE // 2, self.__CHUNK_SIZE // 2), radius=6, color=1, thickness=-1)
+        self.__disc = disc.astype(np.uint32)
+        # Offsets of the pixels of the disc within the chunk
+        self.__disc_ys, self.__disc_xs = np.nonzero(disc)
+        # Opacity of the ball colour per number of covering bounces up to 255, in 256ths for blending single pixels
+        self.__opacities = (1 - (1 - self.BALL_OPACITY) ** np.arange(256)).astype(np.float32)
+        self.__opacities_256 = np.rint(256 * self.__opacities).astype(np.uint16)
+        self.__ball_color = np.array(self.BALL_COLOR, np.uint16)
+        # Beyond this many changed pixels, the whole image is blended at once, which is cheaper per pixel
+        self.__MAX_PIXELS_BLENDED_SINGLY = self.__coverage.size // 16
+        # Court image the bounces are blended into in place, render() hands out a read-only view of it
+        self.__working = self.__base.copy()
+        self.__image = self.__working.view()
+        self.__image.flags.writeable = False
+        # (top, left) of the chunks of the bounces added since the last render()
+        self.__changed_chunks = []
+        self.__lock = threading.Lock()
+
+    def add_ball_projection(self, x: int, y: int) -> None:
+        """
+        Adds a bounce at location (x, y), which is moved onto the court if it lies outside.
+        :param x: Center-coordinate x
+        :param y: Center-coordinate y
+        """
+        chunk_size = self.__CHUNK_SIZE
+        height, width = self.__coverage.shape
+
+        # Make sure x, y are within bounds
+        if x >= width:
+            x = width - chunk_size
+        elif x <= chunk_size:
+            x = chunk_size
+
+        if y >= height:
+            y = height - chunk_size
+        elif y <= chunk_size:
+            y = chunk_size
+
+        # The chunk may still extend beyond the right and the lower edge
+        top, left = int(y) - chunk_size // 2, int(x) - chunk_size // 2
+        bottom, right = min(top + chunk_size, height), min(left + chunk_size, width)
+        with self.__lock:
+            self.__coverage[top:bottom, left:right] += self.__disc[:bottom - top, :right - left]
+            self.__changed_chunks.append((top, left))
+
+    def add_ball_projections(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """
+        Adds many bounces at once, as add_ball_projection() does one by one.
+        :param xs: Center-coordinates x
+        :param ys: Center-coordinates y
+        """
+        chunk_size = self.__CHUNK_SIZE
+        height, width = self.__coverage.shape
+        xs, ys = np.asarray(xs, np.intp).ravel(), np.asarray(ys, np.intp).ravel()
+        xs = np.where(xs >= width, width - chunk_size, np.maximum(xs, chunk_size))
+        ys = np.where(ys >= height, height - chunk_size, np.maximum(ys, chunk_size))
+
+        tops, lefts = ys - chunk_size // 2, xs - chunk_size // 2
+        disc_ys = tops[:, np.newaxis] + self.__disc_ys
+        disc_xs = lefts[:, np.newaxis] + self.__disc_xs
+        pixels = (disc_ys * width + disc_xs)[(disc_ys < height) & (disc_xs < width)]
+        if len(pixels) == 0:
+            return
+        # Count the bounces per pixel within the span of the discs only
+        first = int(pixels.min())
+        counts = np.bincount(pixels - first)
+        with self.__lock:
+            coverage = self.__coverage.ravel()[first:first + len(counts)]
+            np.add(coverage, counts, out=coverage, casting='unsafe')
+            self.__changed_chunks.extend(zip(tops.tolist(), lefts.tolist()))
+
+    def render(self) -> np.ndarray:
+        """
+        :return: Read-only court image with all bounces added so far. The image is updated in place by the next
+        render(), so it has to be copied to be kept beyond that or to be drawn on.
+        """
+        # The changed chunks and the coverage are taken together, so that bounces added meanwhile are blended by the
+        # next render()
+        with self.__lock:
+            changed_chunks = self.__changed_chunks
+            self.__changed_chunks = []
+            blend_all = len(changed_chunks) * len(self.__disc_ys) > self.__MAX_PIXELS_BLENDED_SINGLY
+            if blend_all:
+                coverage = np.minimum(self.__coverage, 255).astype(np.uint8)
+            elif changed_chunks:
+                # The pixels of the discs of the changed chunks, pixels covered by several at once
+                height, width = self.__coverage.shape
+                chunks = np.array(changed_chunks)
+                ys = chunks[:, :1] + self.__disc_ys
+                xs = chunks[:, 1:] + self.__disc_xs
+                pixels = (ys * width + xs)[(ys < height) & (xs < width)]
+                coverage = np.minimum(self.__coverage.ravel()[pixels], 255)
+        if blend_all:
+            opacities = cv.LUT(coverage, self.__opacities)
+            cv.blendLinear(self.__base, self.__get_ball_color_img(self.__base.shape), 1 - opacities, opacities,
+                           dst=self.__working)
+        elif changed_chunks:
+            # Re-blend the pixels of the discs of the changed chunks
+            opacities = self.__opacities_256[coverage][:, np.newaxis]
+            self.__working.reshape(-1, 3)[pixels] = (self.__base.reshape(-1, 3)[pixels] * (256 - opacities) +
+                                                     self.__ball_color * opacities + 128) >> 8
+        return self.__image
+
+    @staticmethod
+    @lru_cache(maxsize=4)
+    def __get_ball_color_img(shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        :return: Read-only image of the given shape filled with BALL_COLOR
+        """
+        ball_color_img = np.empty(shape, np.uint8)
+        ball_color_img[:] = CourtOverlay.BALL_COLOR
+        ball_color_img.flags.writeable = False
+        return ball_color_img
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT
+
+# Directory of the registry that keeps track of all cache files
+REGISTRY_DIR = Path.home() / ".squash_drive_analyst" / "frame_cache"
+DEFAULT_MAX_BYTES = 20 * 2 ** 30
+
+
+class FrameCache:
+    """
+    Stores the decoded and resized frames of a video in a memory-mapped array file next to the video, so that
+    re-analysing the video skips decoding altogether.
+
+    Cache files are keyed by a hash of the video file and the processing resolution. Every cache file has an entry
+    in a registry directory, whose modification time marks the last use. Cache files still being written are
+    registered as reservations of their full size, so that concurrent writers account for each other. Once the cache
+    files of all videos would exceed the size limit, the least recently used ones are deleted.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, grayscale: bool = False,
+                 registry_dir: Path = REGISTRY_DIR):
+        """
+        :param max_bytes: Size limit of all cache files together
+        :param grayscale: Cache the blurred grayscale frames that motion detection operates on instead of colour
+        frames. These are a third of the size but unsuitable for display.
+        :param registry_dir: Directory of the registry of cache files
+        """
+        self.__max_bytes = max_bytes
+        self.__grayscale = grayscale
+        self.__registry_dir = registry_dir
+        self.__frame_shape = (FRAME_HEIGHT, FRAME_WIDTH) if grayscale else (FRAME_HEIGHT, FRAME_WIDTH, 3)
+
+    def is_grayscale(self) -> bool:
+        """
+        :return: True if the cache stores blurred grayscale frames, False for colour frames.
+        """
+        return self.__grayscale
+
+    def get_frame_shape(self) -> tuple:
+        """
+        :return: Shape of a cached frame.
+        """
+        return self.__frame_shape
+
+    def load(self, video_path: str):
+        """
+        :param video_path: Path of the video file
+        :return: Tuple of the memory-mapped frames and their timestamps in ms if the video is cached, None otherwise.
+        """
+        entry_path = self.__registry_dir / f"{self.__key(video_path)}.json"
+        try:
+            with open(entry_path) as file:
+                entry = json.load(file)
+            # Reservations of cache files still being written have no frame count
+            num_frames = entry['num_frames']
+            frames = np.load(entry['frames_path'], mmap_mode='r')
+            timestamps = np.load(entry['timestamps_path'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+        try:
+            # Mark the entry as recently used
+            os.utime(entry_path)
+        except OSError:
+            # e.g. a read-only registry, the entry merely ages
+            pass
+        return frames[:num_frames], timestamps[:num_frames]
+
+    def create_writer(self, video_path: str, max_frames: int):
+        """
+        Prepares caching the frames of a video, evicting old cache files as necessary.
+        :param video_path: Path of the video file
+        :param max_frames: Maximum number of frames the video may contain
+        :return: FrameCacheWriter, or None if the video cannot be cached.
+        """
+        size = max_frames * int(np.prod(self.__frame_shape))
+        if max_frames <= 0 or size > self.__max_bytes:
+            return None
+        self.__evict(self.__max_bytes - size)
+
+        key = self.__key(video_path)
+        video_path = Path(video_path).resolve()
+        frames_path = video_path.with_name(f".{video_path.name}.{key}.npy")
+        timestamps_path = video_path.with_name(f".{video_path.name}.{key}.timestamps.npy")
+        try:
+            return FrameCacheWriter(self.__registry_dir / f"{key}.json", frames_path, timestamps_path, max_frames,
+                                    self.__frame_shape)
+        except OSError:
+            # e.g. the video lies in a read-only directory
+            return None
+
+    def __key(self, video_path: str) -> str:
+        """
+        :return: Cache key of the video at the processing resolution.
+        """
+        height, width = self.__frame_shape[:2]
+        return f"{_fingerprint(video_path)}_{width}x{height}{'_gray' if self.__grayscale else ''}"
+
+    def __evict(self, max_bytes: int) -> None:
+        """
+        Deletes least recently used cache files until all cache files take up at most max_bytes.
+        :param max_bytes: Size to shrink the cache to
+        """
+        if not self.__registry_dir.is_dir():
+            return
+
+        entries = []
+        for entry_path in self.__registry_dir.glob("*.json"):
+            try:
+                with open(entry_path) as file:
+                    entries.append((entry_path.stat().st_mtime, entry_path, json.load(file)))
+            except (OSError, ValueError):
+                continue
+
+        total_size = sum(entry['size'] for _, _, entry in entries)
+        for _, entry_path, entry in sorted(entries, key=lambda e: e[0]):
+            if total_size <= max_bytes:
+                break
+            for path in (entry['frames_path'], entry['timestamps_path'], entry_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= entry['size']
+
+
+class FrameCacheWriter:
+    """
+    Writes the frames of a video into a new cache file. Until finish() is called, the registry only holds a
+    reservation for the cache file, which load() ignores.
+    """
+
+    def __init__(self, entry_path: Path, frames_path: Path, timestamps_path: Path, max_frames: int,
+                 frame_shape: tuple):
+        self.__entry_path = entry_path
+        self.__frames_path = frames_path
+        self.__timestamps_path = timestamps_path
+        # Frames are written to a temporary file, so that an incomplete cache file is never picked up
+        self.__tmp_path = frames_path.with_name(frames_path.name + ".tmp")
+
+        # The reservation is skipped by load() but counts towards the size of the cache. Evicting it deletes the
+        # temporary file, which makes finish() fail.
+        self.__write_entry({'frames_path': str(self.__tmp_path), 'timestamps_path': str(timestamps_path),
+                            'size': max_frames * int(np.prod(frame_shape))})
+        try:
+            self.__frames = np.lib.format.open_memmap(self.__tmp_path, mode='w+', dtype=np.uint8,
+                                                      shape=(max_frames,) + frame_shape)
+        except OSError:
+            self.abort()
+            raise
+        self.__timestamps = np.empty(max_frames, np.float64)
+        self.__num_frames = 0
+
+    def write(self, frame: np.ndarray, timestamp: float) -> bool:
+        """
+        Appends a frame to the cache file.
+        :param frame: Resized video frame, or its blur_grayscale() version for grayscale caches
+        :param timestamp: Timestamp of the frame in ms
+        :return: False if the frame does not fit into the cache file, in which case the writer has been aborted.
+        """
+        if self.__frames is None:
+            return False
+        if self.__num_frames == len(self.__frames):
+            self.abort()
+            return False
+        self.__frames[self.__num_frames] = frame
+        self.__timestamps[self.__num_frames] = timestamp
+        self.__num_frames += 1
+        return True
+
+    def finish(self) -> None:
+        """
+        Completes the cache file and registers it.
+        :raises OSError: If the cache file cannot be completed, in which case abort() must be called.
+        """
+        self.__frames.flush()
+        header_size, frame_shape = self.__frames.offset, self.__frames.shape[1:]
+        self.__frames = None
+        self.__truncate(header_size, frame_shape)
+        np.save(self.__timestamps_path, self.__timestamps[:self.__num_frames])
+
+        # The entry is registered before the cache file is put in place, so that no unregistered cache file remains
+        # if either fails
+        self.__write_entry({'frames_path': str(self.__frames_path), 'timestamps_path': str(self.__timestamps_path),
+                            'num_frames': self.__num_frames, 'size': os.path.getsize(self.__tmp_path)})
+        os.replace(self.__tmp_path, self.__frames_path)
+
+    def abort(self) -> None:
+        """
+        Discards the partially written cache file and its reservation.
+        """
+        self.__frames = None
+        for path in (self.__tmp_path, self.__timestamps_path, self.__entry_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __truncate(self, header_size: int, frame_shape: tuple) -> None:
+        """
+        Shrinks the cache file from the maximum number of frames to the frames written.
+        :param header_size: Size of the .npy header, which is kept so that the frames stay in place
+        :param frame_shape: Shape of a frame
+        """
+        header = str({'descr': '|u1', 'fortran_order': False, 'shape': (self.__num_frames,) + frame_shape})
+        with open(self.__tmp_path, 'r+b') as file:
+            version = np.lib.format.read_magic(file)
+            # The header follows its length field and is padded with spaces up to the frames
+            file.seek(2 if version == (1, 0) else 4, os.SEEK_CUR)
+            file.write(header.ljust(header_size - file.tell() - 1).encode('latin1') + b'\n')
+            file.truncate(header_size + self.__num_frames * int(np.prod(frame_shape)))
+
+    def __write_entry(self, entry: dict) -> None:
+        """
+        Writes the registry entry of the cache file.
+        :param entry: Paths of the frames and timestamps files, the number of frames and the size of the cache file
+        """
+        self.__entry_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.__entry_path, 'w') as file:
+            json.dump(entry, file)
+
+
+def _fingerprint(video_path: str) -> str:
+    """
+    Hashes the size, modification time, beginning and end of a file, which identifies a video without reading all of
+    it. A video edited in the middle keeps its size and both ends, but not its modification time.
+    :param video_path: Path of the video file
+    :return: Hex digest
+    """
+    chunk_size = 8 * 2 ** 20
+    stat = os.stat(video_path)
+    digest = hashlib.blake2b(f"{stat.st_size}_{stat.st_mtime_ns}".encode(), digest_size=16)
+    with open(video_path, 'rb') as file:
+        digest.update(file.read(chunk_size))
+        if stat.st_size > chunk_size:
+            file.seek(max(chunk_size, stat.st_size - chunk_size))
+            digest.update(file.read(chunk_size))
+    return digest.hexdigest()
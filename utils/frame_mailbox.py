@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+from utils.frame_pool import FramePool
+
+
+class FrameMailbox:
+    """
+    A single-slot mailbox handing the latest frame from a producer thread to a consumer thread.
+    Publishing never blocks and replaces a frame that has not been taken yet, so the consumer only ever sees the
+    latest frame and may poll at its own rate.
+    """
+
+    def __init__(self, shape: tuple, dtype=np.uint8):
+        """
+        :param shape: Shape of the published frames, e.g. (height, width, channels)
+        :param dtype: Data type of the published frames
+        """
+        # A frame in the slot, one taken by the consumer and one being published
+        self.__frame_pool = FramePool(3, shape, dtype)
+        self.__frame = None
+        self.__num_published = 0
+        self.__num_dropped = 0
+        self.__lock = threading.Lock()
+
+    def publish(self, frame: np.ndarray) -> None:
+        """
+        Puts a copy of the frame into the mailbox, replacing the frame in it if it has not been taken yet.
+        :param frame: Frame to publish, which the producer may reuse once this returns
+        """
+        buffer = self.__frame_pool.acquire()
+        np.copyto(buffer, frame)
+        with self.__lock:
+            replaced, self.__frame = self.__frame, buffer
+            self.__num_published += 1
+        if replaced is not None:
+            self.__num_dropped += 1
+            self.__frame_pool.release(replaced)
+
+    def take(self) -> np.ndarray:
+        """
+        Takes the latest frame out of the mailbox.
+        :return: Latest published frame or None if no frame was published since the last take(). The frame should be
+        handed back via release() once no longer needed.
+        """
+        with self.__lock:
+            frame, self.__frame = self.__frame, None
+        return frame
+
+    def release(self, frame: np.ndarray) -> None:
+        """
+        Returns a frame obtained from take() to the mailbox for reuse.
+        The frame must not be accessed afterwards.
+        :param frame: Frame previously obtained via take()
+        """
+        self.__frame_pool.release(frame)
+
+    def get_num_published(self) -> int:
+        """
+        :return: Number of frames published so far.
+        """
+        return self.__num_published
+
+    def get_num_dropped(self) -> int:
+        """
+        :return: Number of published frames that were replaced before they were taken.
+        """
+        return self.__num_dropped
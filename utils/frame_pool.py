@@ -0,0 +1,56 @@
+from collections import deque
+
+import numpy as np
+
+
+class FramePool:
+    """
+    A fixed set of preallocated, equally shaped image buffers that are handed out and returned for reuse.
+    """
+
+    def __init__(self, size: int, shape: tuple, dtype=np.uint8):
+        """
+        :param size: Number of buffers to preallocate
+        :param shape: Shape of every buffer, e.g. (height, width, channels)
+        :param dtype: Data type of every buffer
+        """
+        self.__shape = tuple(shape)
+        self.__dtype = np.dtype(dtype)
+        # deque.append() and deque.popleft() are atomic, so producer and consumer threads may share the pool.
+        # Buffers are reused in FIFO order so that a just-released buffer is the last one to be overwritten.
+        self.__free_buffers = deque(np.empty(self.__shape, dtype=self.__dtype) for _ in range(size))
+        self.__num_allocated = size
+
+    def acquire(self) -> np.ndarray:
+        """
+        Takes a free buffer from the pool.
+        Should the pool run dry (e.g. a consumer holds on to buffers) a new buffer is allocated rather than blocking.
+        :return: Buffer with undefined contents
+        """
+        try:
+            return self.__free_buffers.popleft()
+        except IndexError:
+            self.__num_allocated += 1
+            return np.empty(self.__shape, dtype=self.__dtype)
+
+    def grow(self, count: int) -> None:
+        """
+        Preallocates further buffers.
+        :param count: Number of buffers to add to the pool
+        """
+        self.__free_buffers.extend(np.empty(self.__shape, dtype=self.__dtype) for _ in range(count))
+        self.__num_allocated += count
+
+    def release(self, buffer: np.ndarray) -> None:
+        """
+        Returns a buffer to the pool. Buffers not matching the pool's shape and type are ignored.
+        :param buffer: Buffer previously obtained via acquire()
+        """
+        if buffer.shape == self.__shape and buffer.dtype == self.__dtype:
+            self.__free_buffers.append(buffer)
+
+    def get_num_allocated(self) -> int:
+        """
+        :return: Total number of buffers allocated by the pool so far.
+        """
+        return self.__num_allocated
@@ -0,0 +1,160 @@
+import json
+import math
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+class _LogHistogram:
+    """
+    Counts values in fixed logarithmically spaced bins, so that the memory taken does not grow with the number of
+    values. Quantiles are estimated as the mean of the values in the bin they fall into, which is within about 2% of
+    the exact value, and exact for small integers, which have a bin of their own. The count, mean and max are exact.
+    """
+
+    __BINS_PER_DECADE = 100
+    # Values below MIN_VALUE, including 0, share the first bin, values beyond the range the last one
+    __MIN_VALUE = 1e-3
+    __NUM_DECADES = 18
+
+    def __init__(self):
+        # Plain lists are faster to update one value at a time than arrays
+        self.__counts = [0] * (self.__BINS_PER_DECADE * self.__NUM_DECADES + 1)
+        self.__sums = [0.0] * len(self.__counts)
+        self.__last_bin = len(self.__counts) - 1
+        self.__max = -math.inf
+
+    def add(self, value: float) -> None:
+        if value >= self.__MIN_VALUE:
+            index = min(int(math.log10(value / self.__MIN_VALUE) * self.__BINS_PER_DECADE) + 1, self.__last_bin)
+        else:
+            index = 0
+        self.__counts[index] += 1
+        self.__sums[index] += value
+        if value > self.__max:
+            self.__max = value
+
+    def summarize(self, scale: float = 1) -> dict:
+        """
+        :param scale: Factor the values are reported in, e.g. 1e-6 for ms of ns values
+        :return: Count, mean, p50, p95 and max of the values.
+        """
+        cumulative_counts = np.cumsum(self.__counts)
+        count = int(cumulative_counts[-1])
+        quantiles = []
+        for q in (0.5, 0.95):
+            index = int(np.searchsorted(cumulative_counts, q * (count - 1), side='right'))
+            quantiles.append(self.__sums[index] / self.__counts[index] * scale)
+        return {'count': count, 'mean': sum(self.__sums) / count * scale, 'p50': quantiles[0], 'p95': quantiles[1],
+                'max': float(self.__max * scale)}
+
+
+class StageProfiler:
+    """
+    Collects per frame latencies of the processing stages and per frame counters such as the number of ball
+    candidates. Both are kept in histograms of a fixed size, so that profiling a long video takes no more memory.
+
+    The stages of a frame are timed as consecutive laps: start_frame() starts the clock and every lap() attributes
+    the time since the previous lap to the named stage. While disabled, all methods return immediately, so the
+    instrumentation can stay in place. Profiling can be enabled and disabled at any time during a run.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: Whether to collect measurements from the start
+        """
+        self.__enabled = enabled
+        self.__lap_start = 0
+        # Stage name -> histogram of latencies in ns
+        self.__latencies = defaultdict(_LogHistogram)
+        # Counter name -> histogram of per frame values
+        self.__counters = defaultdict(_LogHistogram)
+        self.__num_frames = 0
+        # Time in ns between the starts of consecutive profiled frames, and the number of such intervals
+        self.__wall_time = 0
+        self.__num_intervals = 0
+        self.__frame_start = None
+
+    def set_enabled(self, enabled: bool) -> None:
+        """
+        :param enabled: True to start collecting measurements, False to pause
+        """
+        self.__enabled = enabled
+        # The time spent while disabled must not count towards the throughput
+        self.__frame_start = None
+
+    def is_enabled(self) -> bool:
+        """
+        :return: True if measurements are being collected.
+        """
+        return self.__enabled
+
+    def start_frame(self) -> None:
+        """
+        Starts timing the stages of a new frame.
+        """
+        if not self.__enabled:
+            return
+        now = time.perf_counter_ns()
+        if self.__frame_start is not None:
+            self.__wall_time += now - self.__frame_start
+            self.__num_intervals += 1
+        self.__frame_start = now
+        self.__lap_start = now
+        self.__num_frames += 1
+
+    def lap(self, stage: str) -> None:
+        """
+        Attributes the time since start_frame() or the previous lap() to a stage.
+        :param stage: Stage name
+        """
+        if not self.__enabled:
+            return
+        now = time.perf_counter_ns()
+        self.__latencies[stage].add(now - self.__lap_start)
+        self.__lap_start = now
+
+    def add(self, stage: str, latency: int) -> None:
+        """
+        Attributes a latency measured elsewhere, e.g. on another thread, to a stage of the current frame.
+        :param stage: Stage name
+        :param latency: Latency in ns
+        """
+        if not self.__enabled:
+            return
+        self.__latencies[stage].add(latency)
+
+    def count(self, name: str, value: float) -> None:
+        """
+        Records a per frame value.
+        :param name: Counter name
+        :param value: Value for the current frame
+        """
+        if not self.__enabled:
+            return
+        self.__counters[name].add(value)
+
+    def get_report(self) -> dict:
+        """
+        :return: Number of profiled frames, their throughput, and count, mean, p50, p95 and max of every stage latency
+        in ms and of every counter.
+        """
+        wall_time = self.__wall_time / 1e9
+        return {
+            'frames': self.__num_frames,
+            'frames_per_second': self.__num_intervals / wall_time if wall_time else None,
+            'stages_ms': {stage: latencies.summarize(1e-6) for stage, latencies in self.__latencies.items()},
+            'counters': {name: values.summarize() for name, values in self.__counters.items()},
+        }
+
+    def write_report(self, path: str, **extra) -> None:
+        """
+        Writes the report as JSON.
+        :param path: File path
+        :param extra: Additional entries of the report
+        """
+        report = self.get_report()
+        report.update(extra)
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
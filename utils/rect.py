@@ -1,4 +1,7 @@
 from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
 
 
 @dataclass(frozen=True)
@@ -26,3 +29,99 @@ class Rect:
         :return: Area of rectangle.
         """
         return self.width * self.height
+
+
+class BoxArray:
+    """
+    Stores a sequence of rectangles, e.g. the ball candidates of a frame, as the rows of a single (n, 4) array in
+    (x, y, width, height) form.
+
+    Single rectangles are handed out as Rect, so that code working on one rectangle at a time can stay as is, while
+    code working on all rectangles uses the array columns. The array is read-only.
+    """
+    __slots__ = ('__boxes',)
+
+    def __init__(self, boxes: np.ndarray = None):
+        """
+        :param boxes: Array of shape (n, 4) with rows (x, y, width, height). Integer arrays stay integer.
+        Empty if omitted.
+        """
+        # reshape() returns a view, so that the caller's array stays writeable
+        self.__boxes = np.empty((0, 4), np.int64) if boxes is None else np.asarray(boxes).reshape(-1, 4)
+        self.__boxes.flags.writeable = False
+
+    @staticmethod
+    def from_rects(rects: Iterable[Rect]) -> 'BoxArray':
+        """
+        :param rects: Rectangles
+        :return: BoxArray of the rectangles in the same order
+        """
+        return BoxArray(np.array([(rect.x, rect.y, rect.width, rect.height) for rect in rects]))
+
+    @staticmethod
+    def concatenate(box_arrays: Iterable['BoxArray']) -> 'BoxArray':
+        """
+        :param box_arrays: BoxArrays to join
+        :return: BoxArray of the rectangles of all box_arrays in order
+        """
+        return BoxArray(np.concatenate([box_array.__boxes for box_array in box_arrays]))
+
+    def __len__(self) -> int:
+        return len(self.__boxes)
+
+    def __getitem__(self, index: int) -> Rect:
+        return Rect(*self.__boxes[index].tolist())
+
+    def __iter__(self) -> Iterator[Rect]:
+        return (Rect(*row) for row in self.__boxes.tolist())
+
+    def __repr__(self) -> str:
+        return f"BoxArray({self.__boxes.tolist()})"
+
+    def take(self, indices: np.ndarray) -> 'BoxArray':
+        """
+        :param indices: Indices or boolean mask of the rectangles to keep
+        :return: BoxArray of the selected rectangles
+        """
+        return BoxArray(self.__boxes[indices])
+
+    def get_array(self) -> np.ndarray:
+        """
+        :return: Read-only (n, 4) array with rows (x, y, width, height).
+        """
+        return self.__boxes
+
+    def get_positions(self) -> np.ndarray:
+        """
+        :return: (n, 2) array of the top-left corners (x, y).
+        """
+        return self.__boxes[:, :2]
+
+    def get_widths(self) -> np.ndarray:
+        """
+        :return: Widths of the rectangles.
+        """
+        return self.__boxes[:, 2]
+
+    def get_heights(self) -> np.ndarray:
+        """
+        :return: Heights of the rectangles.
+        """
+        return self.__boxes[:, 3]
+
+    def get_areas(self) -> np.ndarray:
+        """
+        :return: Areas of the rectangles.
+        """
+        return self.__boxes[:, 2] * self.__boxes[:, 3]
+
+    def contains(self, x: float, y: float) -> np.ndarray:
+        """
+        Vectorized utilities.is_within(): rectangles of negative width extend to the left of x.
+        :param x: X-coordinate
+        :param y: Y-coordinate
+        :return: Boolean array, True for the rectangles (x, y) lies within, boundaries included.
+        """
+        left, top, width, height = self.__boxes.T
+        right = left + width
+        return (np.minimum(left, right) <= x) & (x <= np.maximum(left, right)) & (top <= y) & (y <= top + height)
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import cv2 as cv
 import numpy as np
 
@@ -6,12 +8,93 @@ from utils.rect import Rect
 FRAME_WIDTH = 360
 FRAME_HEIGHT = 640
 
+# Frame rate the frame-count based constants of the analysis have been tuned for.
+# Timestamps are expressed in multiples of this frame interval to keep the analysis frame-rate independent.
+REFERENCE_FPS = 60
+REFERENCE_FRAME_INTERVAL_MS = 1000 / REFERENCE_FPS
+
 
 def draw_rect(frame: np.ndarray, rect: Rect, color: (int, int, int), line_width=2) -> None:
     cv.rectangle(frame, (int(rect.x), int(rect.y)), (int(rect.x) + int(rect.width), int(rect.y) + int(rect.height)),
                  color, line_width)
 
 
+def blur_grayscale(frame: np.ndarray, dst: np.ndarray = None, grayscale_dst: np.ndarray = None) -> np.ndarray:
+    """
+    Converts a video frame to the smoothed grayscale image that motion detection operates on.
+    :param frame: BGR video frame
+    :param dst: Optional output image
+    :param grayscale_dst: Optional image for the intermediate grayscale conversion
+    :return: Blurred grayscale image
+    """
+    grayscale = cv.cvtColor(frame, cv.COLOR_BGR2GRAY, dst=grayscale_dst)
+    return cv.GaussianBlur(grayscale, (5, 5), 0, dst=dst)
+
+
+def morphological_close(image: np.ndarray, iterations: int, dst: np.ndarray = None,
+                        dilated_dst: np.ndarray = None) -> np.ndarray:
+    """
+    Closes a binary image by dilating it iterations times and eroding it once, both with a 3x3 rectangular kernel.
+
+    The repeated 3x3 dilations are computed as a single dilation with a (2 * iterations + 1) square kernel, which
+    is identical. Both operations are confined to the bounding box of the foreground grown by the reach of the
+    dilation plus one pixel. Outside of it the closing is zero, and within it the result is bit-identical to
+    processing the whole image. If the foreground spans more than half of the image height, e.g. due to noise
+    pixels, the whole image is processed, so that finding the bounding box does not cost extra time.
+    :param image: Binary image
+    :param iterations: Number of dilations
+    :param dst: Optional output image
+    :param dilated_dst: Optional image for the intermediate dilation, its content outside the foreground is undefined
+    :return: The morphological closing of the image
+    """
+    if dst is None:
+        dst = np.empty_like(image)
+    if dilated_dst is None:
+        dilated_dst = np.empty_like(image)
+    top, bottom = _get_foreground_rows(image)
+    if 2 * (bottom - top) > image.shape[0]:
+        cv.dilate(image, _get_square_kernel(2 * iterations + 1), dst=dilated_dst)
+        return cv.erode(dilated_dst, _get_square_kernel(3), dst=dst)
+
+    dst.fill(0)
+    if bottom == top:
+        return dst
+    x, y, width, height = cv.boundingRect(image[top:bottom])
+    y += top
+    margin = iterations + 1
+    roi = (slice(max(y - margin, 0), min(y + height + margin, image.shape[0])),
+           slice(max(x - margin, 0), min(x + width + margin, image.shape[1])))
+    cv.dilate(image[roi], _get_square_kernel(2 * iterations + 1), dst=dilated_dst[roi])
+    cv.erode(dilated_dst[roi], _get_square_kernel(3), dst=dst[roi])
+    return dst
+
+
+def _get_foreground_rows(image: np.ndarray, num_bands: int = 16) -> (int, int):
+    """
+    Finds the horizontal bands of the image containing foreground. The bands are searched from the top and from the
+    bottom, so foreground scattered across the image is found after looking at a few bands only.
+    :param image: Binary image
+    :param num_bands: Number of bands the image is divided into
+    :return: First row of the topmost and end row of the bottommost band containing foreground, (0, 0) if there is
+    no foreground
+    """
+    band_height = -(-image.shape[0] // num_bands)
+    starts = range(0, image.shape[0], band_height)
+    top = next((start for start in starts if cv.countNonZero(image[start:start + band_height])), None)
+    if top is None:
+        return 0, 0
+    bottom = next(start for start in reversed(starts) if cv.countNonZero(image[start:start + band_height]))
+    return top, min(bottom + band_height, image.shape[0])
+
+
+@lru_cache(maxsize=None)
+def _get_square_kernel(size: int) -> np.ndarray:
+    """
+    :return: size x size rectangular structuring element
+    """
+    return cv.getStructuringElement(cv.MORPH_RECT, (size, size))
+
+
 def is_within(rect: Rect, x: float, y: float) -> bool:
     """
     :param rect: Rectangle
@@ -1,11 +1,14 @@
 import logging
-from collections import deque
-from threading import Thread
+import time
+from queue import Queue, Empty, Full
+from threading import Thread, current_thread
 
 import cv2 as cv
 import numpy as np
 
-from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT
+from utils.frame_cache import FrameCache
+from utils.frame_pool import FramePool
+from utils.utilities import FRAME_WIDTH, FRAME_HEIGHT, REFERENCE_FRAME_INTERVAL_MS, blur_grayscale
 
 
 class VideoReader:
@@ -13,69 +16,320 @@ class VideoReader:
     Opens a video capture from a given path and allows for getting video frames.
     """
 
-    def __init__(self, video_path: str):
+    def __init__(self, video_path: str, buffer_size: int = 4, decimation: int = 1, start_frame: int = 0,
+                 end_frame: int = None, frame_cache: FrameCache = None):
+        """
+        :param video_path: Path of the video file
+        :param buffer_size: Maximum number of decoded frames waiting to be consumed
+        :param decimation: Only every decimation-th frame is decoded, the frames in between are skipped.
+        :param start_frame: Index of the first frame to read
+        :param end_frame: Index of the frame to stop reading at (exclusive), None to read until the end of the video
+        :param frame_cache: Cache to read the frames from instead of decoding the video. If the video is not cached
+        yet, a complete read of the video fills the cache.
+        With a grayscale cache the frames of cached videos are returned as blurred grayscale images.
+        """
+        if decimation < 1:
+            raise ValueError("decimation must be a positive integer")
+
         self.__stream = cv.VideoCapture(video_path)
-        self.__current_frame_number = 0
+        if not self.__stream.isOpened():
+            raise IOError(f"Unable to open video {video_path}")
+        self.__decimation = decimation
+        self.__start_frame = start_frame
+        self.__end_frame = end_frame
+        self.__current_frame_number = start_frame
+        self.__current_timestamp = 0.0
         self.__total_frames = self.__stream.get(cv.CAP_PROP_FRAME_COUNT)
+        if start_frame > 0:
+            self.__stream.set(cv.CAP_PROP_POS_FRAMES, start_frame)
         self.__stopped = True
-        self.__frame_buffer = deque(maxlen=5)
+        self.__producer = None
+
+        # Bounded FIFO of (sequence number, timestamp, frame) tuples shared by the producer and the consumer.
+        # The sequence number is the index of the frame in the video. A None entry marks the end of the stream.
+        self.__frame_queue = Queue(maxsize=buffer_size)
+
+        # Memory-mapped frames and timestamps of a cached video
+        self.__cached_frames = None
+        self.__cached_timestamps = None
+        self.__cache_writer = None
+        if frame_cache is not None:
+            cached = frame_cache.load(video_path)
+            if cached is not None:
+                self.__cached_frames, self.__cached_timestamps = cached
+                self.__total_frames = len(self.__cached_frames)
+            elif decimation == 1 and start_frame == 0 and end_frame is None:
+                # The frame count reported by the container is an estimate, leave some headroom
+                self.__cache_writer = frame_cache.create_writer(video_path, int(self.__total_frames * 1.01) + 16)
+        frame_shape = (FRAME_HEIGHT, FRAME_WIDTH, 3) if self.__cached_frames is None else frame_cache.get_frame_shape()
+        self.__grayscale_cache = frame_cache is not None and frame_cache.is_grayscale()
+
+        # Resized frames are written into reusable buffers. Besides the queued frames, buffers are needed for the
+        # frame being decoded and for frames still held by the consumer, see hold_frames() for consumers holding more.
+        self.__frame_pool = FramePool(buffer_size + 4, frame_shape)
+        # Full resolution decoding target, reused for every frame
+        self.__raw_frame = None
+        # How often (seconds) a blocked producer or consumer re-checks whether reading has been stopped.
+        self.__POLL_INTERVAL = 0.1
+
+        # Total time (seconds) the producer spent waiting for free space and the consumer spent waiting for frames.
+        self.__producer_stall_time = 0.0
+        self.__consumer_stall_time = 0.0
 
     def start_reading(self) -> None:
         """
         Starts a producer-thread that fills a buffer with video frames to be read.
         """
+        self.__stopped = False
+        fill_buf = self.__fill_buffer_from_stream if self.__cached_frames is None else self.__fill_buffer_from_cache
+        self.__producer = Thread(target=fill_buf, daemon=True)
+        self.__producer.start()
 
-        def fill_buf():
-            self.__stopped = False
+    def __fill_buffer_from_stream(self) -> None:
+        """
+        Producer-thread decoding the video.
+        """
+        sequence_number = self.__start_frame
+        reached_end = False
+        try:
             # Keep reading frames until __stopped or run out of frames to read.
             while not self.__stopped and self.__stream.isOpened():
-                if len(self.__frame_buffer) < self.__frame_buffer.maxlen - 1:
-                    frame = self.__get_frame_from_stream()
-                    if frame is not None:
-                        frame_resized = cv.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), interpolation=cv.INTER_LINEAR)
-                        self.__frame_buffer.append(frame_resized)
-                    else:
-                        break
-            # Wait for consumer to finish processing remaining frames
-            while not self.__stopped and len(self.__frame_buffer) > 0:
-                pass
+                if self.__end_frame is not None and sequence_number >= self.__end_frame:
+                    break
+                # Skip over the decimated frames without decoding them
+                if sequence_number > self.__start_frame and not self.__skip_frames(self.__decimation - 1):
+                    reached_end = True
+                    break
+                frame = self.__get_frame_from_stream()
+                if frame is None:
+                    reached_end = True
+                    break
+                timestamp = self.__stream.get(cv.CAP_PROP_POS_MSEC)
+                frame_resized = cv.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=self.__frame_pool.acquire(),
+                                          interpolation=cv.INTER_LINEAR)
+                if self.__cache_writer is not None:
+                    self.__write_to_cache(frame_resized, timestamp)
+                if not self.__put((sequence_number, timestamp, frame_resized)):
+                    self.__frame_pool.release(frame_resized)
+                    break
+                sequence_number += self.__decimation
+
+            if self.__cache_writer is not None:
+                # Only a completely read video is cached
+                if reached_end:
+                    try:
+                        self.__cache_writer.finish()
+                    except OSError:
+                        # Caching is given up, e.g. the registry cannot be written
+                        self.__cache_writer.abort()
+                else:
+                    self.__cache_writer.abort()
+        finally:
+            # Signal end
+            self.__put(None)
+            self.__stream.release()
+
+    def __fill_buffer_from_cache(self) -> None:
+        """
+        Producer-thread copying frames out of the frame cache.
+        """
+        end_frame = len(self.__cached_frames) if self.__end_frame is None else \
+            min(self.__end_frame, len(self.__cached_frames))
+        try:
+            for sequence_number in range(self.__start_frame, end_frame, self.__decimation):
+                if self.__stopped:
+                    break
+                # Frames are copied, as the memory-mapped cache is read-only
+                frame = self.__frame_pool.acquire()
+                np.copyto(frame, self.__cached_frames[sequence_number])
+                if not self.__put((sequence_number, float(self.__cached_timestamps[sequence_number]), frame)):
+                    self.__frame_pool.release(frame)
+                    break
+        finally:
             # Signal end
-            self.__stopped = True
+            self.__put(None)
             self.__stream.release()
 
-        Thread(target=fill_buf, daemon=True).start()
+    def __write_to_cache(self, frame: np.ndarray, timestamp: float) -> None:
+        """
+        Adds a frame to the frame cache being filled. Caching is given up on any failure.
+        :param frame: Resized video frame
+        :param timestamp: Timestamp of the frame in ms
+        """
+        if self.__grayscale_cache:
+            frame = blur_grayscale(frame)
+        try:
+            if self.__cache_writer.write(frame, timestamp):
+                return
+        except OSError:
+            self.__cache_writer.abort()
+        self.__cache_writer = None
 
     def get_frame(self) -> np.ndarray:
         """
-        Fetches a video frame from buffer.
+        Fetches video frames from the buffer in decoding order.
+        Frames are pooled buffers and should be handed back via release_frame() once no longer needed.
         """
         while not self.__stopped:
-            if self.__frame_buffer:
-                self.__current_frame_number += 1
-                yield self.__frame_buffer.pop()
+            item = self.__get()
+            if item is None:
+                # End of stream, the producer-thread is only left to release the video
+                self.stop_reading()
+                return
+            sequence_number, self.__current_timestamp, frame = item
+            self.__current_frame_number = sequence_number + 1
+            yield frame
+
+    def hold_frames(self, num_frames: int) -> None:
+        """
+        Provides buffers for frames the consumer holds on to besides the current one, e.g. frames queued for a
+        later processing stage, so that the reader does not allocate new frames while reading.
+        :param num_frames: Number of further frames held by the consumer at most
+        """
+        self.__frame_pool.grow(num_frames)
+
+    def release_frame(self, frame: np.ndarray) -> None:
+        """
+        Returns a frame obtained from get_frame() to the reader for reuse.
+        The frame must not be accessed afterwards.
+        :param frame: Video frame
+        """
+        self.__frame_pool.release(frame)
 
     def stop_reading(self) -> None:
         """
-        Stop the video reader from reading any new frames.
+        Stop the video reader from reading any new frames and waits for the producer-thread to finish the frame it
+        is reading, so that the video is not decoded any more once this returns.
         """
         self.__stopped = True
+        if self.__producer is not None and self.__producer is not current_thread():
+            self.__producer.join()
 
     def get_progress(self) -> float:
         """
         :return: Percentage progress of frames read.
         """
-        return self.__current_frame_number / self.__total_frames
+        end_frame = self.__total_frames if self.__end_frame is None else min(self.__end_frame, self.__total_frames)
+        return (self.__current_frame_number - self.__start_frame) / (end_frame - self.__start_frame)
+
+    def get_resolution(self) -> (int, int):
+        """
+        :return: (width, height) of the video before resizing.
+        """
+        return int(self.__stream.get(cv.CAP_PROP_FRAME_WIDTH)), int(self.__stream.get(cv.CAP_PROP_FRAME_HEIGHT))
+
+    def get_total_frames(self) -> int:
+        """
+        :return: Number of frames in the video as reported by the container.
+        """
+        return int(self.__total_frames)
+
+    def get_frame_index(self) -> int:
+        """
+        :return: Index in the video of the frame last returned by get_frame().
+        """
+        return self.__current_frame_number - 1
+
+    def get_timestamp(self) -> float:
+        """
+        :return: Timestamp in milliseconds of the frame last returned by get_frame().
+        """
+        return self.__current_timestamp
+
+    def get_frame_interval(self) -> float:
+        """
+        :return: Time in milliseconds between two frames of the video as reported by the container, that of 60fps
+        video if the container does not report its frame rate.
+        """
+        fps = self.__stream.get(cv.CAP_PROP_FPS)
+        return 1000 / fps if fps > 0 else REFERENCE_FRAME_INTERVAL_MS
+
+    def get_decimation(self) -> int:
+        """
+        :return: Number of video frames advanced per returned frame.
+        """
+        return self.__decimation
+
+    def get_stall_times(self) -> (float, float):
+        """
+        :return: Total time in seconds the producer spent blocked on a full buffer and the consumer spent blocked
+        on an empty buffer.
+        """
+        return self.__producer_stall_time, self.__consumer_stall_time
+
+    def get_queue_depth(self) -> int:
+        """
+        :return: Number of decoded frames currently waiting to be consumed.
+        """
+        return self.__frame_queue.qsize()
+
+    def __put(self, item) -> bool:
+        """
+        Adds an item to the frame queue, blocking while the queue is full.
+        :param item: (sequence number, timestamp, frame) tuple or None to signal end of stream
+        :return: True if the item was queued, False if reading was stopped in the meantime.
+        """
+        try:
+            self.__frame_queue.put_nowait(item)
+            return True
+        except Full:
+            pass
+
+        stall_start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    self.__frame_queue.put(item, timeout=self.__POLL_INTERVAL)
+                    return True
+                except Full:
+                    if self.__stopped:
+                        return False
+        finally:
+            self.__producer_stall_time += time.perf_counter() - stall_start
+
+    def __get(self):
+        """
+        Takes the oldest item from the frame queue, blocking while the queue is empty.
+        :return: (sequence number, timestamp, frame) tuple or None if the stream has ended or reading was stopped.
+        """
+        try:
+            return self.__frame_queue.get_nowait()
+        except Empty:
+            pass
+
+        stall_start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return self.__frame_queue.get(timeout=self.__POLL_INTERVAL)
+                except Empty:
+                    if self.__stopped:
+                        return None
+        finally:
+            self.__consumer_stall_time += time.perf_counter() - stall_start
+
+    def __skip_frames(self, num_frames: int) -> bool:
+        """
+        Advances the video __stream without decoding the skipped frames.
+        :param num_frames: Number of frames to skip
+        :return: True if all frames were skipped, False if the stream ended.
+        """
+        for _ in range(num_frames):
+            if not self.__stream.grab():
+                return False
+        return True
 
     def __get_frame_from_stream(self) -> np.ndarray:
         """
         Returns a frame from the class' video __stream.
         :return: Read frame, or None if read was unsuccessful
         """
-        successful_read, frame = self.__stream.read()
+        successful_read, frame = self.__stream.read(self.__raw_frame)
 
         if not successful_read:
             # TODO handle in GUI
             logging.getLogger("Can't receive frame (stream end?). Exiting ...")
+            return None
 
+        self.__raw_frame = frame
         return frame
-